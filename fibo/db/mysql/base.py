@@ -0,0 +1,7 @@
+from django.db.backends.mysql import base
+
+from fibo.db.pool import PooledDatabaseWrapper
+
+
+class DatabaseWrapper(PooledDatabaseWrapper, base.DatabaseWrapper):
+    """MySQL with a bounded process-wide connection pool"""
@@ -0,0 +1,176 @@
+"""
+Database connection pooling for fibo
+Django pools natively only for PostgreSQL, so the fibo.db.mysql and fibo.db.sqlite3 backends
+check raw connections out of a bounded, process-wide ConnectionPool instead of opening one
+per thread and closing it again. Configured per database with a "POOL" dict:
+
+    'POOL': {
+        'MAX_SIZE': 10,            # Connections open at once in this process
+        'TIMEOUT': 10,             # Seconds to wait for a free connection before OperationalError
+        'RECYCLE': 3600,           # Close connections older than this instead of reusing them
+        'HEALTH_CHECK_AFTER': 30,  # Ping connections idle longer than this before handing them out
+    }
+"""
+import threading
+import time
+import weakref
+from collections import deque
+
+from django.db import connections
+from django.db.utils import OperationalError
+
+from home import metrics
+
+
+class ConnectionPool:
+    """Bounded pool of raw DB-API connections, shared by all threads"""
+
+    def __init__(self, name, max_size=10, timeout=10, recycle=3600, health_check_after=30):
+        self.name = name
+        self.max_size = max_size
+        self.timeout = timeout
+        self.recycle = recycle
+        self.health_check_after = health_check_after
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._idle = deque()  # (connection, returned at)
+        self._created = {}  # id(connection) -> created at
+        self._lock = threading.Lock()
+
+    def acquire(self, connect):
+        """An idle healthy connection, or a new one from connect(); waits up to timeout for a slot"""
+        started = time.monotonic()
+        if not self._slots.acquire(timeout=self.timeout):
+            metrics.counter('db_pool_timeouts_total', 'DB pool checkouts that gave up waiting').inc(pool=self.name)
+            raise OperationalError(
+                f'Database pool "{self.name}" exhausted: {self.max_size} connections in use for {self.timeout}s'
+            )
+        metrics.histogram('db_pool_wait_seconds', 'Time spent waiting for a pooled DB connection').observe(
+            time.monotonic() - started, pool=self.name
+        )
+
+        try:
+            while True:
+                with self._lock:
+                    connection, returned_at = self._idle.pop() if self._idle else (None, None)
+                if connection is None:
+                    break
+                if self._expired(connection):
+                    self._discard(connection)
+                elif time.monotonic() - returned_at > self.health_check_after and not self._healthy(connection):
+                    metrics.counter('db_pool_unhealthy_total', 'Pooled DB connections that failed a ping').inc(
+                        pool=self.name
+                    )
+                    self._discard(connection)
+                else:
+                    return connection
+
+            connection = connect()
+            with self._lock:
+                self._created[id(connection)] = time.monotonic()
+            return connection
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def release(self, connection):
+        """Give a connection back, rolled back; broken or expired connections are closed instead"""
+        try:
+            try:
+                connection.rollback()  # Never hand out a connection in the middle of a transaction
+            except Exception:
+                self._discard(connection)
+                return
+            if self._expired(connection):
+                self._discard(connection)
+            else:
+                with self._lock:
+                    self._idle.append((connection, time.monotonic()))
+        finally:
+            self._slots.release()
+
+    def stats(self):
+        with self._lock:
+            return {'open': len(self._created), 'idle': len(self._idle), 'max_size': self.max_size}
+
+    def close_idle(self):
+        with self._lock:
+            idle, self._idle = list(self._idle), deque()
+        for connection, _ in idle:
+            self._discard(connection)
+
+    def _expired(self, connection):
+        with self._lock:
+            created = self._created.get(id(connection), 0)
+        return time.monotonic() - created > self.recycle
+
+    def _healthy(self, connection):
+        try:
+            cursor = connection.cursor()
+            cursor.execute('SELECT 1')
+            cursor.close()
+            return True
+        except Exception:
+            return False
+
+    def _discard(self, connection):
+        with self._lock:
+            self._created.pop(id(connection), None)
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(alias, settings_dict):
+    """The pool for a database; a changed NAME/HOST (e.g. the test database) gets its own pool"""
+    key = (alias, settings_dict['NAME'], settings_dict.get('HOST'), settings_dict.get('PORT'), settings_dict.get('USER'))
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            options = settings_dict.get('POOL', {})
+            pool = _pools[key] = ConnectionPool(
+                alias,
+                max_size=options.get('MAX_SIZE', 10),
+                timeout=options.get('TIMEOUT', 10),
+                recycle=options.get('RECYCLE', 3600),
+                health_check_after=options.get('HEALTH_CHECK_AFTER', 30),
+            )
+        return pool
+
+
+class PooledDatabaseWrapper:
+    """Mixin for a backend DatabaseWrapper: connect() checks out of the pool, close() returns to it"""
+
+    def get_new_connection(self, conn_params):
+        pool = get_pool(self.alias, self.settings_dict)
+        connection = pool.acquire(lambda: super(PooledDatabaseWrapper, self).get_new_connection(conn_params))
+        self._connection_pool = pool
+        # A thread that exits without closing its connection still hands it back once the wrapper is collected
+        self._pool_return = weakref.finalize(self, pool.release, connection)
+        return connection
+
+    def _close(self):
+        if self.connection is not None:
+            self._pool_return.detach()
+            with self.wrap_database_errors:
+                self._connection_pool.release(self.connection)
+
+
+def release_connections():
+    """
+    Return this thread's pooled connections before a long wait (e.g. on Groq or Bria)
+
+    Connections inside a transaction are kept; Django reconnects - from the pool - on the
+    next query. A no-op for databases that aren't pooled.
+    """
+    for connection in connections.all(initialized_only=True):
+        if (
+            isinstance(connection, PooledDatabaseWrapper)
+            and connection.connection is not None
+            and not connection.in_atomic_block
+        ):
+            connection.close()
@@ -0,0 +1,7 @@
+from django.db.backends.sqlite3 import base
+
+from fibo.db.pool import PooledDatabaseWrapper
+
+
+class DatabaseWrapper(PooledDatabaseWrapper, base.DatabaseWrapper):
+    """SQLite with the same pool as the MySQL backend, to exercise pooling without a MySQL server"""
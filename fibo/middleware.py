@@ -0,0 +1,211 @@
+"""
+Project middleware for fibo
+ServerTimingMiddleware adds a Server-Timing header (DB, upstream API and template time) that
+browser devtools show per request; SlowRequestProfilerMiddleware dumps cProfile stats for
+sampled requests slower than SLOW_REQUEST_THRESHOLD into SLOW_REQUEST_PROFILE_DIR;
+SessionRefreshMiddleware extends session expiry without a session write on every request
+"""
+import cProfile
+import os
+import random
+import threading
+import time
+from datetime import datetime, timezone
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.signals import request_started
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+from home.instrumentation import collect_request_timings, current_request_timings
+
+
+def _record_query(execute, sql, params, many, context):
+    """Execute wrapper adding query time to the current request's timings"""
+    timings = current_request_timings()
+    if timings is None:
+        return execute(sql, params, many, context)
+    started = time.monotonic()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.add('db', time.monotonic() - started)
+
+
+def _install_query_timer(connection, **kwargs):
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+def _install_query_timers(**kwargs):
+    """Cover connections opened before this module loaded; runs on the thread that serves queries"""
+    for connection in connections.all(initialized_only=True):
+        _install_query_timer(connection)
+
+
+connection_created.connect(_install_query_timer)
+request_started.connect(_install_query_timers)
+
+
+class ServerTimingMiddleware:
+    """
+    Adds a Server-Timing header to every response, e.g.
+        db;dur=4.1;desc="3 queries", upstream;dur=812.0;desc="1 Groq/Bria calls", tpl;dur=9.7;desc="1 templates", total;dur=840.2
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    METRICS = (  # (timing name, header metric, description)
+        ('db', 'db', 'queries'),
+        ('upstream_request', 'upstream', 'Groq/Bria calls'),
+        ('template_render', 'tpl', 'templates'),
+    )
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'SERVER_TIMING_ENABLED', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        started = time.monotonic()
+        with collect_request_timings() as timings:
+            response = self.get_response(request)
+        response['Server-Timing'] = self.header(timings, time.monotonic() - started)
+        return response
+
+    async def __acall__(self, request):
+        started = time.monotonic()
+        with collect_request_timings() as timings:
+            response = await self.get_response(request)
+        response['Server-Timing'] = self.header(timings, time.monotonic() - started)
+        return response
+
+    def header(self, timings, total):
+        entries = []
+        for name, metric, description in self.METRICS:
+            count = timings.counts.get(name, 0)
+            entries.append(f'{metric};dur={timings.durations.get(name, 0) * 1000:.1f};desc="{count} {description}"')
+        entries.append(f'total;dur={total * 1000:.1f}')
+        return ', '.join(entries)
+
+
+class SlowRequestProfilerMiddleware:
+    """
+    Profiles a sample of requests and keeps the ones slower than SLOW_REQUEST_THRESHOLD
+
+    Files are pstats dumps named <time>-<view>-<ms>ms.prof; open them with
+    `python -m pstats <file>` or snakeviz. Only one request is profiled at a time.
+    Under ASGI the profile also contains other coroutines that ran on the event loop
+    while the request was waiting.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.directory = getattr(settings, 'SLOW_REQUEST_PROFILE_DIR', '')
+        if not self.directory:
+            raise MiddlewareNotUsed
+        self.threshold = getattr(settings, 'SLOW_REQUEST_THRESHOLD', 1.0)
+        self.sample_rate = getattr(settings, 'SLOW_REQUEST_SAMPLE_RATE', 0.1)
+        self.get_response = get_response
+        self._busy = threading.Lock()  # cProfile allows a single active profiler
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self._start():
+            return self.get_response(request)
+        profile, started = cProfile.Profile(), time.monotonic()
+        try:
+            profile.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profile.disable()
+            self._save(profile, request, time.monotonic() - started)
+        finally:
+            self._busy.release()
+        return response
+
+    async def __acall__(self, request):
+        if not self._start():
+            return await self.get_response(request)
+        profile, started = cProfile.Profile(), time.monotonic()
+        try:
+            profile.enable()
+            try:
+                response = await self.get_response(request)
+            finally:
+                profile.disable()
+            self._save(profile, request, time.monotonic() - started)
+        finally:
+            self._busy.release()
+        return response
+
+    def _start(self):
+        return random.random() < self.sample_rate and self._busy.acquire(blocking=False)
+
+    def _save(self, profile, request, duration):
+        if duration < self.threshold:
+            return
+        match = request.resolver_match
+        view = (match.view_name if match else 'unresolved').replace(':', '.')
+        stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S.%f')
+        path = os.path.join(self.directory, f'{stamp}-{view}-{duration * 1000:.0f}ms.prof')
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            profile.dump_stats(path)
+            print(f"Slow request {request.method} {request.path} took {duration:.2f}s, profile: {path}")
+        except OSError as e:
+            print(f"Could not write request profile {path}: {str(e)}")
+
+
+class SessionRefreshMiddleware:
+    """
+    Lazy replacement for SESSION_SAVE_EVERY_REQUEST
+
+    Sessions remember when they were last saved; only once less than SESSION_REFRESH_THRESHOLD
+    seconds of their lifetime are left is the session marked modified, so SessionMiddleware
+    (listed before this one) saves it and re-sends the cookie with a fresh expiry.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    KEY = '_refreshed_at'
+
+    def __init__(self, get_response):
+        self.threshold = getattr(settings, 'SESSION_REFRESH_THRESHOLD', settings.SESSION_COOKIE_AGE // 2)
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        response = self.get_response(request)
+        self.refresh(request.session)
+        return response
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        self.refresh(request.session)  # Only reads a session the request already loaded
+        return response
+
+    def refresh(self, session):
+        # Untouched and anonymous sessions are left alone, as SessionMiddleware would
+        if not session.accessed or not session.session_key or session.get_expire_at_browser_close():
+            return
+        now = int(time.time())
+        if session.modified or now - session.get(self.KEY, 0) > session.get_expiry_age() - self.threshold:
+            session[self.KEY] = now
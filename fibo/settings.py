@@ -49,8 +49,12 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "fibo.middleware.ServerTimingMiddleware",
+    "fibo.middleware.SlowRequestProfilerMiddleware",
+    "home.instrumentation.ViewTimingMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
+    "fibo.middleware.SessionRefreshMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
@@ -62,7 +66,7 @@ ROOT_URLCONF = "fibo.urls"
 
 TEMPLATES = [
     {
-        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        "BACKEND": "fibo.template_backends.DjangoTemplates",  # Times renders for Server-Timing
          "DIRS": [BASE_DIR / 'templates'],
         "APP_DIRS": True,
         "OPTIONS": {
@@ -116,19 +120,52 @@ USE_I18N = True
 USE_TZ = True
 
 
-DATABASES = { 
-    "default": {
-        "ENGINE": "django.db.backends.mysql",
-        "NAME": "fibo",
-        "USER": "root",
-        "PASSWORD": "MOON90child@",
-        "HOST": "localhost",  # Set to "localhost" or your remote database host
-        "PORT": "3306",
-        "OPTIONS": {       
-        "charset": "utf8mb4",  # Default MySQL port is 3306
+# DB_BACKEND=sqlite runs on a local file with the same connection pool, e.g. to test without MySQL
+DB_BACKEND = os.environ.get('DB_BACKEND', 'mysql')
+
+if DB_BACKEND == 'sqlite':
+    DATABASES = {
+        "default": {
+            "ENGINE": "fibo.db.sqlite3",
+            "NAME": os.environ.get('DB_NAME', str(BASE_DIR / 'db.sqlite3')),
+            "OPTIONS": {
+                "timeout": 30,  # Seconds to wait for SQLite's single writer lock under concurrent requests
+                "transaction_mode": "IMMEDIATE",  # Take the lock at BEGIN, so atomic blocks wait instead of failing
+            },
+            # A file rather than Django's in-memory default, so threaded tests lock like the real database
+            "TEST": {"NAME": os.environ.get('DB_TEST_NAME', str(BASE_DIR / 'test_db.sqlite3'))},
+        }
+    }
+else:
+    DATABASES = {
+        "default": {
+            "ENGINE": "fibo.db.mysql",  # django.db.backends.mysql plus a bounded connection pool
+            "NAME": os.environ.get('DB_NAME', 'fibo'),
+            "USER": os.environ.get('DB_USER', 'root'),
+            "PASSWORD": os.environ.get('DB_PASSWORD', 'MOON90child@'),
+            "HOST": os.environ.get('DB_HOST', 'localhost'),  # Set to "localhost" or your remote database host
+            "PORT": os.environ.get('DB_PORT', '3306'),  # Default MySQL port is 3306
+            "OPTIONS": {
+                "charset": "utf8mb4",
+            },
+        }
+    }
+
+DATABASES["default"].update({
+    # 0 hands the connection back to the pool after each request, which keeps it open for the next one;
+    # a positive value pins a connection to each server thread, so MAX_SIZE must cover every thread
+    "CONN_MAX_AGE": int(os.environ.get('DB_CONN_MAX_AGE', '0')),
+    "CONN_HEALTH_CHECKS": True,  # Check pinned connections at the start of each request
+    "POOL": {  # See fibo.db.pool
+        "MAX_SIZE": int(os.environ.get('DB_POOL_MAX_SIZE', '10')),  # Per process
+        "TIMEOUT": float(os.environ.get('DB_POOL_TIMEOUT', '10')),
+        "RECYCLE": int(os.environ.get('DB_POOL_RECYCLE', '3600')),
+        "HEALTH_CHECK_AFTER": int(os.environ.get('DB_POOL_HEALTH_CHECK_AFTER', '30')),
     },
-}
-}
+})
+
+# Hand pooled DB connections back while waiting on Groq/Bria, so long generations don't hold them
+DB_RELEASE_DURING_UPSTREAM = os.environ.get('DB_RELEASE_DURING_UPSTREAM', 'True') == 'True'
 
 
 
@@ -143,6 +180,14 @@ STATIC_ROOT = BASE_DIR / "staticfiles"
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
 
+# Image Store - generated scene images are downloaded once into STORAGES[IMAGE_STORE_STORAGE]
+IMAGE_STORE_STORAGE = os.environ.get('IMAGE_STORE_STORAGE', 'default')
+IMAGE_STORE_SERVE_FROM_STORAGE = os.environ.get('IMAGE_STORE_SERVE_FROM_STORAGE', 'False') == 'True'  # e.g. S3/CDN
+IMAGE_DERIVATIVES = {
+    'thumb': {'width': 480, 'quality': 75},
+    'viewer': {'width': 4096, 'quality': 85},  # Pannellum's safe texture width
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
@@ -162,23 +207,184 @@ WORKOS_CLIENT_ID = os.environ.get('WORKOS_CLIENT_ID', '')
 WORKOS_API_KEY = os.environ.get('WORKOS_API_KEY', '')
 WORKOS_REDIRECT_URI = os.environ.get('WORKOS_REDIRECT_URI', 'http://localhost:8000/auth/callback/')
 
-# Bria FIBO Configuration
+# Bria FIBO Configuration - the URLs default to the production API when empty
 BRIA_TRANSLATOR_URL = os.environ.get('BRIA_TRANSLATOR_URL', '')
 BRIA_GENERATOR_URL = os.environ.get('BRIA_GENERATOR_URL', '')
 BRIA_API_KEY = os.environ.get('BRIA_API_KEY', '')
 
 # Groq AI Configuration
 GROQ_API_KEY = os.environ.get('GROQ_API_KEY', '')
+GROQ_API_URL = os.environ.get('GROQ_API_URL', 'https://api.groq.com/openai/v1/chat/completions')
+
+# Outbound HTTP - keep-alive connection pools shared by the Groq and Bria services
+HTTP_POOL_MAXSIZE = int(os.environ.get('HTTP_POOL_MAXSIZE', '10'))  # Connections kept per host
+HTTP_CONNECT_TIMEOUT = float(os.environ.get('HTTP_CONNECT_TIMEOUT', '10'))
+HTTP_RETRY_ATTEMPTS = int(os.environ.get('HTTP_RETRY_ATTEMPTS', '3'))
+HTTP_BACKOFF_BASE = float(os.environ.get('HTTP_BACKOFF_BASE', '0.5'))  # Seconds, doubled per retry
+HTTP_BACKOFF_MAX = float(os.environ.get('HTTP_BACKOFF_MAX', '8'))
+HTTP_TIMEOUTS = {  # Read timeouts in seconds per endpoint
+    'groq.scenes': 45,
+    'groq.quiz': 20,
+    'groq.journey': 90,  # Scenes and quizzes in one completion
+    'groq.quizzes': 40,
+    'groq.chat': 20,
+    'bria.translate': 60,
+    'bria.generate': 120,
+    'bria.download': 60,
+}
+
+# Circuit breakers per Groq/Bria endpoint - fail fast to the fallbacks while an endpoint is down
+# (options in home/circuit_breaker.py); adaptive timeouts shrink HTTP_TIMEOUTS towards observed p95 latency
+CIRCUIT_BREAKER_ENABLED = os.environ.get('CIRCUIT_BREAKER_ENABLED', 'True') == 'True'
+HTTP_ADAPTIVE_TIMEOUTS = os.environ.get('HTTP_ADAPTIVE_TIMEOUTS', 'True') == 'True'
+CIRCUIT_BREAKER = {
+    'ERROR_RATE': float(os.environ.get('CIRCUIT_BREAKER_ERROR_RATE', '0.5')),
+    'OPEN_SECONDS': float(os.environ.get('CIRCUIT_BREAKER_OPEN_SECONDS', '30')),
+}
+
+# Outbound rate limits per Groq/Bria endpoint or provider (options in home/rate_limiter.py), shared
+# by every process on the host through lock files in OUTBOUND_LOCK_DIR; empty keeps them per process
+OUTBOUND_LOCK_DIR = os.environ.get('OUTBOUND_LOCK_DIR', str(BASE_DIR / '.cache' / 'outbound'))
+OUTBOUND_QUEUE_TIMEOUT = float(os.environ.get('OUTBOUND_QUEUE_TIMEOUT', '30'))
+OUTBOUND_LIMITS = {
+    'groq': {
+        'CONCURRENCY': int(os.environ.get('GROQ_MAX_CONCURRENCY', '8')),
+        'RATE': float(os.environ.get('GROQ_RATE_PER_SECOND', '5')),
+        'BURST': 10,
+        'RESERVED': 2,  # Kept for owl chat
+    },
+    'bria.translate': {
+        'CONCURRENCY': int(os.environ.get('BRIA_TRANSLATE_MAX_CONCURRENCY', '6')),
+        'RATE': float(os.environ.get('BRIA_TRANSLATE_RATE_PER_SECOND', '2')),
+        'BURST': 6,
+    },
+    'bria.generate': {
+        'CONCURRENCY': int(os.environ.get('BRIA_GENERATE_MAX_CONCURRENCY', '4')),
+        'RATE': float(os.environ.get('BRIA_GENERATE_RATE_PER_SECOND', '1')),
+        'BURST': 4,
+        'RESERVED': 1,  # Kept for learners regenerating a scene
+        'QUEUE_TIMEOUT': 120,  # Image generation is slow anyway
+    },
+}
+
+# Per-user throttling of the endpoints that start Groq/Bria work; counters live in the THROTTLE_CACHE
+# alias, which must be shared by all workers for the limits to hold across them
+THROTTLE_ENABLED = os.environ.get('THROTTLE_ENABLED', 'True') == 'True'
+THROTTLE_CACHE = os.environ.get('THROTTLE_CACHE', 'default')
+THROTTLE_RATES = {  # Scope -> "<requests>/<second|minute|hour|day>" rules, all of which apply
+    'generate': os.environ.get('THROTTLE_GENERATE_RATES', '5/minute,30/hour').split(','),
+    'regenerate': os.environ.get('THROTTLE_REGENERATE_RATES', '5/minute,40/hour').split(','),
+    'owl_chat': os.environ.get('THROTTLE_OWL_CHAT_RATES', '20/minute,200/hour').split(','),
+}
+
+# Single-flight: identical Groq/Bria calls in flight at once share one upstream request. Workers
+# find each other's calls through the SINGLE_FLIGHT_CACHE alias, which needs an atomic add() and
+# must be shared by all workers to dedupe across them (local memory only dedupes per process)
+SINGLE_FLIGHT_ENABLED = os.environ.get('SINGLE_FLIGHT_ENABLED', 'True') == 'True'
+SINGLE_FLIGHT_CACHE = os.environ.get('SINGLE_FLIGHT_CACHE', 'default')
+SINGLE_FLIGHT_TIMEOUT = float(os.environ.get('SINGLE_FLIGHT_TIMEOUT', '150'))  # Longest wait on another call
+
+# Django Caches - "sessions" is local memory per process, or "file" to share it between workers on one host
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'sessions': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache'
+        if os.environ.get('SESSION_CACHE_BACKEND', 'locmem') == 'file'
+        else 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': os.environ.get('SESSION_CACHE_LOCATION', str(BASE_DIR / '.cache' / 'sessions')),
+    },
+}
+
+# Response Caches - backend is "lru" (per process), "django" (CACHES default) or "db" (shared table)
+# MAX_ENTRIES bounds "lru" and "db"; "django" is bounded by that cache's own OPTIONS['MAX_ENTRIES']
+RESPONSE_CACHES = {
+    'bria.translate': {
+        'BACKEND': os.environ.get('BRIA_TRANSLATE_CACHE_BACKEND', 'lru'),
+        'TTL': int(os.environ.get('BRIA_TRANSLATE_CACHE_TTL', '604800')),  # 1 week
+        'MAX_ENTRIES': int(os.environ.get('BRIA_TRANSLATE_CACHE_MAX_ENTRIES', '2000')),
+    },
+}
+
+# Topic Cache - share Groq scenes and quizzes between learners asking for the same topic
+TOPIC_CACHE_ENABLED = os.environ.get('TOPIC_CACHE_ENABLED', 'True') == 'True'
+TOPIC_CACHE_MAX_AGE = int(os.environ.get('TOPIC_CACHE_MAX_AGE', str(30 * 86400)))  # Seconds
+TOPIC_CACHE_DEFAULT_VARIETY = float(os.environ.get('TOPIC_CACHE_DEFAULT_VARIETY', '0'))  # Chance of fresh content
+TOPIC_SYNONYMS = {  # Normalized topic -> canonical normalized topic
+    'rome': 'ancient rome',
+    'roman empire': 'ancient rome',
+    'amazon': 'amazon rainforest',
+    'amazon rain forest': 'amazon rainforest',
+}
+
+# Generate scenes and their quizzes in one Groq completion instead of four
+GROQ_BATCHED_GENERATION = os.environ.get('GROQ_BATCHED_GENERATION', 'True') == 'True'
+
+# Generation Jobs - run by `python manage.py run_generation_worker`
+# Set to True in development to run jobs in a thread inside the web process instead
+GENERATION_JOBS_RUN_INLINE = os.environ.get('GENERATION_JOBS_RUN_INLINE', 'False') == 'True'
+
+# Scene Prefetch - when scenes 2 and 3 are generated
+# "eager": all scenes in parallel before the journey opens
+# "speculative": Scene 1 first, later scenes queued in the background
+# "lazy": later scenes generated when a quiz unlocks them
+SCENE_PREFETCH_MODE = os.environ.get('SCENE_PREFETCH_MODE', 'speculative')
+SCENE_PREFETCH_WORKERS = int(os.environ.get('SCENE_PREFETCH_WORKERS', '3'))
+
+# Scene Variations - regeneration history learners can restore from; each scene keeps its newest
+# SCENE_VARIATIONS_KEEP, and `python manage.py prune_scene_variations` drops any older than MAX_AGE days
+SCENE_VARIATIONS_KEEP = int(os.environ.get('SCENE_VARIATIONS_KEEP', '10'))
+SCENE_VARIATIONS_MAX_AGE = int(os.environ.get('SCENE_VARIATIONS_MAX_AGE', '90'))
+SCENE_VARIATIONS_PAGE_SIZE = int(os.environ.get('SCENE_VARIATIONS_PAGE_SIZE', '12'))
+
+# Demo Catalog - JSON demo sources built into DemoJourney rows by `python manage.py build_demo_catalog`
+DEMO_CATALOG_DIRS = [BASE_DIR / 'home' / 'demos']
+
+# Async Views - serve generate/quiz/regenerate/owl chat from home.async_views
+# Only worth it under ASGI (e.g. `uvicorn fibo.asgi:application`)
+ASYNC_VIEWS = os.environ.get('ASYNC_VIEWS', 'False') == 'True'
+HTTP_ASYNC_MAX_CONNECTIONS = int(os.environ.get('HTTP_ASYNC_MAX_CONNECTIONS', '500'))  # In-flight Groq/Bria calls
+
+# Timing Log - one logfmt line per upstream call, generation step and view (record also in extra["timing"])
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "formatters": {
+        "timing": {"format": "%(asctime)s %(message)s"},
+    },
+    "handlers": {
+        "timing": {"class": "logging.StreamHandler", "formatter": "timing"},
+    },
+    "loggers": {
+        "home.timing": {
+            "handlers": ["timing"],
+            "level": os.environ.get('TIMING_LOG_LEVEL', 'INFO'),
+            "propagate": False,
+        },
+    },
+}
+
+# Request Profiling - Server-Timing header on every response (db, upstream, tpl, total)
+SERVER_TIMING_ENABLED = os.environ.get('SERVER_TIMING_ENABLED', 'True') == 'True'
+# cProfile a sample of requests; keep those slower than the threshold as .prof files (empty dir disables)
+SLOW_REQUEST_PROFILE_DIR = os.environ.get('SLOW_REQUEST_PROFILE_DIR', '')
+SLOW_REQUEST_THRESHOLD = float(os.environ.get('SLOW_REQUEST_THRESHOLD', '1.0'))  # Seconds
+SLOW_REQUEST_SAMPLE_RATE = float(os.environ.get('SLOW_REQUEST_SAMPLE_RATE', '0.1'))
 
 # Login/Logout URLs
 LOGIN_REDIRECT_URL = "/?/"
 LOGOUT_REDIRECT_URL = "/"
 LOGIN_URL = "/auth/login/"
 
-# Session Configuration - Store sessions in database so they persist across server restarts
-SESSION_ENGINE = "django.contrib.sessions.backends.db"
+# Session Configuration - cached_db reads sessions from the cache and writes to the database only when
+# they change, so they still persist across restarts; "django.contrib.sessions.backends.signed_cookies"
+# keeps them out of the database entirely
+SESSION_ENGINE = os.environ.get('SESSION_ENGINE', 'django.contrib.sessions.backends.cached_db')
+SESSION_CACHE_ALIAS = 'sessions'
 SESSION_COOKIE_AGE = 1209600  # 2 weeks in seconds
-SESSION_SAVE_EVERY_REQUEST = True  # Update session on every request
+SESSION_SAVE_EVERY_REQUEST = False  # fibo.middleware.SessionRefreshMiddleware extends expiry instead
+SESSION_REFRESH_THRESHOLD = int(os.environ.get('SESSION_REFRESH_THRESHOLD', str(SESSION_COOKIE_AGE // 2)))  # Seconds left
 SESSION_COOKIE_HTTPONLY = True
 SESSION_COOKIE_SECURE = False  # Set to True in production with HTTPS
 
@@ -0,0 +1,23 @@
+"""
+Django template backend that times each top-level render for the Server-Timing header
+"""
+from django.template.backends import django as django_backend
+
+from home.instrumentation import timed
+
+
+class Template(django_backend.Template):
+
+    def render(self, context=None, request=None):
+        with timed('template_render', template=self.template.origin.template_name or 'string'):
+            return super().render(context, request)
+
+
+class DjangoTemplates(django_backend.DjangoTemplates):
+
+    def from_string(self, template_code):
+        return Template(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return Template(template.template, self)
@@ -0,0 +1,163 @@
+"""
+Async versions of the views that wait on Groq and Bria
+Used instead of home.views when settings.ASYNC_VIEWS is on, so an ASGI worker can hold
+many in-flight generations without a thread for each
+"""
+from asgiref.sync import sync_to_async
+from django.shortcuts import redirect, aget_object_or_404
+from django.contrib.auth.decorators import login_required
+from django.contrib import messages
+from django.http import JsonResponse
+from django.views.decorators.http import require_POST
+from home.models import Topic, Scene
+from home.bria_service import AsyncBriaFIBOService
+from home.groq_service import AsyncGroqAIService
+from home import jobs, topic_cache, rate_limiter, scene_history, throttling
+from home.views import _grade_quiz, _quiz_result
+import json
+
+
+@login_required
+@throttling.throttle('generate')
+async def generate_journey(request):
+    """Generate 3-scene educational journey"""
+    if request.method == 'POST':
+        topic_text = request.POST.get('topic', '').strip()
+        subject_type = request.POST.get('subject_type', 'history')
+
+        if not topic_text:
+            messages.error(request, 'Please enter a topic')
+            return redirect('home:home')
+
+        try:
+            topic = await Topic.objects.acreate(
+                user=await request.auser(),
+                topic=topic_text,
+                subject_type=subject_type,
+                scenes_data=await sync_to_async(topic_cache.cached_scenes)(topic_text, subject_type),
+                scenes_unlocked=[1],  # Scene 1 always unlocked
+                current_scene=1
+            )
+            await sync_to_async(jobs.enqueue_journey)(topic)
+
+            messages.success(request, 'Journey started! Scene 1 is being generated.')
+            return redirect('home:journey', topic_id=topic.id)
+
+        except Exception as e:
+            print(f"Error generating journey: {str(e)}")
+            messages.error(request, f'Error: {str(e)}')
+            return redirect('home:home')
+
+    return redirect('home:home')
+
+
+@login_required
+@require_POST
+async def submit_quiz(request, topic_id, scene_number):
+    """Submit quiz answers and unlock next scene"""
+    user = await request.auser()
+    scene = await aget_object_or_404(Scene, topic_id=topic_id, topic__user=user, scene_number=scene_number)
+
+    try:
+        data = json.loads(request.body)
+        topic, correct, total, next_scene_num = await sync_to_async(_grade_quiz)(
+            topic_id, user, scene, data.get('answers', [])
+        )
+
+        # Generate next scene if not exists - after the row lock is released
+        if next_scene_num:
+            if jobs.prefetch_mode() != jobs.PREFETCH_LAZY:
+                await sync_to_async(jobs.ensure_scene)(topic, next_scene_num)  # Usually already prefetched
+            elif not await topic.scenes.filter(scene_number=next_scene_num).aexists():
+                await generate_next_scene(topic, next_scene_num)
+
+        return JsonResponse(_quiz_result(topic, correct, total))
+
+    except Exception as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+
+
+async def generate_next_scene(topic, scene_number):
+    """Generate the next scene without blocking the event loop"""
+    try:
+        await jobs.abuild_scene(topic, scene_number)
+    except Exception as e:
+        print(f"Error generating scene {scene_number}: {str(e)}")
+
+
+@login_required
+@require_POST
+@throttling.throttle('regenerate')
+@rate_limiter.prioritized(rate_limiter.PRIORITY_INTERACTIVE)  # The learner is watching the spinner
+async def regenerate_scene(request, topic_id, scene_number):
+    """Regenerate scene with edited JSON or simple customization"""
+    topic = await aget_object_or_404(Topic, id=topic_id, user=await request.auser())
+    scene = await aget_object_or_404(Scene, topic=topic, scene_number=scene_number)
+    json_scene = None
+
+    try:
+        data = json.loads(request.body)
+        bria = AsyncBriaFIBOService()
+
+        # Check if it's simple customization or JSON edit
+        if 'enhanced_prompt' in data:
+            # Simple customization from student or demo generation
+            enhanced_prompt = data.get('enhanced_prompt')
+            is_demo = data.get('generate_demo', False)
+
+            # Generate new scene with enhanced prompt - students regenerating want variety
+            scene_result = await bria.translate_to_scene(enhanced_prompt, 'single', use_cache=is_demo)
+            json_scene = scene_result.get('scene', scene.json_scene)
+            result = await bria.generate_image(json_scene, enhanced_prompt)
+
+            # Update generation status if it was a demo
+            if is_demo and result.get('status') == 'success':
+                scene.generation_status = 'completed'
+        else:
+            # Advanced JSON editing
+            json_scene = data.get('json_scene', scene.json_scene)
+            result = await bria.generate_image(json_scene, scene.description)
+
+        if result.get('status') == 'success':
+            original = scene_history.snapshot(scene)
+            scene.json_scene = json_scene if json_scene is not None else scene.json_scene
+            scene.image_url = result.get('image_url')
+            scene.image = None  # Downloaded into the image store by the worker
+            await sync_to_async(scene_history.save_regeneration)(scene, original, data.get('enhanced_prompt', ''))
+            await sync_to_async(jobs.enqueue_images)(topic, scene.scene_number)
+
+            return JsonResponse({
+                'status': 'success',
+                'image_url': scene.display_image_url
+            })
+        else:
+            return JsonResponse({
+                'status': 'error',
+                'message': result.get('message', 'Failed to generate')
+            }, status=400)
+
+    except Exception as e:
+        print(f"Regenerate error: {str(e)}")
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+
+
+@login_required
+@require_POST
+@throttling.throttle('owl_chat')
+async def owl_chat(request):
+    """Owl responds to user questions"""
+    try:
+        data = json.loads(request.body)
+        message = data.get('message', '')
+        context = data.get('context', '')
+
+        groq = AsyncGroqAIService()
+        response = await groq.owl_chat(message, context)
+
+        return JsonResponse({
+            'status': 'success',
+            'response': response
+        })
+    except Exception as e:
+        print(f"Owl Chat Error: {str(e)}")
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
@@ -0,0 +1,412 @@
+"""
+Load-test harness for WiseOwl
+FakeUpstream stands in for Groq and Bria on a local port (configurable latency, error rate
+and payload size); simulated learners drive the real URL routes concurrently and the run
+is summarised as JSON by `python manage.py run_benchmark`
+"""
+import io
+import itertools
+import json
+import math
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+from django.core.signals import request_started
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+from home.models import GenerationJob
+
+
+# Fake upstream
+
+class _UpstreamHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # Keep-alive, like the real APIs behind our pooled clients
+
+    def do_GET(self):
+        self.server.upstream.handle(self, b'')
+
+    def do_POST(self):
+        self.server.upstream.handle(self, self.rfile.read(int(self.headers.get('Content-Length', 0))))
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeUpstream:
+    """
+    Local Groq and Bria stand-in
+
+    Routes (point GROQ_API_URL / BRIA_*_URL at them, see settings_overrides()):
+        POST /groq/chat/completions        scenes, quizzes and owl chat (streaming too)
+        POST /bria/structured_prompt/generate
+        POST /bria/image/generate          returns an image URL on this server
+        GET  /bria/images/<n>.jpg          a unique JPEG per generated image
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, groq_latency=0.3, bria_latency=0.5,
+                 error_rate=0.0, payload_kb=4, image_width=1024, seed=None):
+        self.groq_latency = groq_latency
+        self.bria_latency = bria_latency
+        self.error_rate = error_rate
+        self.payload_kb = payload_kb
+        self.random = random.Random(seed)
+        self.serial = itertools.count(1)
+        self.requests = {}  # Route -> count
+        self.errors = {}  # Route -> injected errors
+        self._lock = threading.Lock()
+        self._jpeg = _noise_jpeg(image_width)
+        self.server = ThreadingHTTPServer((host, port), _UpstreamHandler)
+        self.server.daemon_threads = True
+        self.server.upstream = self
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def settings_overrides(self):
+        """Django settings that send the services here"""
+        return {
+            'GROQ_API_URL': f'{self.base_url}/groq/chat/completions',
+            'BRIA_TRANSLATOR_URL': f'{self.base_url}/bria/structured_prompt/generate',
+            'BRIA_GENERATOR_URL': f'{self.base_url}/bria/image/generate',
+        }
+
+    def stats(self):
+        with self._lock:
+            return {'requests': dict(self.requests), 'injected_errors': dict(self.errors)}
+
+    def handle(self, handler, body):
+        route = re.sub(r'/\d+\.jpg$', '/<n>.jpg', handler.path)
+        self._count(self.requests, route)
+
+        if handler.command == 'GET':
+            if not route.startswith('/bria/images/'):
+                return self._send(handler, 404, 'text/plain', b'not found')
+            serial = handler.path.rsplit('/', 1)[-1].split('.')[0]
+            return self._send(handler, 200, 'image/jpeg', _with_comment(self._jpeg, serial.encode()))
+
+        latency = self.groq_latency if route.startswith('/groq/') else self.bria_latency
+        time.sleep(latency * self.random.uniform(0.5, 1.5))
+        if self.random.random() < self.error_rate:
+            self._count(self.errors, route)
+            return self._send(handler, 503, 'application/json', b'{"error": "injected by FakeUpstream"}')
+
+        if route == '/groq/chat/completions':
+            return self._groq(handler, json.loads(body))
+        if route == '/bria/structured_prompt/generate':
+            scene = {'short_description': f'Benchmark scene {next(self.serial)}', 'style': 'photorealistic'}
+            return self._send_json(handler, {'result': {'structured_prompt': json.dumps(scene)}})
+        if route == '/bria/image/generate':
+            return self._send_json(handler, {'result': {'image_url': f'{self.base_url}/bria/images/{next(self.serial)}.jpg'}})
+        return self._send(handler, 404, 'text/plain', b'not found')
+
+    def _groq(self, handler, payload):
+        prompt = ' '.join(message['content'] for message in payload.get('messages', []))
+        if 'Format as JSON' not in prompt:  # Owl chat
+            answer = 'Great question! ' + 'Owls have been watching over learners for centuries. ' * 3
+            if payload.get('stream'):
+                events = [
+                    'data: ' + json.dumps({'choices': [{'delta': {'content': word + ' '}}]})
+                    for word in answer.split()
+                ]
+                body = '\n\n'.join([*events, 'data: [DONE]']) + '\n\n'
+                return self._send(handler, 200, 'text/event-stream', body.encode())
+            return self._send_json(handler, {'choices': [{'message': {'content': answer.strip()}}]})
+
+        # One document that satisfies every structured prompt: scenes, quizzes and questions
+        serial = next(self.serial)
+        sentence = 'The learner looks around and notices something new. '
+        size = max(self.payload_kb, 1) * 1024
+        narration = (sentence * (size // len(sentence) + 1))[:size]
+        content = {
+            'scenes': [
+                {
+                    'number': number,
+                    'title': f'Benchmark Scene {number}',
+                    'description': f'A 360 degree panorama number {number} of journey {serial}, busy and bright.',
+                    'narration': narration,
+                    'quiz': _fake_quiz(number),
+                }
+                for number in (1, 2, 3)
+            ],
+            'quizzes': [{'scene': number, **_fake_quiz(number)} for number in (1, 2, 3)],
+            'questions': _fake_quiz(0)['questions'],
+        }
+        return self._send_json(handler, {'choices': [{'message': {'content': json.dumps(content)}}]})
+
+    def _count(self, counts, route):
+        with self._lock:
+            counts[route] = counts.get(route, 0) + 1
+
+    def _send_json(self, handler, data):
+        self._send(handler, 200, 'application/json', json.dumps(data).encode())
+
+    def _send(self, handler, status, content_type, body):
+        handler.send_response(status)
+        handler.send_header('Content-Type', content_type)
+        handler.send_header('Content-Length', str(len(body)))
+        handler.end_headers()
+        handler.wfile.write(body)
+
+
+def _fake_quiz(scene_number):
+    return {'questions': [
+        {
+            'question': f'What stands out in scene {scene_number} ({index + 1})?',
+            'options': ['A) The river', 'B) The temple', 'C) The market', 'D) The forest'],
+            'correct': index,
+            'explanation': 'It is in the foreground of the scene.',
+        }
+        for index in range(2)
+    ]}
+
+
+def _noise_jpeg(width):
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.effect_noise((width, width // 2), 48).convert('RGB').save(buffer, 'JPEG', quality=85)
+    return buffer.getvalue()
+
+
+def _with_comment(jpeg, comment):
+    """The same image with a COM segment after SOI, so every download has its own digest"""
+    return jpeg[:2] + b'\xff\xfe' + (len(comment) + 2).to_bytes(2, 'big') + comment + jpeg[2:]
+
+
+# Simulated learners
+
+SERVER_TIMING_DB = re.compile(r'db;dur=([\d.]+);desc="(\d+) queries"')
+SERVER_TIMING_UPSTREAM = re.compile(r'upstream;dur=([\d.]+)')
+
+
+class Recorder:
+    """Thread-safe log of (route, seconds, status, db queries, upstream ms) samples"""
+
+    def __init__(self):
+        self.samples = []
+        self.journeys_ready = []  # Seconds from POST generate/ until the job finished
+        self._lock = threading.Lock()
+
+    def add(self, route, seconds, status, response=None):
+        timing = response.headers.get('Server-Timing', '') if response is not None else ''
+        db = SERVER_TIMING_DB.search(timing)
+        upstream = SERVER_TIMING_UPSTREAM.search(timing)
+        with self._lock:
+            self.samples.append((
+                route, seconds, status,
+                int(db.group(2)) if db else None,
+                float(upstream.group(1)) if upstream else None,
+            ))
+
+    def journey_ready(self, seconds):
+        with self._lock:
+            self.journeys_ready.append(seconds)
+
+
+class Learner:
+    """One simulated learner: log in, then per journey generate, wait, quiz, regenerate and chat"""
+
+    def __init__(self, base_url, name, recorder, journeys=1, owl_chats=2, ready_timeout=120):
+        self.base_url = base_url.rstrip('/')
+        self.name = name
+        self.recorder = recorder
+        self.journeys = journeys
+        self.owl_chats = owl_chats
+        self.ready_timeout = ready_timeout
+        self.session = requests.Session()
+
+    def run(self):
+        self.request('landing', 'GET', '/')
+        self.request('login', 'POST', '/auth/login/', data={'username': self.name})
+        for number in range(1, self.journeys + 1):
+            self.journey(f'{self.name} topic {number}')
+
+    def journey(self, topic):
+        started = time.monotonic()
+        response = self.request('generate', 'POST', '/generate/', allow_redirects=False,
+                                data={'topic': topic, 'subject_type': 'history'})
+        match = re.search(r'/journey/(\d+)/', response.headers.get('Location', '') if response is not None else '')
+        if not match:
+            return
+        topic_id = match.group(1)
+
+        page = self.request('journey', 'GET', f'/journey/{topic_id}/')
+        job = re.search(r'/jobs/(\d+)/', page.text if page is not None else '')
+        if job and self.wait_for_job(job.group(1)):
+            self.recorder.journey_ready(time.monotonic() - started)
+
+        self.request('submit_quiz', 'POST', f'/submit-quiz/{topic_id}/1/', json={'answers': [0, 1]})
+        self.request('regenerate', 'POST', f'/regenerate/{topic_id}/1/',
+                     json={'enhanced_prompt': f'{topic} at sunset'})
+        for _ in range(self.owl_chats):
+            self.request('owl_chat', 'POST', '/owl-chat/', json={'message': f'Why does {topic} matter?', 'context': topic})
+
+    def wait_for_job(self, job_id):
+        deadline = time.monotonic() + self.ready_timeout
+        while time.monotonic() < deadline:
+            response = self.request('job_status', 'GET', f'/jobs/{job_id}/')
+            if response is not None and response.ok and response.json()['status'] not in GenerationJob.ACTIVE_STATUSES:
+                return response.json()['status'] == GenerationJob.STATUS_COMPLETED
+            time.sleep(0.2)
+        return False
+
+    def request(self, route, method, path, **kwargs):
+        """Timed request recorded under route; None if the connection failed"""
+        if method == 'POST':
+            token = self.session.cookies.get('csrftoken', '')
+            kwargs.setdefault('headers', {})['X-CSRFToken'] = token
+            if 'data' in kwargs:
+                kwargs['data']['csrfmiddlewaretoken'] = token
+        started = time.monotonic()
+        try:
+            response = self.session.request(method, self.base_url + path, timeout=self.ready_timeout, **kwargs)
+        except requests.RequestException:
+            self.recorder.add(route, time.monotonic() - started, None)
+            return None
+        self.recorder.add(route, time.monotonic() - started, response.status_code, response)
+        return response
+
+
+def run_learners(base_url, learners=10, prefix='bench', **learner_options):
+    """Run learners concurrently against base_url; returns (Recorder, wall seconds)"""
+    recorder = Recorder()
+    stamp = int(time.time())
+    threads = [
+        threading.Thread(target=Learner(base_url, f'{prefix}-{stamp}-{number}', recorder, **learner_options).run)
+        for number in range(1, learners + 1)
+    ]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return recorder, time.monotonic() - started
+
+
+class TableWriteCounter:
+    """Counts INSERT/UPDATE/DELETE statements per table on every connection in this process"""
+
+    WRITE_SQL = re.compile(r'\s*(INSERT\s+INTO|UPDATE|DELETE\s+FROM)\s+[`"]?(\w+)', re.IGNORECASE)
+
+    def __init__(self):
+        self.writes = {}  # Table -> {"INSERT": n, "UPDATE": n, "DELETE": n}
+        self._lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        match = self.WRITE_SQL.match(sql)
+        if match:
+            verb, table = match.group(1).split()[0].upper(), match.group(2)
+            with self._lock:
+                counts = self.writes.setdefault(table, {})
+                counts[verb] = counts.get(verb, 0) + 1
+        return execute(sql, params, many, context)
+
+    def install(self):
+        connection_created.connect(self._attach, dispatch_uid=id(self))
+        request_started.connect(self._attach_all, dispatch_uid=id(self))
+        self._attach_all()
+
+    def uninstall(self):
+        connection_created.disconnect(dispatch_uid=id(self))
+        request_started.disconnect(dispatch_uid=id(self))
+
+    def _attach(self, connection, **kwargs):
+        if self not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self)
+
+    def _attach_all(self, **kwargs):
+        for connection in connections.all(initialized_only=True):
+            self._attach(connection)
+
+
+# Reporting
+
+def percentile(values, p):
+    """Nearest-rank percentile of values (0 < p <= 100)"""
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(p / 100 * len(ordered)) - 1))]
+
+
+def latency_summary(seconds, duration):
+    milliseconds = [value * 1000 for value in seconds]
+    return {
+        'count': len(milliseconds),
+        'throughput_rps': round(len(milliseconds) / duration, 2) if duration else None,
+        'mean_ms': round(sum(milliseconds) / len(milliseconds), 1) if milliseconds else None,
+        'p50_ms': _round(percentile(milliseconds, 50)),
+        'p95_ms': _round(percentile(milliseconds, 95)),
+        'p99_ms': _round(percentile(milliseconds, 99)),
+        'max_ms': _round(max(milliseconds, default=None)),
+    }
+
+
+def summarize(recorder, duration):
+    """JSON-serialisable results: per-route latency, errors, DB queries and upstream time"""
+    routes = {}
+    for route in sorted({sample[0] for sample in recorder.samples}):
+        samples = [sample for sample in recorder.samples if sample[0] == route]
+        queries = [sample[3] for sample in samples if sample[3] is not None]
+        upstream = [sample[4] for sample in samples if sample[4] is not None]
+        routes[route] = {
+            **latency_summary([sample[1] for sample in samples], duration),
+            'errors': sum(1 for sample in samples if sample[2] is None or sample[2] >= 400),
+            'db_queries_mean': round(sum(queries) / len(queries), 1) if queries else None,
+            'db_queries_max': max(queries, default=None),
+            'upstream_ms_mean': round(sum(upstream) / len(upstream), 1) if upstream else None,
+        }
+    return {
+        'duration_s': round(duration, 2),
+        'total': {
+            **latency_summary([sample[1] for sample in recorder.samples], duration),
+            'errors': sum(route['errors'] for route in routes.values()),
+        },
+        'routes': routes,
+        'journey_ready': latency_summary(recorder.journeys_ready, duration),
+    }
+
+
+def compare(current, previous, fields=('p50_ms', 'p95_ms', 'p99_ms', 'throughput_rps', 'db_queries_mean')):
+    """Rows of (route, field, previous, current, change %) for two saved results"""
+    rows = []
+    sections = {'total': (current['total'], previous['total'])}
+    sections.update(
+        (route, (stats, previous['routes'][route]))
+        for route, stats in current['routes'].items() if route in previous['routes']
+    )
+    for name, (now, before) in sections.items():
+        for field in fields:
+            if now.get(field) is not None and before.get(field) is not None:
+                rows.append((name, field, before[field], now[field], _change(before[field], now[field])))
+
+    writes, previous_writes = current.get('db_writes', {}), previous.get('db_writes', {})
+    for table in sorted(writes.keys() & previous_writes.keys()):
+        before, now = sum(previous_writes[table].values()), sum(writes[table].values())
+        rows.append((table, 'writes', before, now, _change(before, now)))
+    return rows
+
+
+def _change(before, now):
+    return _round((now - before) / before * 100) if before else None
+
+
+def _round(value):
+    return round(value, 1) if value is not None else None
@@ -2,30 +2,40 @@
 Bria FIBO Integration Service
 Handles all API calls to Bria Translator and Generator
 """
-import requests
 import json
+from asgiref.sync import sync_to_async
 from django.conf import settings
+from home import single_flight
+from home.http_client import get_http_client, get_async_http_client
+from home.response_cache import get_response_cache, make_key
+
+# Part of the translate cache key, so a Bria API upgrade never serves old scenes
+BRIA_API_VERSION = 'v2'
+BRIA_API_BASE = 'https://engine.prod.bria-api.com'
 
 
 class BriaFIBOService:
     """Service class for Bria FIBO API integration"""
     
     def __init__(self):
-        self.translator_url = "https://engine.prod.bria-api.com/v2/structured_prompt/generate"
-        self.generator_url = "https://engine.prod.bria-api.com/v2/image/generate"
+        self.translator_url = settings.BRIA_TRANSLATOR_URL or f"{BRIA_API_BASE}/{BRIA_API_VERSION}/structured_prompt/generate"
+        self.generator_url = settings.BRIA_GENERATOR_URL or f"{BRIA_API_BASE}/{BRIA_API_VERSION}/image/generate"
         self.api_key = settings.BRIA_API_KEY
         self.headers = {
             'api_token': self.api_key,
             'Content-Type': 'application/json'
         }
+        self.http = get_http_client()
+        self.translate_cache = get_response_cache('bria.translate')
     
-    def translate_to_scene(self, text, mode='single'):
+    def translate_to_scene(self, text, mode='single', use_cache=True):
         """
         Convert natural language text to structured JSON scene using Bria API
         
         Args:
             text: User's topic/description
             mode: Generation mode (single, timeline, map, quiz, storyboard)
+            use_cache: Set False to skip the translate cache (e.g. to get variety on regenerate)
         
         Returns:
             dict: JSON scene with FIBO parameters
@@ -34,41 +44,24 @@ class BriaFIBOService:
             # Build educational prompt based on mode
             educational_prompt = self._build_educational_prompt(text, mode)
             
-            payload = {
-                'prompt': educational_prompt,
-                'sync': True  # Wait for response
-            }
-            
-            # Retry logic for SSL issues
-            max_retries = 3
-            for attempt in range(max_retries):
-                try:
-                    response = requests.post(
-                        self.translator_url,
-                        headers=self.headers,
-                        json=payload,
-                        timeout=60
-                    )
-                    break
-                except (requests.exceptions.SSLError, requests.exceptions.ConnectionError) as e:
-                    print(f"Translator attempt {attempt + 1} failed: {str(e)}")
-                    if attempt == max_retries - 1:
-                        raise
-                    import time
-                    time.sleep(2)
-            
-            print(f"Translator API Response: {response.status_code}")
-            
-            if response.status_code == 200:
-                result = response.json()
-                structured_prompt = result.get('result', {}).get('structured_prompt', '{}')
-                return {
-                    'status': 'success',
-                    'scene': json.loads(structured_prompt) if isinstance(structured_prompt, str) else structured_prompt
-                }
+            cache_key = make_key(educational_prompt, mode, BRIA_API_VERSION)
+            if use_cache:
+                cached_scene = self.translate_cache.get(cache_key)
+                if cached_scene is not None:
+                    return {'status': 'success', 'scene': cached_scene, 'cached': True}
             else:
-                print(f"API Error: {response.text}")
-                return self._create_mock_scene(text, mode)
+                self.translate_cache.record_bypass()
+            
+            def translate():
+                response = self.http.post(
+                    self.translator_url,
+                    endpoint='bria.translate',
+                    headers=self.headers,
+                    json=self._translate_payload(educational_prompt)
+                )
+                return self._translate_response(response, text, mode, cache_key, use_cache)
+            # Identical translations already in flight are shared, even when skipping the cache
+            return single_flight.do('bria.translate', (cache_key, use_cache), translate)
                 
         except Exception as e:
             print(f"Translator API error: {str(e)}")
@@ -86,52 +79,12 @@ class BriaFIBOService:
             dict: Response with image_url
         """
         try:
-            # Convert JSON scene to string if needed
-            structured_prompt_str = json.dumps(json_scene) if isinstance(json_scene, dict) else json_scene
-            
-            payload = {
-                'prompt': prompt,
-                'structured_prompt': structured_prompt_str,
-                'aspect_ratio': '16:9',
-                'steps_num': 50,
-                'guidance_scale': 5,
-                'sync': True  # Wait for response
-            }
-            
-            # Retry logic for SSL issues
-            max_retries = 3
-            for attempt in range(max_retries):
-                try:
-                    response = requests.post(
-                        self.generator_url,
-                        headers=self.headers,
-                        json=payload,
-                        timeout=120
-                    )
-                    break
-                except (requests.exceptions.SSLError, requests.exceptions.ConnectionError) as e:
-                    print(f"Generator attempt {attempt + 1} failed: {str(e)}")
-                    if attempt == max_retries - 1:
-                        raise
-                    import time
-                    time.sleep(2)
-            
-            print(f"Generator API Response: {response.status_code}")
-            
-            if response.status_code == 200:
-                result = response.json()
-                image_url = result.get('result', {}).get('image_url')
-                if image_url:
-                    return {
-                        'status': 'success',
-                        'image_url': image_url
-                    }
-            
-            print(f"API Error: {response.text}")
-            return {
-                'status': 'error',
-                'message': f'Generator API returned {response.status_code}'
-            }
+            payload = self._generate_payload(json_scene, prompt)
+
+            def generate():
+                response = self.http.post(self.generator_url, endpoint='bria.generate', headers=self.headers, json=payload)
+                return self._generate_response(response)
+            return single_flight.do('bria.generate', payload, generate)
                 
         except Exception as e:
             print(f"Generator API error: {str(e)}")
@@ -140,6 +93,61 @@ class BriaFIBOService:
                 'message': str(e)
             }
     
+    def _translate_payload(self, educational_prompt):
+        return {
+            'prompt': educational_prompt,
+            'sync': True  # Wait for response
+        }
+    
+    def _translate_response(self, response, text, mode, cache_key, use_cache=True):
+        """Parse a translator response, caching real scenes and falling back to a mock one"""
+        print(f"Translator API Response: {response.status_code}")
+        
+        if response.status_code == 200:
+            result = response.json()
+            structured_prompt = result.get('result', {}).get('structured_prompt', '{}')
+            scene = json.loads(structured_prompt) if isinstance(structured_prompt, str) else structured_prompt
+            if use_cache:  # A regenerate's varied scene must not replace the one other learners share
+                self.translate_cache.set(cache_key, scene)
+            return {
+                'status': 'success',
+                'scene': scene
+            }
+        else:
+            print(f"API Error: {response.text}")
+            return self._create_mock_scene(text, mode)
+    
+    def _generate_payload(self, json_scene, prompt):
+        # Convert JSON scene to string if needed
+        structured_prompt_str = json.dumps(json_scene) if isinstance(json_scene, dict) else json_scene
+        
+        return {
+            'prompt': prompt,
+            'structured_prompt': structured_prompt_str,
+            'aspect_ratio': '16:9',
+            'steps_num': 50,
+            'guidance_scale': 5,
+            'sync': True  # Wait for response
+        }
+    
+    def _generate_response(self, response):
+        print(f"Generator API Response: {response.status_code}")
+        
+        if response.status_code == 200:
+            result = response.json()
+            image_url = result.get('result', {}).get('image_url')
+            if image_url:
+                return {
+                    'status': 'success',
+                    'image_url': image_url
+                }
+        
+        print(f"API Error: {response.text}")
+        return {
+            'status': 'error',
+            'message': f'Generator API returned {response.status_code}'
+        }
+    
     def _build_educational_prompt(self, text, mode):
         """Build an educational prompt for the topic with enhanced 360° depth"""
         # Enhanced immersive prompt for true 360° panoramic experience
@@ -232,3 +240,54 @@ class BriaFIBOService:
             'scene': base_scene
         }
 
+
+class AsyncBriaFIBOService(BriaFIBOService):
+    """BriaFIBOService on the async HTTP client, for the async views"""
+    
+    def __init__(self):
+        super().__init__()
+        self.http = get_async_http_client()
+    
+    async def translate_to_scene(self, text, mode='single', use_cache=True):
+        """Convert natural language text to structured JSON scene using Bria API"""
+        try:
+            educational_prompt = self._build_educational_prompt(text, mode)
+            
+            cache_key = make_key(educational_prompt, mode, BRIA_API_VERSION)
+            if use_cache:
+                cached_scene = await sync_to_async(self.translate_cache.get)(cache_key)
+                if cached_scene is not None:
+                    return {'status': 'success', 'scene': cached_scene, 'cached': True}
+            else:
+                self.translate_cache.record_bypass()
+            
+            async def translate():
+                response = await self.http.post(
+                    self.translator_url,
+                    endpoint='bria.translate',
+                    headers=self.headers,
+                    json=self._translate_payload(educational_prompt)
+                )
+                return await sync_to_async(self._translate_response)(response, text, mode, cache_key, use_cache)
+            return await single_flight.ado('bria.translate', (cache_key, use_cache), translate)
+                
+        except Exception as e:
+            print(f"Translator API error: {str(e)}")
+            return self._create_mock_scene(text, mode)
+    
+    async def generate_image(self, json_scene, prompt):
+        """Generate image from JSON scene using Bria API"""
+        try:
+            payload = self._generate_payload(json_scene, prompt)
+
+            async def generate():
+                response = await self.http.post(self.generator_url, endpoint='bria.generate', headers=self.headers, json=payload)
+                return self._generate_response(response)
+            return await single_flight.ado('bria.generate', payload, generate)
+                
+        except Exception as e:
+            print(f"Generator API error: {str(e)}")
+            return {
+                'status': 'error',
+                'message': str(e)
+            }
@@ -0,0 +1,207 @@
+"""
+Circuit breakers and adaptive timeouts for the Groq and Bria endpoints
+One CircuitBreaker per logical endpoint (e.g. 'groq.journey') is shared by every thread and
+event loop in the process. When an endpoint keeps failing the breaker opens and calls fail
+straight away with CircuitOpenError, so the services serve their fallbacks instead of waiting
+out timeouts and retries; after OPEN_SECONDS one probe call is let through to test recovery.
+Configured with CIRCUIT_BREAKER:
+
+    CIRCUIT_BREAKER = {
+        'WINDOW': 60,                # Seconds of calls the error rate is computed over
+        'MIN_CALLS': 10,             # Calls in the window before the error rate can open the breaker
+        'ERROR_RATE': 0.5,           # Share of failed calls that opens it
+        'CONSECUTIVE_FAILURES': 5,   # Failures in a row that open it regardless of traffic
+        'OPEN_SECONDS': 30,          # How long it stays open before a half-open probe
+        'TIMEOUT_MULTIPLIER': 3,     # Adaptive read timeout = p95 latency x this ...
+        'TIMEOUT_MIN': 5,            # ... but at least this, and at most the HTTP_TIMEOUTS value
+        'TIMEOUT_MIN_SAMPLES': 20,   # Successful calls needed before timeouts adapt
+    }
+"""
+import math
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+
+from home import metrics
+
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}  # For the circuit_breaker_state gauge
+
+DEFAULTS = {
+    'WINDOW': 60,
+    'MIN_CALLS': 10,
+    'ERROR_RATE': 0.5,
+    'CONSECUTIVE_FAILURES': 5,
+    'OPEN_SECONDS': 30,
+    'TIMEOUT_MULTIPLIER': 3,
+    'TIMEOUT_MIN': 5,
+    'TIMEOUT_MIN_SAMPLES': 20,
+}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an endpoint whose breaker is open"""
+
+    def __init__(self, endpoint, retry_in):
+        super().__init__(f"{endpoint} circuit open, retry in {retry_in:.0f}s")
+        self.endpoint = endpoint
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    """Rolling error rate and latency for one endpoint, with closed/open/half-open states"""
+
+    def __init__(self, name, window=60, min_calls=10, error_rate=0.5, consecutive_failures=5,
+                 open_seconds=30, timeout_multiplier=3, timeout_min=5, timeout_min_samples=20):
+        self.name = name
+        self.window = window
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.consecutive_failures = consecutive_failures
+        self.open_seconds = open_seconds
+        self.timeout_multiplier = timeout_multiplier
+        self.timeout_min = timeout_min
+        self.timeout_min_samples = timeout_min_samples
+
+        self.state = CLOSED
+        self._calls = deque()  # (finished at, ok)
+        self._latencies = deque(maxlen=200)  # Durations of recent successful calls
+        self._failures_in_row = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+        self._publish()
+
+    def before_call(self):
+        """Raise CircuitOpenError unless a call may go ahead; half-open lets a single probe through"""
+        with self._lock:
+            if self.state == CLOSED:
+                return
+            retry_in = self._opened_at + self.open_seconds - time.monotonic()
+            if self.state == OPEN and retry_in <= 0:
+                self._transition(HALF_OPEN)
+            if self.state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return
+        metrics.counter('circuit_breaker_rejections_total', 'Calls failed fast by an open circuit breaker').inc(
+            endpoint=self.name
+        )
+        raise CircuitOpenError(self.name, max(retry_in, 0))
+
+    def record(self, ok, duration=None):
+        """Outcome of a call let through by before_call()"""
+        now = time.monotonic()
+        with self._lock:
+            self._calls.append((now, ok))
+            self._trim(now)
+            if ok:
+                self._failures_in_row = 0
+                if duration is not None:
+                    self._latencies.append(duration)
+            else:
+                self._failures_in_row += 1
+
+            if self.state == HALF_OPEN:
+                self._probing = False
+                if ok:
+                    self._calls.clear()  # Judge the recovered endpoint on fresh calls only
+                    self._transition(CLOSED)
+                else:
+                    self._open(now)
+            elif self.state == CLOSED and not ok and self._should_open():
+                self._open(now)
+
+    def abandon(self):
+        """A call let through by before_call() that never reached the endpoint, e.g. it timed out queueing"""
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._probing = False
+
+    def timeout(self, ceiling):
+        """Read timeout for the next call: p95 of recent successes x multiplier, within [TIMEOUT_MIN, ceiling]"""
+        with self._lock:
+            latencies = sorted(self._latencies)
+        if len(latencies) < self.timeout_min_samples:
+            return ceiling
+        p95 = latencies[min(len(latencies) - 1, math.ceil(len(latencies) * 0.95) - 1)]
+        adaptive = min(ceiling, max(self.timeout_min, p95 * self.timeout_multiplier))
+        metrics.gauge('upstream_timeout_seconds', 'Adaptive read timeout per Groq/Bria endpoint').set(
+            round(adaptive, 3), endpoint=self.name
+        )
+        return adaptive
+
+    def stats(self):
+        with self._lock:
+            self._trim(time.monotonic())
+            calls = len(self._calls)
+            failures = sum(1 for _, ok in self._calls if not ok)
+            return {
+                'state': self.state,
+                'calls': calls,
+                'error_rate': round(failures / calls, 3) if calls else 0.0,
+                'failures_in_row': self._failures_in_row,
+                'latency_samples': len(self._latencies),
+            }
+
+    def _should_open(self):
+        if self._failures_in_row >= self.consecutive_failures:
+            return True
+        if len(self._calls) < self.min_calls:
+            return False
+        failures = sum(1 for _, ok in self._calls if not ok)
+        return failures / len(self._calls) >= self.error_rate
+
+    def _open(self, now):
+        self._opened_at = now
+        self._transition(OPEN)
+        print(f"Circuit breaker {self.name} opened for {self.open_seconds}s")
+
+    def _trim(self, now):
+        while self._calls and now - self._calls[0][0] > self.window:
+            self._calls.popleft()
+
+    def _transition(self, state):
+        self.state = state
+        metrics.counter('circuit_breaker_transitions_total', 'Circuit breaker state changes').inc(
+            endpoint=self.name, state=state
+        )
+        self._publish()
+
+    def _publish(self):
+        metrics.gauge('circuit_breaker_state', 'Circuit breaker state per endpoint (0 closed, 1 half-open, 2 open)').set(
+            STATE_VALUES[self.state], endpoint=self.name
+        )
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(endpoint):
+    """The process-wide breaker for an endpoint, created on first use from CIRCUIT_BREAKER"""
+    with _breakers_lock:
+        breaker = _breakers.get(endpoint)
+        if breaker is None:
+            options = {**DEFAULTS, **getattr(settings, 'CIRCUIT_BREAKER', {})}
+            breaker = _breakers[endpoint] = CircuitBreaker(
+                endpoint, **{key.lower(): value for key, value in options.items()}
+            )
+        return breaker
+
+
+def all_breaker_stats():
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {breaker.name: breaker.stats() for breaker in breakers}
+
+
+def reset():
+    """Forget every breaker, e.g. between tests or benchmark runs"""
+    with _breakers_lock:
+        _breakers.clear()
@@ -0,0 +1,133 @@
+"""
+Demo catalog for WiseOwl
+Demo journeys live as JSON files in DEMO_CATALOG_DIRS, are built into DemoJourney rows by
+`python manage.py build_demo_catalog`, and are cloned for learners without any API calls
+"""
+import json
+from pathlib import Path
+
+from django.conf import settings
+from django.db import transaction
+
+from home import image_store
+from home.models import DemoJourney, Scene, StoredImage, Topic
+
+
+SCENE_FIELDS = ('number', 'title', 'description', 'narration')
+
+
+def source_files():
+    """Demo source files from every DEMO_CATALOG_DIRS entry, in name order"""
+    for directory in getattr(settings, 'DEMO_CATALOG_DIRS', []):
+        yield from sorted(Path(directory).glob('*.json'))
+
+
+def load_source(path):
+    with open(path, encoding='utf-8') as f:
+        source = json.load(f)
+    missing = {'slug', 'topic', 'scenes'} - source.keys()
+    if missing:
+        raise ValueError(f"{path}: missing {', '.join(sorted(missing))}")
+    for number, scene in enumerate(source['scenes'], 1):
+        scene.setdefault('number', number)
+    return source
+
+
+def build_demo(source, groq=None, bria=None, refresh=False):
+    """
+    Create or update the DemoJourney for a source file
+
+    Args:
+        source: Parsed demo source (see load_source)
+        groq: GroqAIService used for scenes without a quiz
+        bria: BriaFIBOService used to pre-render scenes without an image; None skips images
+        refresh: Regenerate quizzes and images that a previous build already made
+
+    Returns:
+        DemoJourney
+    """
+    existing = DemoJourney.objects.filter(slug=source['slug']).first()
+    previous = {
+        scene.get('number'): scene for scene in (existing.scenes_data.get('scenes', []) if existing else [])
+    }
+
+    scenes = []
+    for scene in source['scenes']:
+        built = dict(scene)
+        if not refresh:
+            for key in ('quiz', 'image', 'json_scene'):
+                if key not in built and previous.get(scene['number'], {}).get(key):
+                    built[key] = previous[scene['number']][key]
+        scenes.append(built)
+
+    needs_quiz = [scene for scene in scenes if not scene.get('quiz')]
+    if needs_quiz and groq is not None:
+        for scene, quiz in zip(needs_quiz, groq.generate_quizzes(source['topic'], needs_quiz)):
+            scene['quiz'] = quiz
+
+    if bria is not None:
+        for scene in scenes:
+            if not scene.get('image'):
+                _render_image(bria, scene)
+
+    demo, _ = DemoJourney.objects.update_or_create(
+        slug=source['slug'],
+        defaults={
+            'title': source.get('title', source['topic']),
+            'tagline': source.get('tagline', ''),
+            'icon': source.get('icon', ''),
+            'order': source.get('order', 0),
+            'topic': source['topic'],
+            'subject_type': source.get('subject_type', 'history'),
+            'scenes_data': {'scenes': scenes},
+            'published': source.get('published', True),
+        }
+    )
+    return demo
+
+
+def _render_image(bria, scene):
+    scene_result = bria.translate_to_scene(scene['description'], 'single')
+    json_scene = scene_result.get('scene', {})
+    result = bria.generate_image(json_scene, scene['description'])
+    if result.get('status') != 'success':
+        print(f"Demo image error for scene {scene['number']}: {result.get('message')}")
+        return
+
+    stored = image_store.ingest_url(result['image_url'])
+    if stored is not None:
+        scene['image'] = stored.digest
+        scene['json_scene'] = json_scene
+
+
+def clone_for_user(demo, user):
+    """Copy a demo into a new fully unlocked Topic for user - database writes only"""
+    scenes = demo.scenes_data.get('scenes', [])
+    stored = set(StoredImage.objects.filter(
+        digest__in=[scene['image'] for scene in scenes if scene.get('image')]
+    ).values_list('digest', flat=True))
+
+    with transaction.atomic():
+        topic = Topic.objects.create(
+            user=user,
+            topic=demo.topic,
+            subject_type=demo.subject_type,
+            scenes_data={'scenes': [{field: scene[field] for field in SCENE_FIELDS} for scene in scenes]},
+            scenes_unlocked=[scene['number'] for scene in scenes],  # All unlocked for demo
+            current_scene=1
+        )
+        Scene.objects.bulk_create([
+            Scene(
+                topic=topic,
+                scene_number=scene['number'],
+                title=scene['title'],
+                description=scene['description'],
+                narration=scene['narration'],
+                json_scene=scene.get('json_scene', {}),
+                image_id=scene['image'] if scene.get('image') in stored else None,
+                quiz_data=scene.get('quiz'),
+                generation_status=Scene.STATUS_COMPLETED if scene.get('image') in stored else Scene.STATUS_DEMO,
+            )
+            for scene in scenes
+        ])
+    return topic
@@ -4,23 +4,70 @@ Handles AI conversations, quiz generation, and story narration
 """
 import requests
 import json
+from home.http_client import httpx
 from django.conf import settings
+from home import llm_json, metrics
+from home.circuit_breaker import CircuitOpenError
+from home.http_client import get_http_client, get_async_http_client
+from home.rate_limiter import OutboundQueueTimeout, PRIORITY_INTERACTIVE
 
 
-class GroqAIService:
-    """Service class for Groq AI integration"""
+class GroqAIBase:
+    """Prompts, response parsing and fallbacks shared by the sync and async Groq services"""
+    
+    # Owl chat fallbacks
+    OWL_FALLBACK_SHORT = "I'm here to help you learn! What would you like to know?"
+    OWL_FALLBACK_API_ERROR = "I'm having trouble connecting right now. Please try again!"
+    OWL_FALLBACK_TIMEOUT = "I'm thinking too hard! Please try asking again."
+    OWL_FALLBACK_ERROR = "I'm having trouble right now. Please try again!"
+    
+    QUESTIONS_PER_QUIZ = 2
     
     def __init__(self):
         self.api_key = settings.GROQ_API_KEY
-        self.api_url = "https://api.groq.com/openai/v1/chat/completions"
+        self.api_url = settings.GROQ_API_URL
         self.headers = {
             'Authorization': f'Bearer {self.api_key}',
             'Content-Type': 'application/json'
         }
         self.model = "llama-3.3-70b-versatile"  # Latest fast model
     
-    def generate_scenes(self, topic, subject_type='history'):
-        """Generate 3 educational scenes for a topic"""
+    def _owl_chat_answer(self, response):
+        print(f"Groq API Status: {response.status_code}")
+        
+        if response.status_code == 200:
+            result = response.json()
+            answer = result['choices'][0]['message']['content'].strip()
+            print(f"Owl Chat Response: {answer}")
+            
+            # Make sure we got a real answer
+            if len(answer) > 10:
+                return answer
+            else:
+                print("Response too short, using fallback")
+                return self.OWL_FALLBACK_SHORT
+        else:
+            print(f"API Error: {response.text}")
+            return self.OWL_FALLBACK_API_ERROR
+    
+    def _owl_chat_payload(self, user_message, context):
+        # Build a clear, direct prompt
+        if context:
+            system_prompt = f"You are WiseOwl, a friendly and knowledgeable educational guide. The student is learning about: {context}. Answer their questions clearly and helpfully in 2-3 sentences."
+        else:
+            system_prompt = "You are WiseOwl, a friendly and knowledgeable educational guide. Answer student questions clearly and helpfully in 2-3 sentences."
+        
+        return {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_message}
+            ],
+            "temperature": 0.7,
+            "max_tokens": 250
+        }
+    
+    def _scenes_payload(self, topic, subject_type):
         prompt = f"""You are WiseOwl, an educational AI guide. Create 3 DISTINCT progressive learning scenes for: {topic}
 
 Subject: {subject_type}
@@ -56,47 +103,14 @@ Format as JSON:
 
 Make each scene VISUALLY DISTINCT and EDUCATIONALLY RICH. Think like a documentary filmmaker choosing 3 different camera positions."""
 
-        try:
-            # Retry logic for SSL issues
-            max_retries = 3
-            for attempt in range(max_retries):
-                try:
-                    response = requests.post(
-                        self.api_url,
-                        headers=self.headers,
-                        json={
-                            "model": self.model,
-                            "messages": [{"role": "user", "content": prompt}],
-                            "temperature": 0.7,
-                            "max_tokens": 1500
-                        },
-                        timeout=45,
-                        verify=True
-                    )
-                    break  # Success, exit retry loop
-                except (requests.exceptions.SSLError, requests.exceptions.ConnectionError) as e:
-                    print(f"Attempt {attempt + 1} failed: {str(e)}")
-                    if attempt == max_retries - 1:
-                        raise  # Last attempt, raise the error
-                    import time
-                    time.sleep(2)  # Wait 2 seconds before retry
-            
-            if response.status_code == 200:
-                content = response.json()['choices'][0]['message']['content']
-                # Extract JSON from response
-                start = content.find('{')
-                end = content.rfind('}') + 1
-                if start != -1 and end > start:
-                    return json.loads(content[start:end])
-            
-            return self._fallback_scenes(topic)
-            
-        except Exception as e:
-            print(f"Groq API error: {str(e)}")
-            return self._fallback_scenes(topic)
+        return {
+            "model": self.model,
+            "messages": [{"role": "user", "content": prompt}],
+            "temperature": 0.7,
+            "max_tokens": 1500
+        }
     
-    def generate_quiz(self, topic, scene_description, scene_number=1):
-        """Generate 2 unique quiz questions for a specific scene"""
+    def _quiz_payload(self, topic, scene_description, scene_number):
         prompt = f"""Create 2 COMPLETELY UNIQUE multiple-choice questions ONLY about Scene {scene_number}:
 
 Topic: {topic}
@@ -134,84 +148,129 @@ Format as JSON:
 
 Remember: Scene {scene_number} questions must be UNIQUE and SPECIFIC to this scene's description!"""
 
-        try:
-            response = requests.post(
-                self.api_url,
-                headers=self.headers,
-                json={
-                    "model": self.model,
-                    "messages": [{"role": "user", "content": prompt}],
-                    "temperature": 0.6,
-                    "max_tokens": 800
-                },
-                timeout=20
-            )
-            
-            if response.status_code == 200:
-                content = response.json()['choices'][0]['message']['content']
-                start = content.find('{')
-                end = content.rfind('}') + 1
-                if start != -1 and end > start:
-                    return json.loads(content[start:end])
-            
-            return self._fallback_quiz(topic)
-            
-        except Exception as e:
-            print(f"Groq quiz error: {str(e)}")
-            return self._fallback_quiz(topic, scene_number)
+        return {
+            "model": self.model,
+            "messages": [{"role": "user", "content": prompt}],
+            "temperature": 0.6,
+            "max_tokens": 800
+        }
     
-    def owl_chat(self, user_message, context=""):
-        """Owl responds to user questions"""
-        
-        # Build a clear, direct prompt
-        if context:
-            system_prompt = f"You are WiseOwl, a friendly and knowledgeable educational guide. The student is learning about: {context}. Answer their questions clearly and helpfully in 2-3 sentences."
-        else:
-            system_prompt = "You are WiseOwl, a friendly and knowledgeable educational guide. Answer student questions clearly and helpfully in 2-3 sentences."
-        
-        try:
-            print(f"Owl Chat Request - Message: {user_message}, Context: {context}")
-            
-            response = requests.post(
-                self.api_url,
-                headers=self.headers,
-                json={
-                    "model": self.model,
-                    "messages": [
-                        {"role": "system", "content": system_prompt},
-                        {"role": "user", "content": user_message}
-                    ],
-                    "temperature": 0.7,
-                    "max_tokens": 250
-                },
-                timeout=20
-            )
-            
-            print(f"Groq API Status: {response.status_code}")
-            
-            if response.status_code == 200:
-                result = response.json()
-                answer = result['choices'][0]['message']['content'].strip()
-                print(f"Owl Chat Response: {answer}")
-                
-                # Make sure we got a real answer
-                if len(answer) > 10:
-                    return answer
-                else:
-                    print("Response too short, using fallback")
-                    return "I'm here to help you learn! What would you like to know?"
-            else:
-                print(f"API Error: {response.text}")
-                return "I'm having trouble connecting right now. Please try again!"
-            
-        except requests.exceptions.Timeout:
-            print("Owl chat timeout")
-            return "I'm thinking too hard! Please try asking again."
-        except Exception as e:
-            print(f"Owl chat error: {str(e)}")
-            import traceback
-            traceback.print_exc()
-            return "I'm having trouble right now. Please try again!"
+    def _journey_payload(self, topic, subject_type):
+        payload = self._scenes_payload(topic, subject_type)
+        prompt = payload['messages'][0]['content'].split('Format as JSON:')[0]
+        prompt += """Also give each scene a "quiz" of 2 multiple-choice questions about SPECIFIC details visible in THAT scene's description. Questions must be different for every scene.
+
+Format as JSON:
+{
+  "scenes": [
+    {
+      "number": 1,
+      "title": "Specific Scene Title",
+      "description": "Detailed 360° panoramic description...",
+      "narration": "Paragraph 1... Paragraph 2... Paragraph 3... Paragraph 4...",
+      "quiz": {
+        "questions": [
+          {
+            "question": "Specific question about THIS scene only...",
+            "options": ["A) ...", "B) ...", "C) ...", "D) ..."],
+            "correct": 0,
+            "explanation": "Explanation referencing specific scene details..."
+          }
+        ]
+      }
+    },
+    ...
+  ]
+}"""
+        payload['messages'][0]['content'] = prompt
+        payload['max_tokens'] = 3500
+        payload['response_format'] = {"type": "json_object"}
+        return payload
+    
+    def _quizzes_payload(self, topic, scenes):
+        scene_lines = "\n".join(f"Scene {scene.get('number', index)}: {scene['description']}" for index, scene in enumerate(scenes, 1))
+        prompt = f"""Create 2 COMPLETELY UNIQUE multiple-choice questions for EACH of these scenes:
+
+Topic: {topic}
+{scene_lines}
+
+Questions MUST be about SPECIFIC details visible in their own scene and DIFFERENT from the other scenes.
+
+Format as JSON:
+{{
+  "quizzes": [
+    {{
+      "scene": 1,
+      "questions": [
+        {{
+          "question": "Specific question about THIS scene only...",
+          "options": ["A) ...", "B) ...", "C) ...", "D) ..."],
+          "correct": 0,
+          "explanation": "Explanation referencing specific scene details..."
+        }}
+      ]
+    }},
+    ...
+  ]
+}}"""
+
+        return {
+            "model": self.model,
+            "messages": [{"role": "user", "content": prompt}],
+            "temperature": 0.6,
+            "max_tokens": 800 * len(scenes),
+            "response_format": {"type": "json_object"}
+        }
+    
+    def _missing_scenes_payload(self, topic, subject_type, scenes):
+        payload = self._scenes_payload(topic, subject_type)
+        missing = [number for number in (1, 2, 3) if number not in scenes]
+        have = "\n".join(f"Scene {number}: {scene['title']}" for number, scene in sorted(scenes.items()))
+        payload['messages'][0]['content'] += f"""
+
+These scenes already exist:
+{have}
+
+Return ONLY scene(s) {', '.join(map(str, missing))} in the same JSON format, different from the existing ones."""
+        return payload
+    
+    def _more_questions_payload(self, topic, scene_description, scene_number, questions):
+        payload = self._quiz_payload(topic, scene_description, scene_number)
+        count = self.QUESTIONS_PER_QUIZ - len(questions)
+        have = "\n".join(f"- {question['question']}" for question in questions)
+        payload['messages'][0]['content'] += f"""
+
+These questions already exist:
+{have}
+
+Return ONLY {count} NEW question(s) in the same JSON format."""
+        return payload
+    
+    def _parse_scenes(self, content):
+        """Valid scenes in a completion, keyed by scene number"""
+        return llm_json.valid_scenes(llm_json.normalize_scenes(llm_json.extract_json(content, 'scenes')))
+    
+    def _parse_questions(self, content):
+        """Valid quiz questions in a completion"""
+        return llm_json.valid_questions(llm_json.normalize_quiz(llm_json.extract_json(content, 'quiz')))
+    
+    def _merge_scenes(self, topic, scenes):
+        """scenes_data from valid scenes by number, filling any gaps from _fallback_scenes"""
+        fallback = self._fallback_scenes(topic)['scenes']
+        return {
+            "scenes": [
+                dict(scenes[number], number=number) if number in scenes else fallback[number - 1]
+                for number in (1, 2, 3)
+            ]
+        }
+    
+    def _uses_fallback(self, topic, scenes_data):
+        """Whether any scene is canned fallback content rather than generated"""
+        fallback = self._fallback_scenes(topic)['scenes']
+        return any(
+            scene.get('description') == canned['description']
+            for scene, canned in zip(scenes_data.get('scenes', []), fallback)
+        )
     
     def _fallback_scenes(self, topic):
         """Fallback scenes if API fails - Rich detailed content"""
@@ -378,3 +437,374 @@ Take a moment to consider: How does understanding {topic} change your perspectiv
                 ]
             }
 
+
+class GroqAIService(GroqAIBase):
+    """Service class for Groq AI integration"""
+    
+    def __init__(self):
+        super().__init__()
+        self.http = get_http_client()
+    
+    def generate_scenes(self, topic, subject_type='history'):
+        """Generate 3 educational scenes for a topic"""
+        scenes = {}
+        try:
+            response = self.http.post(
+                self.api_url,
+                endpoint='groq.scenes',
+                headers=self.headers,
+                json=self._scenes_payload(topic, subject_type)
+            )
+            
+            if response.status_code == 200:
+                scenes = self._parse_scenes(response.json()['choices'][0]['message']['content'])
+            
+        except Exception as e:
+            print(f"Groq API error: {str(e)}")
+        
+        if scenes and len(scenes) < 3:
+            scenes.update(self._reask_scenes(topic, subject_type, scenes))
+        return self._merge_scenes(topic, scenes)
+    
+    def generate_quiz(self, topic, scene_description, scene_number=1):
+        """Generate 2 unique quiz questions for a specific scene"""
+        questions = []
+        try:
+            response = self.http.post(
+                self.api_url,
+                endpoint='groq.quiz',
+                headers=self.headers,
+                json=self._quiz_payload(topic, scene_description, scene_number)
+            )
+            
+            if response.status_code == 200:
+                questions = self._parse_questions(response.json()['choices'][0]['message']['content'])
+            
+        except Exception as e:
+            print(f"Groq quiz error: {str(e)}")
+        
+        if questions and len(questions) < self.QUESTIONS_PER_QUIZ:
+            questions += self._reask_questions(topic, scene_description, scene_number, questions)
+        if questions:
+            return {'questions': questions}
+        return self._fallback_quiz(topic, scene_number)
+    
+    def generate_journey(self, topic, subject_type='history'):
+        """
+        Generate 3 scenes and their quizzes in one completion
+        
+        Returns:
+            dict: scenes_data whose scenes each carry a "quiz"; only the scenes and quizzes
+            that fail validation are asked for again
+        """
+        data = None
+        try:
+            response = self.http.post(
+                self.api_url,
+                endpoint='groq.journey',
+                headers=self.headers,
+                json=self._journey_payload(topic, subject_type)
+            )
+            
+            if response.status_code == 200:
+                data = llm_json.extract_json(response.json()['choices'][0]['message']['content'], 'journey')
+            else:
+                print(f"Groq journey error {response.status_code}: {response.text}")
+        except Exception as e:
+            print(f"Groq journey error: {str(e)}")
+        
+        scenes = llm_json.valid_scenes(llm_json.normalize_scenes(data))
+        if not scenes:
+            print("Combined journey failed validation, generating scenes separately")
+            scenes_data = self.generate_scenes(topic, subject_type)
+            if scenes_data == self._fallback_scenes(topic):
+                return scenes_data  # Groq is down; quizzes fall back per scene later
+        else:
+            if len(scenes) < 3:
+                scenes.update(self._reask_scenes(topic, subject_type, scenes))
+            scenes_data = self._merge_scenes(topic, scenes)
+        
+        missing = []
+        for scene in scenes_data['scenes']:
+            questions = llm_json.valid_questions(llm_json.normalize_quiz(scene.get('quiz')))
+            if questions and len(questions) < self.QUESTIONS_PER_QUIZ:
+                questions += self._reask_questions(topic, scene['description'], scene['number'], questions)
+            if questions:
+                scene['quiz'] = {'questions': questions}
+            else:
+                scene.pop('quiz', None)
+                missing.append(scene)
+        if missing:
+            for scene, quiz in zip(missing, self.generate_quizzes(topic, missing)):
+                scene['quiz'] = quiz
+        return scenes_data
+    
+    def generate_quizzes(self, topic, scenes):
+        """
+        Generate quizzes for several scenes in one completion
+        
+        Args:
+            scenes: Scene dicts with "number" and "description"
+        
+        Returns:
+            list: One quiz per scene, in order; short quizzes are topped up and
+            unusable ones come from generate_quiz()
+        """
+        quizzes = {}
+        try:
+            response = self.http.post(
+                self.api_url,
+                endpoint='groq.quizzes',
+                headers=self.headers,
+                json=self._quizzes_payload(topic, scenes)
+            )
+            
+            if response.status_code == 200:
+                result = llm_json.extract_json(response.json()['choices'][0]['message']['content'], 'quizzes') or {}
+                for position, item in enumerate(result.get('quizzes', []), 1):
+                    if isinstance(item, dict) and str(item.get('scene', position)).isdigit():
+                        quizzes[int(item.get('scene', position))] = item
+            else:
+                print(f"Groq quizzes error {response.status_code}: {response.text}")
+        except Exception as e:
+            print(f"Groq quizzes error: {str(e)}")
+        
+        results = []
+        for index, scene in enumerate(scenes, 1):
+            number = scene.get('number', index)
+            questions = llm_json.valid_questions(llm_json.normalize_quiz(quizzes.get(number)))
+            if questions and len(questions) < self.QUESTIONS_PER_QUIZ:
+                questions += self._reask_questions(topic, scene['description'], number, questions)
+            if questions:
+                results.append({'questions': questions})
+            else:
+                results.append(self.generate_quiz(topic, scene['description'], scene_number=number))
+        return results
+    
+    def _reask_scenes(self, topic, subject_type, scenes):
+        """Ask again for just the scenes that failed validation"""
+        metrics.counter('llm_reasks_total', 'Follow-up LLM calls for missing pieces').inc(kind='scenes')
+        try:
+            response = self.http.post(
+                self.api_url,
+                endpoint='groq.scenes',
+                headers=self.headers,
+                json=self._missing_scenes_payload(topic, subject_type, scenes)
+            )
+            if response.status_code == 200:
+                return self._parse_scenes(response.json()['choices'][0]['message']['content'])
+        except Exception as e:
+            print(f"Groq scenes re-ask error: {str(e)}")
+        return {}
+    
+    def _reask_questions(self, topic, scene_description, scene_number, questions):
+        """Ask again for just the quiz questions that failed validation"""
+        metrics.counter('llm_reasks_total', 'Follow-up LLM calls for missing pieces').inc(kind='questions')
+        try:
+            response = self.http.post(
+                self.api_url,
+                endpoint='groq.quiz',
+                headers=self.headers,
+                json=self._more_questions_payload(topic, scene_description, scene_number, questions)
+            )
+            if response.status_code == 200:
+                extra = self._parse_questions(response.json()['choices'][0]['message']['content'])
+                return extra[:self.QUESTIONS_PER_QUIZ - len(questions)]
+        except Exception as e:
+            print(f"Groq quiz re-ask error: {str(e)}")
+        return []
+    
+    def owl_chat(self, user_message, context=""):
+        """Owl responds to user questions"""
+        try:
+            print(f"Owl Chat Request - Message: {user_message}, Context: {context}")
+            
+            response = self.http.post(
+                self.api_url,
+                endpoint='groq.chat',
+                priority=PRIORITY_INTERACTIVE,
+                headers=self.headers,
+                json=self._owl_chat_payload(user_message, context)
+            )
+            
+            return self._owl_chat_answer(response)
+            
+        except requests.exceptions.Timeout:
+            print("Owl chat timeout")
+            return self.OWL_FALLBACK_TIMEOUT
+        except (CircuitOpenError, OutboundQueueTimeout) as e:
+            print(f"Owl chat skipped: {str(e)}")
+            return self.OWL_FALLBACK_API_ERROR
+        except Exception as e:
+            print(f"Owl chat error: {str(e)}")
+            import traceback
+            traceback.print_exc()
+            return self.OWL_FALLBACK_ERROR
+    
+    def owl_chat_stream(self, user_message, context=""):
+        """
+        Stream the owl's answer using Groq streaming chat completions
+        
+        Yields:
+            str: Text chunks as they arrive; a fallback message if the call fails
+        """
+        answer = ''
+        started = False  # Hold back the first few characters so short answers can still fall back
+        try:
+            payload = self._owl_chat_payload(user_message, context)
+            payload['stream'] = True
+            
+            with self.http.post(
+                self.api_url,
+                endpoint='groq.chat',
+                priority=PRIORITY_INTERACTIVE,
+                headers=self.headers,
+                json=payload,
+                stream=True
+            ) as response:
+                if response.status_code != 200:
+                    print(f"API Error: {response.text}")
+                    yield self.OWL_FALLBACK_API_ERROR
+                    return
+                
+                for raw_line in response.iter_lines():
+                    line = raw_line.decode('utf-8')
+                    if not line.startswith('data:'):
+                        continue
+                    data = line[len('data:'):].strip()
+                    if data == '[DONE]':
+                        break
+                    
+                    delta = json.loads(data)['choices'][0].get('delta', {}).get('content')
+                    if not delta:
+                        continue
+                    
+                    answer += delta
+                    if started:
+                        yield delta
+                    elif len(answer.strip()) > 10:
+                        started = True
+                        yield answer.lstrip()
+            
+            if not started:
+                print("Response too short, using fallback")
+                yield self.OWL_FALLBACK_SHORT
+            
+        except requests.exceptions.Timeout:
+            print("Owl chat stream timeout")
+            if not started:
+                yield self.OWL_FALLBACK_TIMEOUT
+        except (CircuitOpenError, OutboundQueueTimeout) as e:
+            print(f"Owl chat stream skipped: {str(e)}")
+            yield self.OWL_FALLBACK_API_ERROR
+        except Exception as e:
+            print(f"Owl chat stream error: {str(e)}")
+            if not started:
+                yield self.OWL_FALLBACK_ERROR
+
+
+class AsyncGroqAIService(GroqAIBase):
+    """GroqAIService on the async HTTP client, for the async views"""
+    
+    def __init__(self):
+        super().__init__()
+        self.http = get_async_http_client()
+    
+    async def generate_scenes(self, topic, subject_type='history'):
+        """Generate 3 educational scenes for a topic"""
+        scenes = {}
+        try:
+            response = await self.http.post(
+                self.api_url,
+                endpoint='groq.scenes',
+                headers=self.headers,
+                json=self._scenes_payload(topic, subject_type)
+            )
+            
+            if response.status_code == 200:
+                scenes = self._parse_scenes(response.json()['choices'][0]['message']['content'])
+            
+        except Exception as e:
+            print(f"Groq API error: {str(e)}")
+        
+        if scenes and len(scenes) < 3:
+            scenes.update(await self._reask_scenes(topic, subject_type, scenes))
+        return self._merge_scenes(topic, scenes)
+    
+    async def generate_quiz(self, topic, scene_description, scene_number=1):
+        """Generate 2 unique quiz questions for a specific scene"""
+        questions = []
+        try:
+            response = await self.http.post(
+                self.api_url,
+                endpoint='groq.quiz',
+                headers=self.headers,
+                json=self._quiz_payload(topic, scene_description, scene_number)
+            )
+            
+            if response.status_code == 200:
+                questions = self._parse_questions(response.json()['choices'][0]['message']['content'])
+            
+        except Exception as e:
+            print(f"Groq quiz error: {str(e)}")
+        
+        if questions and len(questions) < self.QUESTIONS_PER_QUIZ:
+            questions += await self._reask_questions(topic, scene_description, scene_number, questions)
+        if questions:
+            return {'questions': questions}
+        return self._fallback_quiz(topic, scene_number)
+    
+    async def _reask_scenes(self, topic, subject_type, scenes):
+        """Ask again for just the scenes that failed validation"""
+        metrics.counter('llm_reasks_total', 'Follow-up LLM calls for missing pieces').inc(kind='scenes')
+        try:
+            response = await self.http.post(
+                self.api_url,
+                endpoint='groq.scenes',
+                headers=self.headers,
+                json=self._missing_scenes_payload(topic, subject_type, scenes)
+            )
+            if response.status_code == 200:
+                return self._parse_scenes(response.json()['choices'][0]['message']['content'])
+        except Exception as e:
+            print(f"Groq scenes re-ask error: {str(e)}")
+        return {}
+    
+    async def _reask_questions(self, topic, scene_description, scene_number, questions):
+        """Ask again for just the quiz questions that failed validation"""
+        metrics.counter('llm_reasks_total', 'Follow-up LLM calls for missing pieces').inc(kind='questions')
+        try:
+            response = await self.http.post(
+                self.api_url,
+                endpoint='groq.quiz',
+                headers=self.headers,
+                json=self._more_questions_payload(topic, scene_description, scene_number, questions)
+            )
+            if response.status_code == 200:
+                extra = self._parse_questions(response.json()['choices'][0]['message']['content'])
+                return extra[:self.QUESTIONS_PER_QUIZ - len(questions)]
+        except Exception as e:
+            print(f"Groq quiz re-ask error: {str(e)}")
+        return []
+    
+    async def owl_chat(self, user_message, context=""):
+        """Owl responds to user questions"""
+        try:
+            response = await self.http.post(
+                self.api_url,
+                endpoint='groq.chat',
+                priority=PRIORITY_INTERACTIVE,
+                headers=self.headers,
+                json=self._owl_chat_payload(user_message, context)
+            )
+            return self._owl_chat_answer(response)
+            
+        except httpx.TimeoutException:
+            print("Owl chat timeout")
+            return self.OWL_FALLBACK_TIMEOUT
+        except (CircuitOpenError, OutboundQueueTimeout) as e:
+            print(f"Owl chat skipped: {str(e)}")
+            return self.OWL_FALLBACK_API_ERROR
+        except Exception as e:
+            print(f"Owl chat error: {str(e)}")
+            return self.OWL_FALLBACK_ERROR
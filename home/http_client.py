@@ -0,0 +1,342 @@
+"""
+Shared HTTP client for WiseOwl
+Process-wide keep-alive connection pools used by the Groq and Bria services, with a circuit
+breaker and adaptive read timeout per endpoint (see home.circuit_breaker) and outbound rate
+limits shared between processes (see home.rate_limiter)
+"""
+import asyncio
+import contextlib
+import json
+import random
+import threading
+import time
+import weakref
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+
+from fibo.db.pool import release_connections
+from home import metrics
+from home.circuit_breaker import get_breaker
+from home.instrumentation import timed
+from home.rate_limiter import OutboundQueueTimeout, get_limiter
+
+try:
+    import httpx
+except ImportError:  # Only needed by the async views (settings.ASYNC_VIEWS)
+    httpx = None
+
+
+# Errors worth retrying - the connection never got a response
+RETRYABLE_EXCEPTIONS = (requests.exceptions.SSLError, requests.exceptions.ConnectionError)
+
+# Statuses that count against an endpoint's circuit breaker, besides 5xx
+BREAKER_FAILURE_STATUSES = (429,)
+
+
+class PooledHTTPClient:
+    """One pooled requests.Session per upstream host, with retry/backoff"""
+
+    def __init__(self, pool_maxsize=None, connect_timeout=None, timeouts=None,
+                 max_attempts=None, backoff_base=None, backoff_max=None,
+                 circuit_breaker=None, adaptive_timeouts=None):
+        self.pool_maxsize = pool_maxsize or getattr(settings, 'HTTP_POOL_MAXSIZE', 10)
+        self.connect_timeout = connect_timeout or getattr(settings, 'HTTP_CONNECT_TIMEOUT', 10)
+        self.timeouts = timeouts or getattr(settings, 'HTTP_TIMEOUTS', {})
+        self.max_attempts = max_attempts or getattr(settings, 'HTTP_RETRY_ATTEMPTS', 3)
+        self.backoff_base = backoff_base or getattr(settings, 'HTTP_BACKOFF_BASE', 0.5)
+        self.backoff_max = backoff_max or getattr(settings, 'HTTP_BACKOFF_MAX', 8.0)
+        self.circuit_breaker = _option(circuit_breaker, 'CIRCUIT_BREAKER_ENABLED')
+        self.adaptive_timeouts = _option(adaptive_timeouts, 'HTTP_ADAPTIVE_TIMEOUTS')
+
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._retries = {}
+
+    def session_for(self, url):
+        """Keep-alive session for the URL's host, created on first use"""
+        host = urlsplit(url).netloc
+        with self._lock:
+            session = self._sessions.get(host)
+            if session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=1,  # Sessions are per host already
+                    pool_maxsize=self.pool_maxsize,
+                    max_retries=0,  # Retries are handled in request()
+                )
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                self._sessions[host] = session
+                self._retries[host] = 0
+        return session
+
+    def post(self, url, endpoint=None, timeout=None, priority=None, **kwargs):
+        """
+        POST through the host's connection pool
+
+        Args:
+            url: Upstream URL
+            endpoint: Logical endpoint name (e.g. 'bria.generate'), used to look up the timeout
+            timeout: Read timeout in seconds, overriding HTTP_TIMEOUTS
+            priority: rate_limiter.PRIORITY_* for queueing on OUTBOUND_LIMITS (default: the context's)
+
+        Returns:
+            requests.Response - connection errors are retried, then re-raised
+
+        Raises:
+            CircuitOpenError: The endpoint's breaker is open; nothing was sent
+            OutboundQueueTimeout: No rate limit slot came free in time; nothing was sent
+        """
+        return self.request('POST', url, endpoint=endpoint, timeout=timeout, priority=priority, **kwargs)
+
+    def get(self, url, endpoint=None, timeout=None, priority=None, **kwargs):
+        """GET through the host's connection pool, same retry rules as post()"""
+        return self.request('GET', url, endpoint=endpoint, timeout=timeout, priority=priority, **kwargs)
+
+    def request(self, method, url, endpoint=None, timeout=None, priority=None, **kwargs):
+        session = self.session_for(url)
+        host = urlsplit(url).netloc
+        breaker = self.breaker_for(endpoint or host)
+        read_timeout = self.read_timeout(breaker, endpoint, timeout)
+        if breaker:
+            breaker.before_call()  # Fail fast, before waiting on anything
+        if getattr(settings, 'DB_RELEASE_DURING_UPSTREAM', False):
+            release_connections()  # Don't hold a pooled DB connection while Groq/Bria think
+
+        with timed('upstream_request', endpoint=endpoint or host) as timing:
+            timing.set(method=method, bytes_out=_payload_size(kwargs), timeout=round(read_timeout, 1))
+            for attempt in range(self.max_attempts):
+                timing.set(retries=attempt)
+                if attempt and breaker:
+                    breaker.before_call()  # Stop retrying once the breaker has opened
+                try:
+                    with self.slot(endpoint or host, priority, timing):
+                        started = time.monotonic()
+                        response = session.request(
+                            method, url, timeout=(self.connect_timeout, read_timeout), **kwargs
+                        )
+                except OutboundQueueTimeout:
+                    if breaker:
+                        breaker.abandon()  # Not the endpoint's fault
+                    raise
+                except RETRYABLE_EXCEPTIONS as e:
+                    _record_breaker(breaker, None)
+                    print(f"{endpoint or host} attempt {attempt + 1} failed: {str(e)}")
+                    if attempt == self.max_attempts - 1:
+                        raise
+                    with self._lock:
+                        self._retries[host] += 1
+                    time.sleep(self.backoff_delay(attempt))
+                    continue
+                except BaseException:  # Anything else still settles a half-open probe
+                    _record_breaker(breaker, None)
+                    raise
+                _record_breaker(breaker, response, time.monotonic() - started)
+                _record_response(timing, response, streamed=kwargs.get('stream', False))
+                return response
+
+    @contextlib.contextmanager
+    def slot(self, endpoint, priority, timing):
+        """Wait for a slot under the endpoint's OUTBOUND_LIMITS entry, if it has one"""
+        limiter = get_limiter(endpoint)
+        if limiter is None:
+            yield
+            return
+        queued = time.monotonic()
+        with limiter.slot(priority):
+            timing.set(queued_ms=round((time.monotonic() - queued) * 1000, 1))
+            yield
+
+    def breaker_for(self, endpoint):
+        """The endpoint's shared circuit breaker, or None when CIRCUIT_BREAKER_ENABLED is off"""
+        return get_breaker(endpoint) if self.circuit_breaker else None
+
+    def read_timeout(self, breaker, endpoint, timeout=None):
+        """Explicit timeout or HTTP_TIMEOUTS value, lowered to fit observed latency when adaptive"""
+        ceiling = timeout or self.timeouts.get(endpoint, 30)
+        if breaker is None or not self.adaptive_timeouts:
+            return ceiling
+        return breaker.timeout(ceiling)
+
+    def backoff_delay(self, attempt):
+        """Exponential backoff with full jitter"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def stats(self):
+        """Per-host request, connection and reuse counters"""
+        stats = {}
+        with self._lock:
+            sessions = list(self._sessions.items())
+        for host, session in sessions:
+            adapter = session.get_adapter(f'https://{host}')
+            pools = list(adapter.poolmanager.pools._container.values())
+            requests_sent = sum(pool.num_requests for pool in pools)
+            connections = sum(pool.num_connections for pool in pools)
+            stats[host] = {
+                'requests': requests_sent,
+                'connections_opened': connections,
+                'connections_reused': max(requests_sent - connections, 0),
+                'retries': self._retries.get(host, 0),
+            }
+        return stats
+
+    def close(self):
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+
+
+class AsyncPooledHTTPClient(PooledHTTPClient):
+    """httpx.AsyncClient counterpart of PooledHTTPClient, for the async views"""
+
+    def __init__(self, max_connections=None, **kwargs):
+        super().__init__(**kwargs)
+        self.max_connections = max_connections or getattr(settings, 'HTTP_ASYNC_MAX_CONNECTIONS', 500)
+        self._clients = weakref.WeakKeyDictionary()  # httpx clients can't be shared between event loops
+        self._requests = 0
+
+    def _client(self):
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None:
+            client = httpx.AsyncClient(limits=httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_connections,
+            ))
+            self._clients[loop] = client
+        return client
+
+    async def post(self, url, endpoint=None, timeout=None, priority=None, **kwargs):
+        return await self.request('POST', url, endpoint=endpoint, timeout=timeout, priority=priority, **kwargs)
+
+    async def get(self, url, endpoint=None, timeout=None, priority=None, **kwargs):
+        return await self.request('GET', url, endpoint=endpoint, timeout=timeout, priority=priority, **kwargs)
+
+    async def request(self, method, url, endpoint=None, timeout=None, priority=None, **kwargs):
+        client = self._client()
+        host = urlsplit(url).netloc
+        breaker = self.breaker_for(endpoint or host)
+        read_timeout = self.read_timeout(breaker, endpoint, timeout)
+        if breaker:
+            breaker.before_call()
+
+        with timed('upstream_request', endpoint=endpoint or host) as timing:
+            timing.set(method=method, bytes_out=_payload_size(kwargs), timeout=round(read_timeout, 1))
+            for attempt in range(self.max_attempts):
+                timing.set(retries=attempt)
+                if attempt and breaker:
+                    breaker.before_call()
+                try:
+                    async with self.aslot(endpoint or host, priority, timing):
+                        started = time.monotonic()
+                        self._requests += 1
+                        response = await client.request(
+                            method, url,
+                            timeout=httpx.Timeout(read_timeout, connect=self.connect_timeout),
+                            **kwargs
+                        )
+                except OutboundQueueTimeout:
+                    if breaker:
+                        breaker.abandon()
+                    raise
+                except (httpx.ConnectError, httpx.RemoteProtocolError) as e:
+                    _record_breaker(breaker, None)
+                    print(f"{endpoint or host} attempt {attempt + 1} failed: {str(e)}")
+                    if attempt == self.max_attempts - 1:
+                        raise
+                    self._retries[host] = self._retries.get(host, 0) + 1
+                    await asyncio.sleep(self.backoff_delay(attempt))
+                    continue
+                except BaseException:  # Including cancellation, so a half-open probe is never left pending
+                    _record_breaker(breaker, None)
+                    raise
+                _record_breaker(breaker, response, time.monotonic() - started)
+                _record_response(timing, response)
+                return response
+
+    @contextlib.asynccontextmanager
+    async def aslot(self, endpoint, priority, timing):
+        limiter = get_limiter(endpoint)
+        if limiter is None:
+            yield
+            return
+        queued = time.monotonic()
+        async with limiter.aslot(priority):
+            timing.set(queued_ms=round((time.monotonic() - queued) * 1000, 1))
+            yield
+
+    def stats(self):
+        return {
+            'requests': self._requests,
+            'event_loops': len(self._clients),
+            'retries': dict(self._retries),
+        }
+
+
+def _option(value, setting):
+    return getattr(settings, setting, True) if value is None else value
+
+
+def _record_breaker(breaker, response, duration=None):
+    """Count a call against its breaker: no response, 5xx and 429 are failures"""
+    if breaker is None:
+        return
+    ok = response is not None and response.status_code < 500 and response.status_code not in BREAKER_FAILURE_STATUSES
+    breaker.record(ok, duration)
+
+
+def _payload_size(kwargs):
+    if 'json' in kwargs:
+        return len(json.dumps(kwargs['json']).encode('utf-8'))
+    data = kwargs.get('data') or kwargs.get('content')
+    return len(data) if isinstance(data, (bytes, str)) else 0
+
+
+def _record_response(timing, response, streamed=False):
+    """Status, size and retry metrics for an upstream response"""
+    endpoint = timing.labels['endpoint']
+    if streamed:
+        size = int(response.headers.get('Content-Length') or 0)
+    else:
+        size = len(response.content)
+    timing.set(status=response.status_code, bytes_in=size)
+
+    metrics.counter('upstream_responses_total', 'Groq/Bria responses by status code').inc(
+        endpoint=endpoint, status=response.status_code
+    )
+    payloads = metrics.histogram('upstream_payload_bytes', 'Groq/Bria request and response sizes', metrics.SIZE_BUCKETS)
+    payloads.observe(timing.fields['bytes_out'], endpoint=endpoint, direction='out')
+    payloads.observe(size, endpoint=endpoint, direction='in')
+    if timing.fields['retries']:
+        metrics.counter('upstream_retries_total', 'Groq/Bria connection retries').inc(
+            timing.fields['retries'], endpoint=endpoint
+        )
+
+
+_client = None
+_async_client = None
+_client_lock = threading.Lock()
+
+
+def get_http_client():
+    """The process-wide client shared by every service instance"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = PooledHTTPClient()
+    return _client
+
+
+def get_async_http_client():
+    """The process-wide async client used by the async service classes"""
+    global _async_client
+    if _async_client is None:
+        with _client_lock:
+            if _async_client is None:
+                _async_client = AsyncPooledHTTPClient()
+    return _async_client
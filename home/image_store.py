@@ -0,0 +1,156 @@
+"""
+Local image store for WiseOwl
+Downloads generated Bria images once into content-addressed files and builds WebP derivatives
+"""
+import base64
+import binascii
+import hashlib
+import io
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import storages
+from django.urls import reverse
+
+from home.http_client import get_http_client, get_async_http_client
+from home.models import StoredImage
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow is optional; without it only originals are stored
+    Image = None
+
+
+CONTENT_TYPES = {
+    'JPEG': ('image/jpeg', 'jpg'),
+    'PNG': ('image/png', 'png'),
+    'WEBP': ('image/webp', 'webp'),
+}
+
+
+def get_storage():
+    return storages[getattr(settings, 'IMAGE_STORE_STORAGE', 'default')]
+
+
+def ingest_url(url):
+    """Download a remote image into the store; returns StoredImage or None on failure"""
+    existing = StoredImage.objects.filter(source_url=url).first()
+    if existing:
+        return existing
+
+    try:
+        response = get_http_client().get(url, endpoint='bria.download')
+        if response.status_code != 200:
+            print(f"Image download error {response.status_code}: {url}")
+            return None
+        return store_bytes(response.content, source_url=url)
+    except Exception as e:
+        print(f"Image store error: {str(e)}")
+        return None
+
+
+async def aingest_url(url):
+    """ingest_url for the async views; only the download is async, storing runs in a thread"""
+    existing = await StoredImage.objects.filter(source_url=url).afirst()
+    if existing:
+        return existing
+
+    try:
+        response = await get_async_http_client().get(url, endpoint='bria.download')
+        if response.status_code != 200:
+            print(f"Image download error {response.status_code}: {url}")
+            return None
+        return await sync_to_async(store_bytes)(response.content, source_url=url)
+    except Exception as e:
+        print(f"Image store error: {str(e)}")
+        return None
+
+
+def ingest_data(image_data):
+    """Store inline base64 (optionally a data: URL) image data"""
+    raw = decode_image_data(image_data)
+    return store_bytes(raw) if raw else None
+
+
+def decode_image_data(image_data):
+    """Bytes from base64 text or a data: URL, or None if it isn't valid base64"""
+    if image_data.startswith('data:'):
+        image_data = image_data.split(',', 1)[-1]
+    try:
+        return base64.b64decode(image_data, validate=True)
+    except (binascii.Error, ValueError):
+        return None
+
+
+def store_bytes(raw, source_url='', model=StoredImage):
+    """Write an image and its derivatives under images/<ab>/<cd>/<sha256>; idempotent"""
+    digest = hashlib.sha256(raw).hexdigest()
+    existing = model.objects.filter(digest=digest).first()
+    if existing:
+        return existing
+
+    storage = get_storage()
+    prefix = f'images/{digest[:2]}/{digest[2:4]}/{digest}'
+    width = height = None
+    content_type, ext = 'application/octet-stream', 'bin'
+    derivatives = {}
+
+    if Image is not None:
+        try:
+            with Image.open(io.BytesIO(raw)) as img:
+                width, height = img.size
+                content_type, ext = CONTENT_TYPES.get(img.format, (content_type, ext))
+                derivatives = _write_derivatives(storage, prefix, img)
+        except Exception as e:
+            print(f"Image derivative error: {str(e)}")
+
+    path = f'{prefix}.{ext}'
+    if not storage.exists(path):
+        storage.save(path, ContentFile(raw))
+
+    stored, _ = model.objects.get_or_create(
+        digest=digest,
+        defaults={
+            'source_url': source_url[:500],
+            'path': path,
+            'content_type': content_type,
+            'size': len(raw),
+            'width': width,
+            'height': height,
+            'derivatives': derivatives,
+        }
+    )
+    return stored
+
+
+def _write_derivatives(storage, prefix, img):
+    derivatives = {}
+    img = img.convert('RGB')
+    for variant, options in getattr(settings, 'IMAGE_DERIVATIVES', {}).items():
+        width = min(options['width'], img.width)
+        height = round(img.height * width / img.width)
+        resized = img.resize((width, height), Image.LANCZOS) if width != img.width else img
+
+        buffer = io.BytesIO()
+        resized.save(buffer, 'WEBP', quality=options.get('quality', 80))
+        path = f'{prefix}-{variant}.webp'
+        if not storage.exists(path):
+            storage.save(path, ContentFile(buffer.getvalue()))
+        derivatives[variant] = path
+    return derivatives
+
+
+def variant_path(stored, variant):
+    """Storage path and content type for a variant, falling back to the original"""
+    path = stored.derivatives.get(variant)
+    if path:
+        return path, 'image/webp'
+    return stored.path, stored.content_type
+
+
+def image_url(stored, variant='original'):
+    """Public URL for a stored image - the storage/CDN URL or our cached view"""
+    if getattr(settings, 'IMAGE_STORE_SERVE_FROM_STORAGE', False):
+        return get_storage().url(variant_path(stored, variant)[0])
+    return reverse('home:stored_image', args=[stored.digest, variant])
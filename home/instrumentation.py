@@ -0,0 +1,140 @@
+"""
+Timing instrumentation for WiseOwl
+Records wall time and call details for upstream requests, generation steps and views
+into home.metrics histograms and structured lines on the "home.timing" logger, and
+per-request totals for the Server-Timing header (see fibo.middleware)
+"""
+import logging
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from home import metrics
+
+
+logger = logging.getLogger('home.timing')
+
+HELP = {
+    'upstream_request': 'Groq/Bria HTTP calls including retries',
+    'generation_job': 'Generation jobs from claim to finish',
+    'generation_step': 'Steps inside journey and scene generation',
+    'view': 'Django views in home',
+    'template_render': 'Top-level Django template renders',
+}
+
+_request_timings = ContextVar('request_timings', default=None)
+
+
+class RequestTimings:
+    """Total time and count per timing name for one request"""
+
+    def __init__(self):
+        self.durations = defaultdict(float)
+        self.counts = defaultdict(int)
+
+    def add(self, name, duration):
+        self.durations[name] += duration
+        self.counts[name] += 1
+
+
+@contextmanager
+def collect_request_timings():
+    """Accumulate everything timed in this context (including sync_to_async calls) for one request"""
+    timings = RequestTimings()
+    token = _request_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _request_timings.reset(token)
+
+
+def current_request_timings():
+    """The RequestTimings being collected, or None outside a request"""
+    return _request_timings.get()
+
+
+class Timing:
+    """One timed operation; callers add whatever details they know with set()"""
+
+    def __init__(self, name, labels):
+        self.name = name
+        self.labels = labels
+        self.fields = {}
+        self.started = time.monotonic()
+        self.duration = None
+
+    def set(self, **fields):
+        self.fields.update(fields)
+
+    def as_dict(self):
+        return {
+            'name': self.name,
+            'duration_ms': round((self.duration or 0) * 1000, 1),
+            **self.labels,
+            **{key: value for key, value in self.fields.items() if value is not None},
+        }
+
+
+@contextmanager
+def timed(name, **labels):
+    """
+    Time a block into the <name>_seconds histogram and the home.timing log
+
+    Usage:
+        with timed('upstream_request', endpoint='groq.scenes') as timing:
+            response = ...
+            timing.set(status=response.status_code)
+    """
+    timing = Timing(name, labels)
+    outcome = 'ok'
+    try:
+        yield timing
+    except BaseException as e:
+        outcome = 'error'
+        timing.set(error=type(e).__name__)
+        raise
+    finally:
+        timing.duration = time.monotonic() - timing.started
+        timing.set(outcome=outcome)
+        totals = _request_timings.get()
+        if totals is not None:
+            totals.add(name, timing.duration)
+        metrics.histogram(f'{name}_seconds', HELP.get(name, '')).observe(
+            timing.duration, outcome=outcome, **timing.labels
+        )
+        record = timing.as_dict()
+        logger.info(' '.join(f'{key}={value}' for key, value in record.items()), extra={'timing': record})
+
+
+class ViewTimingMiddleware:
+    """Times every view, labelled by its URL name"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with timed('view') as timing:
+            response = self.get_response(request)
+            self._label(timing, request, response)
+        return response
+
+    async def __acall__(self, request):
+        with timed('view') as timing:
+            response = await self.get_response(request)
+            self._label(timing, request, response)
+        return response
+
+    def _label(self, timing, request, response):
+        match = request.resolver_match
+        timing.labels['view'] = match.view_name if match else 'unresolved'
+        timing.set(method=request.method, status=response.status_code)
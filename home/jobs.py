@@ -0,0 +1,418 @@
+"""
+Generation job queue for WiseOwl
+Views enqueue GenerationJob rows; the generation worker claims and runs them
+"""
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+
+from home.bria_service import BriaFIBOService, AsyncBriaFIBOService
+from home.models import GenerationJob, Scene
+from home import image_store, metrics, rate_limiter, topic_cache
+from home.instrumentation import timed
+
+# Scene prefetch modes (settings.SCENE_PREFETCH_MODE)
+PREFETCH_EAGER = 'eager'              # All scenes generated in parallel before the journey is ready
+PREFETCH_SPECULATIVE = 'speculative'  # Scene 1 first, later scenes queued in the background
+PREFETCH_LAZY = 'lazy'                # Later scenes generated when the quiz unlocks them
+
+
+class JobCancelled(Exception):
+    """Raised inside a running job once its row has been cancelled"""
+
+
+def prefetch_mode():
+    return getattr(settings, 'SCENE_PREFETCH_MODE', PREFETCH_SPECULATIVE)
+
+
+def enqueue_journey(topic):
+    """Queue generation of a topic's scenes data and Scene 1"""
+    return _enqueue(topic, GenerationJob.KIND_JOURNEY)
+
+
+def enqueue_scene(topic, scene_number):
+    """Queue generation of a single scene of an existing journey"""
+    return _enqueue(topic, GenerationJob.KIND_SCENE, scene_number)
+
+
+def enqueue_images(topic, scene_number):
+    """Queue downloading a regenerated scene's images, so the request doesn't wait on them"""
+    # A running download may have listed the scene's images already, so only a queued one is reused
+    return _enqueue(topic, GenerationJob.KIND_IMAGES, scene_number, reuse=[GenerationJob.STATUS_QUEUED])
+
+
+def ensure_scene(topic, scene_number):
+    """Make sure an unlocked scene is generated or on its way; pending and failed scenes are queued again"""
+    scene = topic.scenes.filter(scene_number=scene_number).first()
+    if scene and scene.generation_status in (Scene.STATUS_COMPLETED, Scene.STATUS_GENERATING):
+        return None
+
+    if prefetch_mode() == PREFETCH_EAGER and topic.jobs.filter(
+        kind=GenerationJob.KIND_JOURNEY,
+        status__in=GenerationJob.ACTIVE_STATUSES
+    ).exists():
+        return None  # The journey job is already building every scene
+
+    return enqueue_scene(topic, scene_number)
+
+
+def retry_scene(topic, scene_number):
+    """Start a stopped or failed scene again, restarting the journey first if it was cancelled"""
+    if not topic.scenes_data or _journey_cancelled(topic):
+        journey = enqueue_journey(topic)
+        if not topic.scenes_data or scene_number == 1:
+            return journey  # It writes the scenes and builds Scene 1
+    return ensure_scene(topic, scene_number) or job_for_scene(topic, scene_number)
+
+
+def job_for_scene(topic, scene_number):
+    """The active job building a scene: its own scene job, else the journey job writing the scenes"""
+    active = list(
+        topic.jobs.filter(status__in=GenerationJob.ACTIVE_STATUSES)
+        .filter(Q(kind=GenerationJob.KIND_SCENE, scene_number=scene_number) | Q(kind=GenerationJob.KIND_JOURNEY))
+        .order_by('-created_at')
+    )
+    return next((job for job in active if job.kind == GenerationJob.KIND_SCENE), active[0] if active else None)
+
+
+def cancel_topic_jobs(topic):
+    """Cancel queued and running generation for an abandoned topic"""
+    return topic.jobs.filter(status__in=GenerationJob.ACTIVE_STATUSES).update(
+        status=GenerationJob.STATUS_CANCELLED,
+        finished_at=timezone.now(),
+    )
+
+
+def _enqueue(topic, kind, scene_number=None, reuse=GenerationJob.ACTIVE_STATUSES):
+    if kind == GenerationJob.KIND_SCENE and _journey_cancelled(topic):
+        return None  # The learner abandoned the topic; retry_scene() restarts it
+
+    existing = topic.jobs.filter(
+        kind=kind,
+        scene_number=scene_number,
+        status__in=reuse
+    ).first()
+    if existing:
+        return existing
+
+    job = GenerationJob.objects.create(topic=topic, kind=kind, scene_number=scene_number)
+
+    if getattr(settings, 'GENERATION_JOBS_RUN_INLINE', False):
+        # Development convenience: no separate worker process needed
+        threading.Thread(target=_run_inline, args=(job.pk,), daemon=True).start()
+
+    return job
+
+
+def _journey_cancelled(topic):
+    latest = (
+        topic.jobs.filter(kind=GenerationJob.KIND_JOURNEY)
+        .order_by('-created_at', '-pk')
+        .values_list('status', flat=True)
+        .first()
+    )
+    return latest == GenerationJob.STATUS_CANCELLED
+
+
+def _run_inline(job_id):
+    try:
+        job = claim_job(job_id)
+        if job:
+            run_job(job)
+    finally:
+        connection.close()  # The thread ends here; hand a pooled connection back
+
+
+def claim_job(job_id):
+    """Atomically move a queued job to running; returns None if someone else got it"""
+    claimed = GenerationJob.objects.filter(pk=job_id, status=GenerationJob.STATUS_QUEUED).update(
+        status=GenerationJob.STATUS_RUNNING,
+        started_at=timezone.now(),
+    )
+    if not claimed:
+        return None
+    job = GenerationJob.objects.select_related('topic').get(pk=job_id)
+    job.attempts += 1
+    job.save(update_fields=['attempts'])
+    return job
+
+
+def claim_next_job():
+    """Claim the oldest queued job, or return None when the queue is empty"""
+    queued = GenerationJob.objects.filter(status=GenerationJob.STATUS_QUEUED).values_list('pk', flat=True)
+    for job_id in queued[:10]:
+        job = claim_job(job_id)
+        if job:
+            return job
+    return None
+
+
+def requeue_stale_jobs(older_than_seconds):
+    """Put back jobs whose worker died mid-run"""
+    cutoff = timezone.now() - timedelta(seconds=older_than_seconds)
+    return GenerationJob.objects.filter(
+        status=GenerationJob.STATUS_RUNNING,
+        started_at__lt=cutoff
+    ).update(status=GenerationJob.STATUS_QUEUED, stage='')
+
+
+def run_job(job):
+    """Run a claimed job to completion, recording the outcome on the row"""
+    if job.started_at:
+        metrics.histogram('generation_queue_wait_seconds', 'Time jobs spend queued before a worker claims them').observe(
+            (job.started_at - job.created_at).total_seconds(), kind=job.kind
+        )
+    # Scene and images jobs are background work; they queue behind interactive calls for Groq/Bria capacity
+    level = rate_limiter.PRIORITY_DEFAULT if job.kind == GenerationJob.KIND_JOURNEY else rate_limiter.PRIORITY_BACKGROUND
+    try:
+        with timed('generation_job', kind=job.kind) as timing, rate_limiter.priority(level):
+            timing.set(job=job.pk, topic=job.topic_id)
+            if job.kind == GenerationJob.KIND_JOURNEY:
+                _run_journey(job)
+            elif job.kind == GenerationJob.KIND_IMAGES:
+                store_scene_images(job.topic, job.scene_number, job=job)
+            else:
+                build_scene(job.topic, job.scene_number, job=job)
+        _finish(job, GenerationJob.STATUS_COMPLETED)
+    except JobCancelled:
+        print(f"Generation job {job.pk} cancelled")
+    except Exception as e:
+        print(f"Generation job {job.pk} failed: {str(e)}")
+        _finish(job, GenerationJob.STATUS_FAILED, error=str(e))
+    return job
+
+
+def _run_journey(job):
+    topic = job.topic
+
+    if not topic.scenes_data:
+        _set_stage(job, 'scenes')
+        print(f"Generating scenes for: {topic.topic}")
+        with timed('generation_step', step='scenes'):
+            topic.scenes_data = topic_cache.scenes_for(topic.topic, topic.subject_type)
+        topic.save(update_fields=['scenes_data', 'updated_at'])
+
+    # Writing the scenes can take a while; don't set up any more work if the topic was abandoned meanwhile
+    _set_stage(job, 'prefetch')
+
+    mode = prefetch_mode()
+    if mode == PREFETCH_LAZY:
+        build_scene(topic, 1, job=job)
+        return
+
+    scene_numbers = _create_pending_scenes(topic)
+
+    if mode == PREFETCH_SPECULATIVE:
+        for scene_number in scene_numbers[1:]:
+            ensure_scene(topic, scene_number)  # A restarted journey skips scenes that are already done
+        build_scene(topic, 1, job=job)
+    else:
+        _build_scenes_parallel(topic, scene_numbers, job)
+
+
+def _create_pending_scenes(topic):
+    """Create Scene rows up front so unlocking only has to flip flags"""
+    existing = set(topic.scenes.values_list('scene_number', flat=True))
+    scenes = topic.scenes_data['scenes']
+    Scene.objects.bulk_create([
+        Scene(
+            topic=topic,
+            scene_number=number,
+            title=scene_info['title'],
+            description=scene_info['description'],
+            narration=scene_info['narration'],
+        )
+        for number, scene_info in enumerate(scenes, 1)
+        if number not in existing
+    ])
+    return list(range(1, len(scenes) + 1))
+
+
+def _build_scenes_parallel(topic, scene_numbers, job):
+    workers = getattr(settings, 'SCENE_PREFETCH_WORKERS', 3)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        # Each build runs in a copy of this context, so the job's outbound priority reaches the threads
+        futures = [
+            pool.submit(contextvars.copy_context().run, _build_scene_in_thread, topic, scene_number, job)
+            for scene_number in scene_numbers
+        ]
+        for future in futures:
+            future.result()
+
+
+def _build_scene_in_thread(topic, scene_number, job):
+    try:
+        return build_scene(topic, scene_number, job=job)
+    finally:
+        connection.close()
+
+
+def build_scene(topic, scene_number, job=None):
+    """Generate image and quiz for one scene, moving it through generation_status"""
+    scene_info = topic.scenes_data['scenes'][scene_number - 1]
+
+    scene, _ = Scene.objects.get_or_create(
+        topic=topic,
+        scene_number=scene_number,
+        defaults={
+            'title': scene_info['title'],
+            'description': scene_info['description'],
+            'narration': scene_info['narration'],
+        }
+    )
+    if scene.generation_status == Scene.STATUS_COMPLETED:
+        return scene
+
+    _set_scene_status(scene, Scene.STATUS_GENERATING)
+    bria = BriaFIBOService()
+
+    try:
+        # Generate image
+        _set_stage(job, f'scene_{scene_number}_translate')
+        with timed('generation_step', step='translate') as timing:
+            scene_result = bria.translate_to_scene(scene_info['description'], 'single')
+            timing.set(cached=scene_result.get('cached', False))
+        json_scene = scene_result.get('scene', {})
+
+        _set_stage(job, f'scene_{scene_number}_image')
+        with timed('generation_step', step='image'):
+            image_result = bria.generate_image(json_scene, scene_info['description'])
+        image_url = image_result.get('image_url') if image_result.get('status') == 'success' else None
+
+        # Generate quiz
+        _set_stage(job, f'scene_{scene_number}_quiz')
+        with timed('generation_step', step='quiz') as timing:
+            timing.set(cached=bool(scene_info.get('quiz')))
+            quiz_data = scene_info.get('quiz') or topic_cache.quiz_for(
+                topic.topic, topic.subject_type, scene_number, scene_info['description']
+            )
+    except JobCancelled:
+        _set_scene_status(scene, Scene.STATUS_PENDING)
+        raise
+    except Exception:
+        _set_scene_status(scene, Scene.STATUS_FAILED)
+        raise
+
+    scene.json_scene = json_scene
+    scene.image_url = image_url
+    with timed('generation_step', step='store_image'):
+        scene.image = image_store.ingest_url(image_url) if image_url else None
+    scene.quiz_data = quiz_data
+    scene.generation_status = Scene.STATUS_COMPLETED if image_url else Scene.STATUS_FAILED
+    scene.save()
+    return scene
+
+
+async def abuild_scene(topic, scene_number):
+    """build_scene for the async views - no thread is held while Bria and Groq work"""
+    scene_info = topic.scenes_data['scenes'][scene_number - 1]
+
+    scene, _ = await Scene.objects.aget_or_create(
+        topic=topic,
+        scene_number=scene_number,
+        defaults={
+            'title': scene_info['title'],
+            'description': scene_info['description'],
+            'narration': scene_info['narration'],
+        }
+    )
+    if scene.generation_status == Scene.STATUS_COMPLETED:
+        return scene
+
+    await sync_to_async(_set_scene_status)(scene, Scene.STATUS_GENERATING)
+    bria = AsyncBriaFIBOService()
+
+    try:
+        scene_result = await bria.translate_to_scene(scene_info['description'], 'single')
+        json_scene = scene_result.get('scene', {})
+
+        image_result = await bria.generate_image(json_scene, scene_info['description'])
+        image_url = image_result.get('image_url') if image_result.get('status') == 'success' else None
+
+        quiz_data = scene_info.get('quiz') or await topic_cache.aquiz_for(
+            topic.topic, topic.subject_type, scene_number, scene_info['description']
+        )
+    except Exception:
+        await sync_to_async(_set_scene_status)(scene, Scene.STATUS_FAILED)
+        raise
+
+    scene.json_scene = json_scene
+    scene.image_url = image_url
+    scene.image = await image_store.aingest_url(image_url) if image_url else None
+    scene.quiz_data = quiz_data
+    scene.generation_status = Scene.STATUS_COMPLETED if image_url else Scene.STATUS_FAILED
+    await scene.asave()
+    return scene
+
+
+def store_scene_images(topic, scene_number, job=None):
+    """Download the scene's current and earlier images that aren't in the image store yet"""
+    scene = topic.scenes.get(scene_number=scene_number)
+    urls = set(
+        scene.variations.filter(image__isnull=True, image_url__isnull=False).values_list('image_url', flat=True)
+    )
+    if scene.image_url and not scene.image_id:
+        urls.add(scene.image_url)
+
+    for url in sorted(urls):
+        _set_stage(job, f'scene_{scene_number}_store_image')
+        with timed('generation_step', step='store_image'):
+            image = image_store.ingest_url(url)
+        if image:
+            # Only rows still showing this URL - the learner may have regenerated or restored meanwhile
+            Scene.objects.filter(pk=scene.pk, image_url=url, image__isnull=True).update(image=image)
+            scene.variations.filter(image_url=url, image__isnull=True).update(image=image)
+
+
+def job_status(job):
+    """JSON-serialisable progress snapshot for the poll endpoint"""
+    scenes = job.topic.scenes.values('scene_number', 'generation_status')
+    return {
+        'id': job.pk,
+        'kind': job.kind,
+        'status': job.status,
+        'stage': job.stage,
+        'error': job.error,
+        'topic_id': job.topic_id,
+        'scenes': [
+            {'number': s['scene_number'], 'status': s['generation_status']}
+            for s in scenes
+        ],
+    }
+
+
+def _set_stage(job, stage):
+    """Record progress, bailing out if the job was cancelled in the meantime"""
+    if job is None:
+        return
+    updated = GenerationJob.objects.filter(pk=job.pk).exclude(
+        status=GenerationJob.STATUS_CANCELLED
+    ).update(stage=stage)
+    if not updated:
+        raise JobCancelled(job.pk)
+    job.stage = stage
+
+
+def _set_scene_status(scene, status):
+    scene.generation_status = status
+    scene.save(update_fields=['generation_status'])
+
+
+def _finish(job, status, error=''):
+    job.status = status
+    job.error = error
+    job.stage = '' if status == GenerationJob.STATUS_COMPLETED else job.stage
+    job.finished_at = timezone.now()
+    GenerationJob.objects.filter(pk=job.pk).exclude(status=GenerationJob.STATUS_CANCELLED).update(
+        status=job.status,
+        error=job.error,
+        stage=job.stage,
+        finished_at=job.finished_at,
+    )
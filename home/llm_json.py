@@ -0,0 +1,333 @@
+"""
+JSON extraction and schema validation for LLM completions
+Finds balanced JSON in (possibly streamed) text, repairs common defects and checks it
+against compiled schemas; every repair path is counted in home.metrics
+"""
+import json
+import re
+
+from home import metrics
+
+
+# Extraction
+
+class JSONScanner:
+    """Incremental scanner for balanced JSON objects in text that arrives in chunks"""
+
+    def __init__(self):
+        self.buffer = ''
+        self.pos = 0
+        self.start = None
+        self.stack = []  # Open brackets of the current candidate
+        self.in_string = False
+        self.escape = False
+
+    def feed(self, chunk):
+        """Add text; returns the balanced top-level {...} snippets completed by it"""
+        self.buffer += chunk
+        found = []
+        while self.pos < len(self.buffer):
+            ch = self.buffer[self.pos]
+            if self.start is None:
+                if ch == '{':
+                    self.start = self.pos
+                    self.stack = ['{']
+            elif self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif ch == '\\':
+                    self.escape = True
+                elif ch == '"':
+                    self.in_string = False
+            elif ch == '"':
+                self.in_string = True
+            elif ch in '{[':
+                self.stack.append(ch)
+            elif ch in '}]':
+                self.stack.pop()
+                if not self.stack:
+                    found.append(self.buffer[self.start:self.pos + 1])
+                    self.start = None
+            self.pos += 1
+
+        if self.start is None:  # Nothing open - drop text we have already scanned
+            self.buffer, self.pos = '', 0
+        return found
+
+    def pending(self):
+        """The unfinished candidate, e.g. when output was cut off mid-object"""
+        return self.buffer[self.start:] if self.start is not None else ''
+
+    def close_pending(self):
+        """Best-effort completion of pending() by closing its open string and brackets"""
+        text = self.pending()
+        if not text:
+            return ''
+        if self.in_string:
+            text += '"'
+        text = re.sub(r'[\s,]*$', '', text)
+        text = re.sub(r',?\s*"[^"]*"\s*:\s*$', '', text)  # Key without a value
+        closing = {'{': '}', '[': ']'}
+        return text + ''.join(closing[bracket] for bracket in reversed(self.stack))
+
+
+def extract_json(content, kind='json'):
+    """
+    First JSON object in a completion, repairing it if needed
+
+    Args:
+        content: Completion text, possibly with prose or code fences around the JSON
+        kind: Label for the counters (e.g. 'scenes', 'quiz')
+
+    Returns:
+        dict or None if nothing usable was found
+    """
+    parses = metrics.counter('llm_json_parse_total', 'LLM JSON extraction outcomes')
+    text = content or ''
+    if '```' in text:
+        text = re.sub(r'```(?:json)?', '', text)
+        _count_repair(kind, 'code_fence')
+
+    offset = 0
+    while True:
+        start = text.find('{', offset)
+        if start == -1:
+            break
+        scanner = JSONScanner()
+        candidates = scanner.feed(text[start:])
+        if candidates:
+            value, repairs = _loads(candidates[0])
+            if isinstance(value, dict):
+                for repair in repairs:
+                    _count_repair(kind, repair)
+                parses.inc(kind=kind, outcome='repaired' if repairs else 'clean')
+                return value
+            _count_repair(kind, 'skipped_candidate')
+            offset = start + len(candidates[0])  # Braces in the prose; try what follows
+            continue
+
+        value, repairs = _loads(scanner.close_pending())  # Output cut off mid-object
+        if isinstance(value, dict):
+            for repair in ['truncated', *repairs]:
+                _count_repair(kind, repair)
+            parses.inc(kind=kind, outcome='repaired')
+            return value
+        offset = start + 1
+
+    parses.inc(kind=kind, outcome='failed')
+    return None
+
+
+def _loads(snippet):
+    """(value, repairs applied) - value is None when even the repairs don't parse"""
+    if not snippet:
+        return None, []
+    try:
+        return json.loads(snippet), []
+    except ValueError:
+        pass
+
+    try:
+        return json.loads(snippet, strict=False), ['control_chars']  # Raw newlines inside strings
+    except ValueError:
+        pass
+
+    repairs = []
+    for name, fix in REPAIRS:
+        fixed = fix(snippet)
+        if fixed == snippet:
+            continue
+        snippet = fixed
+        repairs.append(name)
+        try:
+            return json.loads(snippet, strict=False), repairs
+        except ValueError:
+            continue
+    return None, repairs
+
+
+REPAIRS = (
+    ('smart_quotes', lambda text: text.translate(str.maketrans({'\u201c': '"', '\u201d': '"'}))),
+    ('trailing_comma', lambda text: re.sub(r',\s*([}\]])', r'\1', text)),
+    ('python_literals', lambda text: re.sub(
+        r'(?<=[\s:\[,])(True|False|None)(?=\s*[,}\]])',
+        lambda m: {'True': 'true', 'False': 'false', 'None': 'null'}[m.group(1)],
+        text
+    )),
+)
+
+
+def _count_repair(kind, repair):
+    metrics.counter('llm_json_repairs_total', 'LLM JSON repairs by type').inc(kind=kind, repair=repair)
+
+
+# Schemas
+
+def compile_schema(spec):
+    """
+    Turn a schema spec into a validator returning a list of error strings
+
+    Specs are dicts with a "type" of object/array/string/integer plus:
+        object: "properties" (name -> spec), "required" (names), "check" (callable -> error or None)
+        array: "items" (spec), "min_items", "max_items"
+        string: "min_length"
+        integer: "minimum"
+    """
+    kind = spec['type']
+
+    if kind == 'object':
+        properties = {name: compile_schema(child) for name, child in spec.get('properties', {}).items()}
+        required = tuple(spec.get('required', properties))
+        check = spec.get('check')
+
+        def validate(value, path='$'):
+            if not isinstance(value, dict):
+                return [f'{path}: expected object']
+            errors = [f'{path}.{name}: required' for name in required if name not in value]
+            for name, validator in properties.items():
+                if name in value:
+                    errors += validator(value[name], f'{path}.{name}')
+            if not errors and check:
+                problem = check(value)
+                if problem:
+                    errors.append(f'{path}: {problem}')
+            return errors
+
+    elif kind == 'array':
+        items = compile_schema(spec['items']) if 'items' in spec else None
+        min_items = spec.get('min_items', 0)
+        max_items = spec.get('max_items')
+
+        def validate(value, path='$'):
+            if not isinstance(value, list):
+                return [f'{path}: expected array']
+            errors = []
+            if len(value) < min_items:
+                errors.append(f'{path}: expected at least {min_items} items')
+            if max_items is not None and len(value) > max_items:
+                errors.append(f'{path}: expected at most {max_items} items')
+            if items:
+                for index, item in enumerate(value):
+                    errors += items(item, f'{path}[{index}]')
+            return errors
+
+    elif kind == 'string':
+        min_length = spec.get('min_length', 0)
+
+        def validate(value, path='$'):
+            if not isinstance(value, str):
+                return [f'{path}: expected string']
+            if len(value.strip()) < min_length:
+                return [f'{path}: too short']
+            return []
+
+    elif kind == 'integer':
+        minimum = spec.get('minimum')
+
+        def validate(value, path='$'):
+            if not isinstance(value, int) or isinstance(value, bool):
+                return [f'{path}: expected integer']
+            if minimum is not None and value < minimum:
+                return [f'{path}: below {minimum}']
+            return []
+
+    else:
+        raise ValueError(f'Unknown schema type: {kind}')
+
+    return validate
+
+
+def _correct_in_range(question):
+    if question['correct'] >= len(question['options']):
+        return 'correct is not one of the options'
+    return None
+
+
+SCENE = compile_schema({
+    'type': 'object',
+    'properties': {
+        'title': {'type': 'string', 'min_length': 1},
+        'description': {'type': 'string', 'min_length': 1},
+        'narration': {'type': 'string', 'min_length': 1},
+    },
+})
+
+QUESTION = compile_schema({
+    'type': 'object',
+    'properties': {
+        'question': {'type': 'string', 'min_length': 1},
+        'options': {'type': 'array', 'items': {'type': 'string', 'min_length': 1}, 'min_items': 2},
+        'correct': {'type': 'integer', 'minimum': 0},
+    },
+    'check': _correct_in_range,
+})
+
+def validate(schema, value, kind='json'):
+    """Errors from a compiled schema, counting valid/invalid outcomes under kind"""
+    errors = schema(value)
+    metrics.counter('llm_schema_total', 'LLM output schema validation outcomes').inc(
+        kind=kind, outcome='invalid' if errors else 'valid'
+    )
+    return errors
+
+
+# Normalisation of near-misses the schemas would otherwise reject
+
+def normalize_scenes(data):
+    """Accept a bare list of scenes and fill in missing scene numbers"""
+    if isinstance(data, list):
+        data = {'scenes': data}
+        _count_repair('scenes', 'bare_list')
+    if isinstance(data, dict) and isinstance(data.get('scenes'), list):
+        for number, scene in enumerate(data['scenes'], 1):
+            if isinstance(scene, dict) and not isinstance(scene.get('number'), int):
+                scene['number'] = number
+    return data
+
+
+def normalize_quiz(data):
+    """Accept a bare list of questions and letter/text answers for "correct" """
+    if isinstance(data, list):
+        data = {'questions': data}
+        _count_repair('quiz', 'bare_list')
+    if not isinstance(data, dict) or not isinstance(data.get('questions'), list):
+        return data
+
+    for question in data['questions']:
+        if not isinstance(question, dict) or not isinstance(question.get('options'), list):
+            continue
+        correct = question.get('correct')
+        if isinstance(correct, str):
+            index = _answer_index(correct.strip(), question['options'])
+            if index is not None:
+                question['correct'] = index
+                _count_repair('quiz', 'correct_as_text')
+    return data
+
+
+def _answer_index(answer, options):
+    if answer.isdigit():
+        return int(answer)
+    letter = answer.rstrip(').').upper()
+    if len(letter) == 1 and 'A' <= letter <= 'Z':
+        return ord(letter) - ord('A')
+    for index, option in enumerate(options):
+        if isinstance(option, str) and (option == answer or option.split(') ', 1)[-1] == answer):
+            return index
+    return None
+
+
+def valid_scenes(data):
+    """The scene dicts in data that pass the SCENE schema, keyed by scene number"""
+    scenes = data.get('scenes', []) if isinstance(data, dict) else []
+    return {
+        scene['number']: scene
+        for scene in scenes
+        if validate(SCENE, scene, 'scene') == [] and isinstance(scene.get('number'), int)
+    }
+
+
+def valid_questions(data):
+    """The questions in a quiz that pass the QUESTION schema"""
+    questions = data.get('questions', []) if isinstance(data, dict) else []
+    return [question for question in questions if validate(QUESTION, question, 'question') == []]
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from home import demo_catalog
+from home.bria_service import BriaFIBOService
+from home.groq_service import GroqAIService
+
+
+class Command(BaseCommand):
+    help = 'Build DemoJourney rows from the demo source files in DEMO_CATALOG_DIRS'
+
+    def add_arguments(self, parser):
+        parser.add_argument('slugs', nargs='*', help='Only build these demos (default: all)')
+        parser.add_argument('--images', action='store_true', help='Pre-render scene images with Bria')
+        parser.add_argument('--refresh', action='store_true', help='Regenerate quizzes and images already built')
+
+    def handle(self, *args, **options):
+        sources = [demo_catalog.load_source(path) for path in demo_catalog.source_files()]
+        if options['slugs']:
+            unknown = set(options['slugs']) - {source['slug'] for source in sources}
+            if unknown:
+                raise CommandError(f"Unknown demo(s): {', '.join(sorted(unknown))}")
+            sources = [source for source in sources if source['slug'] in options['slugs']]
+
+        groq = GroqAIService()
+        bria = BriaFIBOService() if options['images'] else None
+
+        for source in sources:
+            demo = demo_catalog.build_demo(source, groq=groq, bria=bria, refresh=options['refresh'])
+            scenes = demo.scenes_data['scenes']
+            images = sum(1 for scene in scenes if scene.get('image'))
+            self.stdout.write(f'Built "{demo.slug}": {len(scenes)} scenes, {images} pre-rendered images')
+
+        self.stdout.write(self.style.SUCCESS(f'Built {len(sources)} demo(s)'))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from home import scene_history
+
+
+class Command(BaseCommand):
+    help = 'Delete scene variations older than the retention period or beyond the newest kept per scene'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help='Maximum age in days (default SCENE_VARIATIONS_MAX_AGE)')
+        parser.add_argument('--keep', type=int, help='Variations kept per scene (default SCENE_VARIATIONS_KEEP)')
+
+    def handle(self, *args, **options):
+        deleted = scene_history.prune(max_age_days=options['days'], keep=options['keep'])
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} scene variation(s)'))
@@ -0,0 +1,50 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from home import quiz_analytics
+from home.models import QuizAttempt
+
+
+class Command(BaseCommand):
+    help = 'Print quiz analytics: accuracy per question, attempts to unlock and the most missed scenes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Only attempts by this username')
+        parser.add_argument('--topic', type=int, help='Only attempts on this topic id')
+        parser.add_argument('--days', type=int, help='Only attempts from the last N days')
+        parser.add_argument('--limit', type=int, default=10, help='Rows in the most missed scenes table')
+
+    def handle(self, *args, **options):
+        attempts = QuizAttempt.objects.all()
+        if options['user']:
+            attempts = attempts.filter(user__username=options['user'])
+        if options['topic']:
+            attempts = attempts.filter(topic_id=options['topic'])
+        if options['days']:
+            attempts = attempts.filter(created_at__gte=timezone.now() - timedelta(days=options['days']))
+
+        self.stdout.write(f"{'topic':<30}{'scene':>6}{'question':>9}{'answers':>9}{'accuracy':>10}")
+        for row in quiz_analytics.question_accuracy(attempts):
+            self.stdout.write(
+                f"{row['topic'][:29]:<30}{row['scene_number']:>6}{row['question_index'] + 1:>9}"
+                f"{row['answered']:>9}{_percent(row['accuracy']):>10}"
+            )
+
+        self.stdout.write(f"\n{'scene':<6}{'unlocked':>9}{'mean tries':>12}{'max tries':>11}")
+        for row in quiz_analytics.attempts_to_unlock(attempts):
+            self.stdout.write(
+                f"{row['scene_number']:<6}{row['unlocked']:>9}{row['mean_attempts']:>12.2f}{row['max_attempts']:>11}"
+            )
+
+        self.stdout.write(f"\n{'topic':<30}{'scene':>6}{'attempts':>9}{'failed':>8}{'missed':>10}")
+        for row in quiz_analytics.most_missed_scenes(attempts, options['limit']):
+            self.stdout.write(
+                f"{row['topic_name'][:29]:<30}{row['scene_number']:>6}{row['attempts']:>9}"
+                f"{row['failed']:>8}{_percent(row['miss_rate']):>10}"
+            )
+
+
+def _percent(ratio):
+    return '-' if ratio is None else f'{ratio * 100:.0f}%'
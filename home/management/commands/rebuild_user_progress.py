@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from home import progress
+from home.models import User, UserProgress
+
+
+class Command(BaseCommand):
+    help = 'Recompute the denormalized UserProgress dashboard totals from topics'
+
+    def add_arguments(self, parser):
+        parser.add_argument('users', nargs='*', help='Usernames to rebuild (default: everyone)')
+        parser.add_argument('--missing', action='store_true', help='Only create rows for users that have none')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        users = User.objects.order_by('pk')
+        if options['users']:
+            users = users.filter(username__in=options['users'])
+        if options['missing']:
+            users = users.exclude(pk__in=UserProgress.objects.values('pk'))
+
+        written = progress.rebuild(users.values_list('pk', flat=True).iterator(), options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt progress for {written} user(s)'))
@@ -0,0 +1,224 @@
+import contextlib
+import json
+import logging
+import os
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+from django.test.utils import override_settings
+
+from home import benchmark, circuit_breaker, single_flight
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class Command(BaseCommand):
+    help = 'Load-test the real URL routes with simulated learners against local fake Groq/Bria servers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--learners', type=int, default=10, help='Concurrent simulated learners')
+        parser.add_argument('--journeys', type=int, default=1, help='Journeys per learner')
+        parser.add_argument('--owl-chats', type=int, default=2, help='Owl chat messages per journey')
+        parser.add_argument('--groq-latency', type=float, default=0.3, help='Mean fake Groq latency in seconds')
+        parser.add_argument('--bria-latency', type=float, default=0.5, help='Mean fake Bria latency in seconds')
+        parser.add_argument('--error-rate', type=float, default=0.0, help='Share of fake upstream calls that return 503')
+        parser.add_argument('--payload-kb', type=int, default=4, help='Narration size per fake Groq scene')
+        parser.add_argument('--image-width', type=int, default=1024, help='Width of the fake Bria images')
+        parser.add_argument('--seed', type=int, help='Seed for fake latencies and errors')
+        parser.add_argument('--fake-port', type=int, default=0,
+                            help='Port for the fake upstream (fix it when using --target)')
+        parser.add_argument('--target',
+                            help='Benchmark an already running server instead of an in-process one; start it with '
+                                 'the GROQ_API_URL/BRIA_*_URL printed by this command and a generation worker')
+        parser.add_argument('--ready-timeout', type=float, default=120, help='Seconds to wait for a journey job')
+        parser.add_argument('--output', help='Results file (default: benchmarks/<time>.json)')
+        parser.add_argument('--compare', help='Earlier results file to compare against')
+        parser.add_argument('--verbose', action='store_true', help='Keep service prints and timing logs')
+
+    def handle(self, *args, **options):
+        previous = None
+        if options['compare']:
+            try:
+                with open(options['compare'], encoding='utf-8') as f:
+                    previous = json.load(f)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Could not read {options['compare']}: {e}")
+
+        upstream = benchmark.FakeUpstream(
+            port=options['fake_port'],
+            groq_latency=options['groq_latency'],
+            bria_latency=options['bria_latency'],
+            error_rate=options['error_rate'],
+            payload_kb=options['payload_kb'],
+            image_width=options['image_width'],
+            seed=options['seed'],
+        ).start()
+        self.stdout.write(f'Fake Groq/Bria at {upstream.base_url}')
+
+        try:
+            if options['target']:
+                for name, value in upstream.settings_overrides().items():
+                    self.stdout.write(f'  {name}={value}')
+                summary = self.run(options['target'], options, memory_scope='harness')
+            else:
+                summary = self.run_in_process(upstream, options)
+        finally:
+            upstream.stop()
+
+        results = {
+            'started_at': datetime.now(timezone.utc).isoformat(),
+            'config': {
+                key: options[key] for key in (
+                    'learners', 'journeys', 'owl_chats', 'groq_latency', 'bria_latency',
+                    'error_rate', 'payload_kb', 'image_width', 'seed', 'target',
+                )
+            },
+            'settings': {
+                'database': settings.DATABASES['default']['ENGINE'].rsplit('.', 1)[-1],
+                'ASYNC_VIEWS': getattr(settings, 'ASYNC_VIEWS', False),
+                'SCENE_PREFETCH_MODE': getattr(settings, 'SCENE_PREFETCH_MODE', ''),
+                'GROQ_BATCHED_GENERATION': getattr(settings, 'GROQ_BATCHED_GENERATION', True),
+                'HTTP_POOL_MAXSIZE': getattr(settings, 'HTTP_POOL_MAXSIZE', None),
+                'SESSION_ENGINE': settings.SESSION_ENGINE.rsplit('.', 1)[-1],
+                'SESSION_SAVE_EVERY_REQUEST': settings.SESSION_SAVE_EVERY_REQUEST,
+                'CIRCUIT_BREAKER_ENABLED': getattr(settings, 'CIRCUIT_BREAKER_ENABLED', True),
+                'HTTP_ADAPTIVE_TIMEOUTS': getattr(settings, 'HTTP_ADAPTIVE_TIMEOUTS', True),
+                'SINGLE_FLIGHT_ENABLED': getattr(settings, 'SINGLE_FLIGHT_ENABLED', True),
+            },
+            **summary,
+            'upstream': upstream.stats(),
+        }
+
+        output = Path(options['output'] or Path(settings.BASE_DIR) / 'benchmarks' /
+                      f"{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps(results, indent=2), encoding='utf-8')
+
+        self.report(results)
+        if previous:
+            self.report_comparison(results, previous, options['compare'])
+        self.stdout.write(self.style.SUCCESS(f'Saved results to {output}'))
+
+    def run_in_process(self, upstream, options):
+        overrides = {
+            **upstream.settings_overrides(),
+            'GENERATION_JOBS_RUN_INLINE': True,  # No separate worker to start
+            'SERVER_TIMING_ENABLED': True,  # Per-request DB query counts come from this header
+            'THROTTLE_ENABLED': False,  # Learners replay journeys back to back, faster than any real user
+            'SECURE_SSL_REDIRECT': False,
+            'SESSION_COOKIE_SECURE': False,
+            'CSRF_COOKIE_SECURE': False,
+        }
+        with override_settings(**overrides):
+            server = ThreadedWSGIServer(('127.0.0.1', 0), QuietRequestHandler, allow_reuse_address=False)
+            server.set_app(WSGIHandler())
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            writes = benchmark.TableWriteCounter()
+            writes.install()
+            try:
+                summary = self.run(f'http://127.0.0.1:{server.server_port}', options, memory_scope='server')
+            finally:
+                writes.uninstall()
+                server.shutdown()
+                server.server_close()
+        return {
+            **summary,
+            'db_writes': writes.writes,
+            'breakers': circuit_breaker.all_breaker_stats(),
+            'single_flight': single_flight.stats(),
+        }
+
+    def run(self, base_url, options, memory_scope):
+        self.stdout.write(
+            f"Running {options['learners']} learner(s) x {options['journeys']} journey(s) against {base_url}"
+        )
+        memory_before = _memory()
+        with self.quiet(options['verbose']):
+            recorder, duration = benchmark.run_learners(
+                base_url,
+                learners=options['learners'],
+                journeys=options['journeys'],
+                owl_chats=options['owl_chats'],
+                ready_timeout=options['ready_timeout'],
+            )
+        return {
+            **benchmark.summarize(recorder, duration),
+            'memory': {'scope': memory_scope, 'before': memory_before, 'after': _memory()},
+        }
+
+    @contextlib.contextmanager
+    def quiet(self, verbose):
+        """Silence the services' prints and the timing log while learners run"""
+        if verbose:
+            yield
+            return
+        timing_logger = logging.getLogger('home.timing')
+        level = timing_logger.level
+        timing_logger.setLevel(logging.WARNING)
+        try:
+            with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                yield
+        finally:
+            timing_logger.setLevel(level)
+
+    def report(self, results):
+        self.stdout.write(f"\n{'route':<14}{'count':>7}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}"
+                          f"{'p99 ms':>10}{'req/s':>8}{'queries':>9}")
+        rows = {**results['routes'], 'TOTAL': results['total'], 'journey_ready': results['journey_ready']}
+        for route, stats in rows.items():
+            self.stdout.write(
+                f"{route:<14}{stats['count']:>7}{stats.get('errors', ''):>8}"
+                f"{_cell(stats['p50_ms']):>10}{_cell(stats['p95_ms']):>10}{_cell(stats['p99_ms']):>10}"
+                f"{_cell(stats['throughput_rps']):>8}{_cell(stats.get('db_queries_mean')):>9}"
+            )
+        if 'db_writes' in results:
+            self.stdout.write('\nDB writes: ' + ', '.join(
+                f"{table} {sum(counts.values())} ({', '.join(f'{verb} {n}' for verb, n in sorted(counts.items()))})"
+                for table, counts in sorted(results['db_writes'].items())
+            ))
+        opened = [name for name, stats in results.get('breakers', {}).items() if stats['state'] != 'closed']
+        if opened:
+            self.stdout.write('\nCircuit breakers not closed: ' + ', '.join(
+                f"{name} ({results['breakers'][name]['state']})" for name in sorted(opened)
+            ))
+        collapsed = {name: stats['collapsed'] for name, stats in results.get('single_flight', {}).items() if stats['collapsed']}
+        if collapsed:
+            self.stdout.write('\nCollapsed upstream calls: ' + ', '.join(
+                f"{name} {count}" for name, count in sorted(collapsed.items())
+            ))
+        memory = results['memory']['after']
+        if memory:
+            self.stdout.write(f"\nMemory ({results['memory']['scope']}): rss {memory['rss_mb']} MB, "
+                              f"peak {memory['peak_rss_mb']} MB")
+
+    def report_comparison(self, results, previous, path):
+        self.stdout.write(f'\nCompared with {path}:')
+        for route, field, before, now, change in benchmark.compare(results, previous):
+            self.stdout.write(f'{route:<14}{field:<17}{before:>10}{now:>10}{_cell(change, "%"):>10}')
+
+
+def _cell(value, suffix=''):
+    return '-' if value is None else f'{value}{suffix}'
+
+
+def _memory():
+    """Resident memory of this process in MB; empty where /proc or resource are unavailable"""
+    try:
+        import resource
+
+        with open('/proc/self/statm') as f:
+            rss_pages = int(f.read().split()[1])
+    except (ImportError, OSError):
+        return {}
+    return {
+        'rss_mb': round(rss_pages * os.sysconf('SC_PAGE_SIZE') / 2 ** 20, 1),
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),  # KB on Linux
+    }
@@ -0,0 +1,64 @@
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+from home import jobs
+
+
+class Command(BaseCommand):
+    help = 'Run queued Groq/Bria generation jobs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Exit once the queue is empty')
+        parser.add_argument('--sleep', type=float, default=1.0, help='Seconds to wait when the queue is empty')
+        parser.add_argument('--max-jobs', type=int, default=0, help='Exit after this many jobs (0 = no limit)')
+        parser.add_argument('--concurrency', type=int, default=1,
+                            help='Number of jobs to run in parallel threads (speculative prefetch wants 3+)')
+        parser.add_argument('--stale-after', type=int, default=600,
+                            help='Requeue running jobs older than this many seconds on startup')
+
+    def handle(self, *args, **options):
+        requeued = jobs.requeue_stale_jobs(options['stale_after'])
+        if requeued:
+            self.stdout.write(f'Requeued {requeued} stale job(s)')
+
+        self.processed = 0
+        self.lock = threading.Lock()
+
+        threads = [
+            threading.Thread(target=self.work, args=(options,))
+            for _ in range(max(1, options['concurrency']))
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.stdout.write(self.style.SUCCESS(f'Processed {self.processed} job(s)'))
+
+    def work(self, options):
+        try:
+            while not self.reached_limit(options):
+                close_old_connections()
+                job = jobs.claim_next_job()
+
+                if job is None:
+                    if options['once']:
+                        break
+                    time.sleep(options['sleep'])
+                    continue
+
+                self.stdout.write(f'Running {job}')
+                jobs.run_job(job)
+                self.stdout.write(f'Finished {job}')
+
+                with self.lock:
+                    self.processed += 1
+        finally:
+            connection.close()
+
+    def reached_limit(self, options):
+        with self.lock:
+            return bool(options['max_jobs']) and self.processed >= options['max_jobs']
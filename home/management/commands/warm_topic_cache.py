@@ -0,0 +1,45 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from home import topic_cache
+from home.groq_service import GroqAIService
+from home.models import Topic
+
+
+class Command(BaseCommand):
+    help = 'Pre-generate shared Groq scenes and quizzes for a list of topics'
+
+    def add_arguments(self, parser):
+        parser.add_argument('topics', nargs='*', help='Topics to warm')
+        parser.add_argument('--file', help='Text file with one topic per line')
+        parser.add_argument('--subject', default='history',
+                            choices=[choice for choice, _ in Topic.SUBJECT_CHOICES])
+        parser.add_argument('--refresh', action='store_true', help='Regenerate topics that are already cached')
+
+    def handle(self, *args, **options):
+        topics = list(options['topics'])
+        if options['file']:
+            with open(options['file'], encoding='utf-8') as f:
+                topics += [line.strip() for line in f if line.strip() and not line.startswith('#')]
+        if not topics:
+            raise CommandError('Give topics as arguments or with --file')
+
+        groq = GroqAIService()
+        subject_type = options['subject']
+
+        for topic_text in topics:
+            if options['refresh']:
+                if getattr(settings, 'GROQ_BATCHED_GENERATION', True):
+                    scenes_data = groq.generate_journey(topic_text, subject_type)
+                else:
+                    scenes_data = groq.generate_scenes(topic_text, subject_type)
+                topic_cache.store_scenes(topic_text, subject_type, scenes_data)
+            else:
+                scenes_data = topic_cache.scenes_for(topic_text, subject_type, groq)
+
+            for number, scene_info in enumerate(scenes_data['scenes'], 1):
+                topic_cache.quiz_for(topic_text, subject_type, number, scene_info['description'], groq)
+
+            self.stdout.write(f'Warmed "{topic_text}" as {topic_cache.normalize_topic(topic_text)!r}')
+
+        self.stdout.write(self.style.SUCCESS(f'Warmed {len(topics)} topic(s)'))
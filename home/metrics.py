@@ -0,0 +1,180 @@
+"""
+In-process metrics registry for WiseOwl
+Histograms for latencies such as owl chat time-to-first-token, counters for events,
+gauges for current state such as circuit breakers, exported in Prometheus text format by the internal metrics view
+"""
+import bisect
+import threading
+
+
+# Seconds; suits everything from a cache hit to a 120s Bria generation
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+# Bytes; request and response payload sizes
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+def _label_key(labels):
+    return tuple(sorted((label, str(value)) for label, value in labels.items()))
+
+
+def _label_text(key):
+    return ','.join(f'{label}={value}' for label, value in key) or 'total'
+
+
+class Histogram:
+    """Bucketed histogram with optional labels, safe to observe from many threads"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help_text='', buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(sorted(buckets))
+        self.series = {}  # Label key -> [bucket counts (last slot is +Inf), count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = [[0] * (len(self.buckets) + 1), 0, 0.0]
+            series[0][bisect.bisect_left(self.buckets, value)] += 1
+            series[1] += 1
+            series[2] += value
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                _label_text(key): {
+                    'count': count,
+                    'sum': round(total, 6),
+                    'buckets': dict(zip([*map(str, self.buckets), '+Inf'], counts)),
+                }
+                for key, (counts, count, total) in self.series.items()
+            }
+
+    def prometheus_lines(self):
+        with self._lock:
+            series = sorted((key, list(counts), count, total) for key, (counts, count, total) in self.series.items())
+        lines = []
+        for key, counts, count, total in series:
+            cumulative = 0
+            for bound, bucket_count in zip([*(repr(float(b)) for b in self.buckets), '+Inf'], counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{_prometheus_labels(key, le=bound)} {cumulative}')
+            lines.append(f'{self.name}_sum{_prometheus_labels(key)} {total:.6f}')
+            lines.append(f'{self.name}_count{_prometheus_labels(key)} {count}')
+        return lines
+
+
+class Counter:
+    """Monotonic counter with optional labels, e.g. inc(repair='trailing_comma')"""
+
+    kind = 'counter'
+
+    def __init__(self, name, help_text=''):
+        self.name = name
+        self.help_text = help_text
+        self.values = {}  # Label key -> count
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def snapshot(self):
+        with self._lock:
+            return {_label_text(key): count for key, count in self.values.items()}
+
+    def prometheus_lines(self):
+        with self._lock:
+            values = sorted(self.values.items())
+        return [f'{self.name}{_prometheus_labels(key)} {count}' for key, count in values]
+
+
+class Gauge:
+    """Value that goes up and down with optional labels, e.g. set(2, endpoint='groq.chat')"""
+
+    kind = 'gauge'
+
+    def __init__(self, name, help_text=''):
+        self.name = name
+        self.help_text = help_text
+        self.values = {}  # Label key -> value
+        self._lock = threading.Lock()
+
+    def set(self, value, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self.values[key] = value
+
+    def snapshot(self):
+        with self._lock:
+            return {_label_text(key): value for key, value in self.values.items()}
+
+    def prometheus_lines(self):
+        with self._lock:
+            values = sorted(self.values.items())
+        return [f'{self.name}{_prometheus_labels(key)} {value}' for key, value in values]
+
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+def _get_or_create(name, factory):
+    with _registry_lock:
+        metric = _registry.get(name)
+        if metric is None:
+            metric = factory()
+            _registry[name] = metric
+        return metric
+
+
+def histogram(name, help_text='', buckets=DEFAULT_BUCKETS):
+    """Get or create the process-wide histogram called name"""
+    return _get_or_create(name, lambda: Histogram(name, help_text, buckets))
+
+
+def counter(name, help_text=''):
+    """Get or create the process-wide counter called name"""
+    return _get_or_create(name, lambda: Counter(name, help_text))
+
+
+def gauge(name, help_text=''):
+    """Get or create the process-wide gauge called name"""
+    return _get_or_create(name, lambda: Gauge(name, help_text))
+
+
+def snapshot():
+    with _registry_lock:
+        metrics = list(_registry.values())
+    return {metric.name: metric.snapshot() for metric in metrics}
+
+
+def render_prometheus():
+    """Every metric in the Prometheus text exposition format (version 0.0.4)"""
+    with _registry_lock:
+        metrics = sorted(_registry.values(), key=lambda metric: metric.name)
+    lines = []
+    for metric in metrics:
+        if metric.help_text:
+            lines.append(f'# HELP {metric.name} {_escape(metric.help_text)}')
+        lines.append(f'# TYPE {metric.name} {metric.kind}')
+        lines += metric.prometheus_lines()
+    return '\n'.join(lines) + '\n'
+
+
+def _prometheus_labels(key, **extra):
+    pairs = [*key, *extra.items()]
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{label}="{_escape(value, quotes=True)}"' for label, value in pairs) + '}'
+
+
+def _escape(text, quotes=False):
+    text = str(text).replace('\\', '\\\\').replace('\n', '\\n')
+    return text.replace('"', '\\"') if quotes else text
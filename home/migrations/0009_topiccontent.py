@@ -0,0 +1,30 @@
+# Generated by Django 5.2.8 on 2026-10-18 12:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0008_cachedresponse'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TopicContent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('normalized_topic', models.CharField(max_length=255)),
+                ('subject_type', models.CharField(choices=[('history', 'History'), ('geography', 'Geography')], default='history', max_length=20)),
+                ('scenes_data', models.JSONField()),
+                ('quizzes', models.JSONField(default=dict)),
+                ('variety', models.FloatField(default=0.0)),
+                ('hits', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'unique_together': {('normalized_topic', 'subject_type')},
+            },
+        ),
+    ]
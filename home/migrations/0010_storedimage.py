@@ -0,0 +1,121 @@
+# Generated by Django 5.2.8 on 2026-10-18 12:35
+
+import base64
+import binascii
+import hashlib
+
+import django.db.models.deletion
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import storages
+from django.db import migrations, models
+
+
+# Frozen copies of the image store logic at the time of this migration, so later changes to
+# home.image_store can't change what it does. Only originals are written; the image views fall
+# back to them until derivatives exist.
+SIGNATURES = [
+    (b'\xff\xd8\xff', 'image/jpeg', 'jpg'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png', 'png'),
+    (b'GIF8', 'image/gif', 'gif'),
+]
+
+
+def _storage():
+    return storages[getattr(settings, 'IMAGE_STORE_STORAGE', 'default')]
+
+
+def _decode(image_data):
+    if image_data.startswith('data:'):
+        image_data = image_data.split(',', 1)[-1]
+    try:
+        return base64.b64decode(image_data, validate=True)
+    except (binascii.Error, ValueError):
+        return None
+
+
+def _sniff(raw):
+    if raw[:4] == b'RIFF' and raw[8:12] == b'WEBP':
+        return 'image/webp', 'webp'
+    for signature, content_type, ext in SIGNATURES:
+        if raw.startswith(signature):
+            return content_type, ext
+    return 'application/octet-stream', 'bin'
+
+
+def _store(StoredImage, raw):
+    digest = hashlib.sha256(raw).hexdigest()
+    existing = StoredImage.objects.filter(digest=digest).first()
+    if existing:
+        return existing
+
+    content_type, ext = _sniff(raw)
+    path = f'images/{digest[:2]}/{digest[2:4]}/{digest}.{ext}'
+    storage = _storage()
+    if not storage.exists(path):
+        storage.save(path, ContentFile(raw))
+    return StoredImage.objects.create(digest=digest, path=path, content_type=content_type, size=len(raw))
+
+
+def move_image_data_to_store(apps, schema_editor):
+    """Write inline SceneVariation.image_data into the image store"""
+    SceneVariation = apps.get_model('home', 'SceneVariation')
+    StoredImage = apps.get_model('home', 'StoredImage')
+
+    variations = SceneVariation.objects.exclude(image_data__isnull=True).exclude(image_data='')
+    for variation in variations.iterator():
+        raw = _decode(variation.image_data)
+        if raw:
+            variation.image = _store(StoredImage, raw)
+            variation.save(update_fields=['image'])
+
+
+def move_image_data_back(apps, schema_editor):
+    """Inline stored images into SceneVariation.image_data again, as data: URLs"""
+    SceneVariation = apps.get_model('home', 'SceneVariation')
+
+    storage = _storage()
+    for variation in SceneVariation.objects.exclude(image=None).select_related('image').iterator():
+        with storage.open(variation.image.path, 'rb') as f:
+            encoded = base64.b64encode(f.read()).decode('ascii')
+        variation.image_data = f'data:{variation.image.content_type};base64,{encoded}'
+        variation.save(update_fields=['image_data'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0009_topiccontent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoredImage',
+            fields=[
+                ('digest', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('source_url', models.URLField(blank=True, default='', max_length=500)),
+                ('path', models.CharField(max_length=255)),
+                ('content_type', models.CharField(max_length=50)),
+                ('size', models.IntegerField()),
+                ('width', models.IntegerField(blank=True, null=True)),
+                ('height', models.IntegerField(blank=True, null=True)),
+                ('derivatives', models.JSONField(default=dict)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='scene',
+            name='image',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='home.storedimage'),
+        ),
+        migrations.AddField(
+            model_name='scenevariation',
+            name='image',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='home.storedimage'),
+        ),
+        migrations.RunPython(move_image_data_to_store, move_image_data_back),
+        migrations.RemoveField(
+            model_name='scenevariation',
+            name='image_data',
+        ),
+    ]
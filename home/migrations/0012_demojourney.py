@@ -0,0 +1,58 @@
+# Generated by Django 5.2.8 on 2026-10-18 12:45
+
+import json
+from pathlib import Path
+
+from django.db import migrations, models
+
+
+def load_bundled_demos(apps, schema_editor):
+    """Import the demos shipped in home/demos so they work before build_demo_catalog runs"""
+    DemoJourney = apps.get_model('home', 'DemoJourney')
+    for path in sorted((Path(__file__).resolve().parent.parent / 'demos').glob('*.json')):
+        with open(path, encoding='utf-8') as f:
+            source = json.load(f)
+        for number, scene in enumerate(source['scenes'], 1):
+            scene.setdefault('number', number)
+        DemoJourney.objects.get_or_create(
+            slug=source['slug'],
+            defaults={
+                'title': source.get('title', source['topic']),
+                'tagline': source.get('tagline', ''),
+                'icon': source.get('icon', ''),
+                'order': source.get('order', 0),
+                'topic': source['topic'],
+                'subject_type': source.get('subject_type', 'history'),
+                'scenes_data': {'scenes': source['scenes']},
+            }
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0011_userprogress'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DemoJourney',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('slug', models.SlugField(max_length=100, unique=True)),
+                ('title', models.CharField(max_length=100)),
+                ('tagline', models.CharField(blank=True, max_length=255)),
+                ('icon', models.CharField(blank=True, max_length=10)),
+                ('order', models.IntegerField(default=0)),
+                ('topic', models.CharField(max_length=255)),
+                ('subject_type', models.CharField(choices=[('history', 'History'), ('geography', 'Geography')], default='history', max_length=20)),
+                ('scenes_data', models.JSONField(default=dict)),
+                ('published', models.BooleanField(default=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['order', 'slug'],
+            },
+        ),
+        migrations.RunPython(load_bundled_demos, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.8 on 2026-10-18 13:09
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0012_demojourney'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuizAttempt',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scene_number', models.IntegerField()),
+                ('correct', models.IntegerField()),
+                ('total', models.IntegerField()),
+                ('passed', models.BooleanField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('topic', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='quiz_attempts', to='home.topic')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='quiz_attempts', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='QuizAnswer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('question_index', models.IntegerField()),
+                ('answer', models.CharField(max_length=255)),
+                ('is_correct', models.BooleanField()),
+                ('attempt', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='answers', to='home.quizattempt')),
+            ],
+            options={
+                'ordering': ['question_index'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='quizattempt',
+            index=models.Index(fields=['user', 'topic', 'scene_number', 'created_at'], name='home_quizat_user_id_efb2a3_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='quizattempt',
+            index=models.Index(fields=['topic', 'scene_number', 'created_at'], name='home_quizat_topic_i_d9ce31_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='quizanswer',
+            unique_together={('attempt', 'question_index')},
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.8 on 2026-10-18 13:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0013_quizattempt'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scenevariation',
+            name='prompt',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='scenevariation',
+            name='scene',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='variations', to='home.scene'),
+        ),
+        migrations.AddIndex(
+            model_name='scenevariation',
+            index=models.Index(fields=['scene', 'created_at'], name='home_scenev_scene_i_3e2cf6_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='scenevariation',
+            index=models.Index(fields=['created_at'], name='home_scenev_created_d71b36_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 14:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0014_scenevariation_history'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='generationjob',
+            name='kind',
+            field=models.CharField(choices=[('journey', 'Journey'), ('scene', 'Scene'), ('images', 'Images')], default='journey', max_length=20),
+        ),
+    ]
@@ -1,5 +1,6 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.db.models.functions import Coalesce
 import json
 
 
@@ -11,6 +12,36 @@ class User(AbstractUser):
         return self.email or self.username
 
 
+class JSONArrayLength(models.Func):
+    """Length of a JSON array column, computed by the database"""
+    function = 'json_array_length'  # SQLite
+    output_field = models.IntegerField()
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, function='JSON_LENGTH', **extra_context)
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, function='jsonb_array_length', **extra_context)
+
+
+class TopicQuerySet(models.QuerySet):
+    def for_listing(self):
+        """Skip the large JSON columns that topic lists never show"""
+        return self.defer('scenes_data', 'quiz_scores')
+
+    def progress_aggregates(self):
+        return {
+            'total_topics': models.Count('id'),
+            'total_scenes': Coalesce(models.Sum(JSONArrayLength('scenes_unlocked')), 0),
+            'total_score': Coalesce(models.Sum('total_score'), 0),
+            'completed': models.Count('id', filter=models.Q(completed=True)),
+        }
+
+    def progress_stats(self):
+        """Dashboard totals for these topics in a single aggregate query"""
+        return self.aggregate(**self.progress_aggregates())
+
+
 class Topic(models.Model):
     SUBJECT_CHOICES = [
         ('history', 'History'),
@@ -34,6 +65,8 @@ class Topic(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = TopicQuerySet.as_manager()
+
     class Meta:
         ordering = ['-created_at']
 
@@ -41,8 +74,83 @@ class Topic(models.Model):
         return self.topic
 
 
+class UserProgress(models.Model):
+    """Dashboard totals per user, kept up to date by home.progress"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='progress')
+    total_topics = models.IntegerField(default=0)
+    total_scenes = models.IntegerField(default=0)  # Sum of unlocked scenes across topics
+    total_score = models.IntegerField(default=0)
+    completed = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Progress for {self.user}"
+
+
+class QuizAttempt(models.Model):
+    """One quiz submission; append-only history behind home.quiz_analytics"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='quiz_attempts')
+    topic = models.ForeignKey(Topic, on_delete=models.CASCADE, related_name='quiz_attempts')
+    scene_number = models.IntegerField()
+    correct = models.IntegerField()
+    total = models.IntegerField()
+    passed = models.BooleanField()  # Good enough to unlock the next scene
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['user', 'topic', 'scene_number', 'created_at']),
+            models.Index(fields=['topic', 'scene_number', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.topic_id} scene {self.scene_number}: {self.correct}/{self.total}"
+
+
+class QuizAnswer(models.Model):
+    """A single answer within a QuizAttempt"""
+    attempt = models.ForeignKey(QuizAttempt, on_delete=models.CASCADE, related_name='answers')
+    question_index = models.IntegerField()  # 0-based position in Scene.quiz_data['questions']
+    answer = models.CharField(max_length=255)
+    is_correct = models.BooleanField()
+
+    class Meta:
+        ordering = ['question_index']
+        unique_together = ['attempt', 'question_index']
+
+    def __str__(self):
+        return f"{self.attempt_id} Q{self.question_index + 1}: {self.answer}"
+
+
+class StoredImage(models.Model):
+    """Generated image downloaded once into media storage, addressed by its sha256"""
+    digest = models.CharField(max_length=64, primary_key=True)
+    source_url = models.URLField(max_length=500, blank=True, default='')
+    path = models.CharField(max_length=255)  # Original, relative to the storage root
+    content_type = models.CharField(max_length=50)
+    size = models.IntegerField()
+    width = models.IntegerField(null=True, blank=True)
+    height = models.IntegerField(null=True, blank=True)
+    derivatives = models.JSONField(default=dict)  # {"thumb": "images/ab/cd/<digest>-thumb.webp", ...}
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.digest
+
+    def url(self, variant='original'):
+        from home.image_store import image_url
+        return image_url(self, variant)
+
+
 class Scene(models.Model):
     """Individual scene in a topic journey"""
+    STATUS_PENDING = 'pending'
+    STATUS_GENERATING = 'generating'
+    STATUS_COMPLETED = 'completed'
+    STATUS_FAILED = 'failed'
+    STATUS_DEMO = 'demo'
+
     topic = models.ForeignKey(Topic, on_delete=models.CASCADE, related_name='scenes')
     scene_number = models.IntegerField()  # 1, 2, or 3
     title = models.CharField(max_length=255)
@@ -51,8 +159,9 @@ class Scene(models.Model):
     
     # Generated Image
     json_scene = models.JSONField(null=True, blank=True)
-    image_url = models.URLField(max_length=500, null=True, blank=True)
-    generation_status = models.CharField(max_length=50, default='pending')
+    image_url = models.URLField(max_length=500, null=True, blank=True)  # Remote Bria URL
+    image = models.ForeignKey(StoredImage, null=True, blank=True, on_delete=models.SET_NULL, related_name='+')
+    generation_status = models.CharField(max_length=50, default=STATUS_PENDING)
     
     # Quiz for this scene
     quiz_data = models.JSONField(null=True, blank=True)  # 2 questions
@@ -66,14 +175,159 @@ class Scene(models.Model):
     def __str__(self):
         return f"{self.topic.topic} - Scene {self.scene_number}"
 
+    @property
+    def quiz_ready(self):
+        """Generation is over and left a quiz - demo scenes ship with theirs, and a failed image keeps it"""
+        return self.generation_status in (self.STATUS_COMPLETED, self.STATUS_DEMO, self.STATUS_FAILED) and bool(self.quiz_data)
+
+    @property
+    def display_image_url(self):
+        """Locally stored panorama if we have it, otherwise the remote Bria URL"""
+        if self.image_id:
+            return self.image.url('viewer')
+        return self.image_url
+
+    @property
+    def thumbnail_url(self):
+        if self.image_id:
+            return self.image.url('thumb')
+        return self.image_url
+
+
+class DemoJourney(models.Model):
+    """Pre-built demo content, cloned into a learner's topics without any API calls"""
+    slug = models.SlugField(max_length=100, unique=True)
+    title = models.CharField(max_length=100)  # Demo card heading
+    tagline = models.CharField(max_length=255, blank=True)
+    icon = models.CharField(max_length=10, blank=True)
+    order = models.IntegerField(default=0)
+    topic = models.CharField(max_length=255)
+    subject_type = models.CharField(max_length=20, choices=Topic.SUBJECT_CHOICES, default='history')
+    scenes_data = models.JSONField(default=dict)  # {"scenes": [...]} with "quiz" and optional "image" digest per scene
+    published = models.BooleanField(default=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['order', 'slug']
+
+    def __str__(self):
+        return self.slug
+
 
 class SceneVariation(models.Model):
     """Store multiple variations/regenerations of a topic"""
     topic = models.ForeignKey(Topic, on_delete=models.CASCADE, related_name='variations')
+    scene = models.ForeignKey(Scene, null=True, blank=True, on_delete=models.CASCADE, related_name='variations')
+    prompt = models.TextField(blank=True, default='')  # What the learner asked for
     json_scene = models.JSONField()
     image_url = models.URLField(max_length=500, null=True, blank=True)
-    image_data = models.TextField(null=True, blank=True)
+    image = models.ForeignKey(StoredImage, null=True, blank=True, on_delete=models.SET_NULL, related_name='+')
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['scene', 'created_at']),  # History pages and per-scene trimming
+            models.Index(fields=['created_at']),  # Pruning by age
+        ]
+
+    @property
+    def display_image_url(self):
+        if self.image_id:
+            return self.image.url('viewer')
+        return self.image_url
+
+    @property
+    def thumbnail_url(self):
+        if self.image_id:
+            return self.image.url('thumb')
+        return self.image_url
+
+
+class TopicContent(models.Model):
+    """Groq scenes and quizzes shared by every Topic with the same normalized name"""
+    normalized_topic = models.CharField(max_length=255)
+    subject_type = models.CharField(max_length=20, choices=Topic.SUBJECT_CHOICES, default='history')
+    scenes_data = models.JSONField()
+    quizzes = models.JSONField(default=dict)  # {"1": {...quiz...}, "2": ...}
+
+    # Chance (0-1) of generating fresh content instead of reusing this entry
+    variety = models.FloatField(default=0.0)
+    hits = models.IntegerField(default=0)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['normalized_topic', 'subject_type']
+
+    def __str__(self):
+        return f"{self.normalized_topic} ({self.subject_type})"
+
+
+class GenerationJob(models.Model):
+    """Queued Groq/Bria generation work, picked up by the generation worker"""
+    KIND_JOURNEY = 'journey'
+    KIND_SCENE = 'scene'
+    KIND_IMAGES = 'images'  # Download a regenerated scene's images into the image store
+    KIND_CHOICES = [
+        (KIND_JOURNEY, 'Journey'),
+        (KIND_SCENE, 'Scene'),
+        (KIND_IMAGES, 'Images'),
+    ]
+
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_COMPLETED = 'completed'
+    STATUS_FAILED = 'failed'
+    STATUS_CANCELLED = 'cancelled'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_COMPLETED, 'Completed'),
+        (STATUS_FAILED, 'Failed'),
+        (STATUS_CANCELLED, 'Cancelled'),
+    ]
+    ACTIVE_STATUSES = [STATUS_QUEUED, STATUS_RUNNING]
+
+    topic = models.ForeignKey(Topic, on_delete=models.CASCADE, related_name='jobs')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, default=KIND_JOURNEY)
+    scene_number = models.IntegerField(null=True, blank=True)  # Only for scene and images jobs
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    stage = models.CharField(max_length=50, blank=True, default='')  # What the worker is doing now
+    error = models.TextField(blank=True, default='')
+    attempts = models.IntegerField(default=0)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} job #{self.pk} ({self.status})"
+
+    @property
+    def is_active(self):
+        return self.status in self.ACTIVE_STATUSES
+
+
+class CachedResponse(models.Model):
+    """Database backend for home.response_cache"""
+    key = models.CharField(max_length=64, primary_key=True)  # sha256 of the request
+    namespace = models.CharField(max_length=50)
+    value = models.JSONField()
+    expires_at = models.DateTimeField(db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['namespace', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.namespace}:{self.key[:12]}"
@@ -0,0 +1,93 @@
+"""
+Per-user progress totals for the WiseOwl dashboard
+UserProgress rows are adjusted by deltas as topics change, and rebuilt from Topic when missing
+"""
+from django.db import connection
+from django.db.models import F
+from django.db.models.signals import post_save, pre_delete
+from django.dispatch import receiver
+
+from home.models import Topic, UserProgress
+
+
+PROGRESS_FIELDS = ('total_topics', 'total_scenes', 'total_score', 'completed')
+
+
+def get_progress(user):
+    """The user's UserProgress - a primary key lookup, rebuilt from topics the first time"""
+    progress = UserProgress.objects.filter(pk=user.pk).first()
+    return progress or rebuild_user(user.pk)
+
+
+def snapshot(topic):
+    """A topic's contribution to its user's totals, to diff against after changes"""
+    return {
+        'total_topics': 1,
+        'total_scenes': len(topic.scenes_unlocked),
+        'total_score': topic.total_score,
+        'completed': int(topic.completed),
+    }
+
+
+def record_change(topic, before):
+    """Apply the difference between a snapshot() and the topic's current state"""
+    after = snapshot(topic)
+    _apply(topic.user_id, {field: after[field] - before[field] for field in PROGRESS_FIELDS})
+
+
+def rebuild_user(user_id):
+    """Recompute one user's totals from their topics"""
+    totals = Topic.objects.filter(user_id=user_id).progress_stats()
+    progress, _ = UserProgress.objects.update_or_create(user_id=user_id, defaults=totals)
+    return progress
+
+
+def rebuild(user_ids, batch_size=500):
+    """Recompute totals for many users; returns the number of rows written"""
+    user_ids = list(user_ids)
+    written = 0
+    for start in range(0, len(user_ids), batch_size):
+        batch = user_ids[start:start + batch_size]
+        totals = {
+            row.pop('user'): row
+            for row in Topic.objects.filter(user_id__in=batch).order_by().values('user')
+            .annotate(**Topic.objects.progress_aggregates())
+        }
+        rows = [
+            UserProgress(user_id=user_id, **totals.get(user_id, dict.fromkeys(PROGRESS_FIELDS, 0)))
+            for user_id in batch
+        ]
+        UserProgress.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=['user'] if connection.features.supports_update_conflicts_with_target else None,
+            update_fields=[*PROGRESS_FIELDS, 'updated_at'],
+        )
+        written += len(rows)
+    return written
+
+
+def _apply(user_id, deltas, create_missing=True):
+    deltas = {field: delta for field, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    updated = UserProgress.objects.filter(pk=user_id).update(
+        **{field: F(field) + delta for field, delta in deltas.items()}
+    )
+    if not updated and create_missing:
+        rebuild_user(user_id)  # No row yet; the rebuild already includes this change
+
+
+@receiver(post_save, sender=Topic)
+def topic_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        _apply(instance.user_id, snapshot(instance))
+
+
+@receiver(pre_delete, sender=Topic)
+def topic_deleted(sender, instance, **kwargs):
+    stored = Topic.objects.filter(pk=instance.pk).only('scenes_unlocked', 'total_score', 'completed').first()
+    if stored is None:
+        return
+    # Deleting the user cascades here too - don't recreate their row
+    _apply(instance.user_id, {field: -value for field, value in snapshot(stored).items()}, create_missing=False)
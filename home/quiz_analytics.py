@@ -0,0 +1,86 @@
+"""
+Quiz history and analytics for WiseOwl
+Every submission is kept as a QuizAttempt with one QuizAnswer per question, so reports are
+grouped SQL over indexed rows instead of Python loops decoding Topic.quiz_scores. Each report
+takes an optional QuizAttempt queryset to narrow it, e.g. to one user or topic.
+"""
+from django.db.models import (
+    Avg, Count, Exists, ExpressionWrapper, F, FloatField, Max, OuterRef, Q, Subquery, Sum,
+)
+from django.db.models.functions import NullIf
+
+from home.models import QuizAnswer, QuizAttempt
+
+
+def record_attempt(topic, scene, answers, passed):
+    """Store a graded submission; call inside the transaction that updates the topic"""
+    questions = scene.quiz_data.get('questions', [])
+    rows = [
+        QuizAnswer(question_index=i, answer=str(answer)[:255], is_correct=answer == questions[i]['correct'])
+        for i, answer in enumerate(answers[:len(questions)])
+    ]
+    attempt = QuizAttempt.objects.create(
+        user_id=topic.user_id,
+        topic=topic,
+        scene_number=scene.scene_number,
+        correct=sum(row.is_correct for row in rows),
+        total=len(questions),
+        passed=passed,
+    )
+    for row in rows:
+        row.attempt = attempt
+    QuizAnswer.objects.bulk_create(rows)
+    return attempt
+
+
+def question_accuracy(attempts=None):
+    """Share of correct answers per question, grouped by topic name, scene and question"""
+    answers = QuizAnswer.objects.all() if attempts is None else QuizAnswer.objects.filter(attempt__in=attempts)
+    return (
+        answers.values('question_index', topic=F('attempt__topic__topic'), scene_number=F('attempt__scene_number'))
+        .annotate(answered=Count('id'), correct=Count('id', filter=Q(is_correct=True)))
+        .annotate(accuracy=_ratio('correct', 'answered'))
+        .order_by('topic', 'scene_number', 'question_index')
+    )
+
+
+def attempts_to_unlock(attempts=None):
+    """Attempts learners needed before first passing each scene, per scene number"""
+    attempts = QuizAttempt.objects.all() if attempts is None else attempts
+    same_quiz = QuizAttempt.objects.filter(
+        user=OuterRef('user'), topic=OuterRef('topic'), scene_number=OuterRef('scene_number')
+    )
+    # Served by the (user, topic, scene_number, created_at) index
+    tries = (
+        same_quiz.filter(created_at__lte=OuterRef('created_at'))
+        .order_by().values('scene_number').annotate(n=Count('id')).values('n')
+    )
+    first_passes = attempts.filter(passed=True).exclude(
+        Exists(same_quiz.filter(passed=True, created_at__lt=OuterRef('created_at')))
+    )
+    return (
+        first_passes.annotate(tries=Subquery(tries))
+        .values('scene_number')
+        .annotate(unlocked=Count('id'), mean_attempts=Avg('tries'), max_attempts=Max('tries'))
+        .order_by('scene_number')
+    )
+
+
+def most_missed_scenes(attempts=None, limit=10):
+    """Scenes with the highest share of wrong answers, grouped by topic name and scene"""
+    attempts = QuizAttempt.objects.all() if attempts is None else attempts
+    return (
+        attempts.values('scene_number', topic_name=F('topic__topic'))
+        .annotate(
+            attempts=Count('id'),
+            failed=Count('id', filter=Q(passed=False)),
+            questions=Sum('total'),
+            missed=Sum(F('total') - F('correct')),
+        )
+        .annotate(miss_rate=_ratio('missed', 'questions'))
+        .order_by(F('miss_rate').desc(nulls_last=True), '-attempts')[:limit]
+    )
+
+
+def _ratio(numerator, denominator):
+    return ExpressionWrapper(F(numerator) * 1.0 / NullIf(F(denominator), 0), output_field=FloatField())
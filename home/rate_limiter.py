@@ -0,0 +1,315 @@
+"""
+Outbound rate limiting for the Groq and Bria APIs
+Each configured limit is a concurrency cap plus a token bucket, shared by every worker process
+on the host through lock files in OUTBOUND_LOCK_DIR (per process only when it is empty or fcntl
+is unavailable). Callers queue by priority: interactive owl chat goes first, background scene
+prefetch last, and RESERVED slots and tokens are kept back for interactive calls so a prefetch
+burst can never take all of them. Configured with OUTBOUND_LIMITS, keyed by endpoint or by
+provider ("groq" covers every groq.* endpoint without a limit of its own):
+
+    OUTBOUND_LIMITS = {
+        'bria.generate': {
+            'CONCURRENCY': 4,     # Calls in flight at once across processes
+            'RATE': 1.0,          # Calls started per second on average (0 for no rate limit)
+            'BURST': 4,           # Calls that may start back to back after a quiet spell
+            'RESERVED': 1,        # Slots and tokens only interactive calls may use
+            'QUEUE_TIMEOUT': 30,  # Seconds to wait for a turn before OutboundQueueTimeout
+        },
+    }
+"""
+import asyncio
+import functools
+import heapq
+import itertools
+import json
+import os
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+
+from home import metrics
+
+try:
+    import fcntl
+except ImportError:  # Windows: limits apply per process
+    fcntl = None
+
+
+PRIORITY_INTERACTIVE = 0  # A learner is waiting on this call, e.g. owl chat
+PRIORITY_DEFAULT = 1
+PRIORITY_BACKGROUND = 2  # Prefetching scenes nobody has unlocked yet
+
+PRIORITY_NAMES = {PRIORITY_INTERACTIVE: 'interactive', PRIORITY_DEFAULT: 'default', PRIORITY_BACKGROUND: 'background'}
+
+# Waiters re-check for capacity freed by other processes this often
+POLL_INTERVAL = 0.05
+
+_priority = ContextVar('outbound_priority', default=PRIORITY_DEFAULT)
+
+
+class OutboundQueueTimeout(Exception):
+    """No slot or token became free within the limit's queue timeout"""
+
+
+@contextmanager
+def priority(level):
+    """Run outbound calls made in this context (e.g. a background job) at the given priority"""
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority():
+    return _priority.get()
+
+
+def prioritized(level):
+    """View decorator: the view's outbound calls run at the given priority"""
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @functools.wraps(view)
+            async def wrapper(*args, **kwargs):
+                with priority(level):
+                    return await view(*args, **kwargs)
+        else:
+            @functools.wraps(view)
+            def wrapper(*args, **kwargs):
+                with priority(level):
+                    return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class OutboundLimiter:
+    """Concurrency slots and a token bucket for one endpoint or provider, with a priority queue"""
+
+    def __init__(self, name, concurrency=4, rate=0.0, burst=1, reserved=0, queue_timeout=30, lock_dir=''):
+        self.name = name
+        self.concurrency = concurrency
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.reserved = min(reserved, concurrency - 1)
+        self.queue_timeout = queue_timeout
+        self.lock_dir = lock_dir if fcntl else ''
+        if self.lock_dir:
+            os.makedirs(self.lock_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._turn = threading.Condition(self._lock)
+        self._waiting = []  # Heap of (priority, ticket)
+        self._tickets = itertools.count()
+        self._in_flight = 0
+        self._held = set()  # Slot indexes taken in this process, when not using lock files
+        self._tokens = float(self.burst)
+        self._refilled = time.monotonic()
+
+    @contextmanager
+    def slot(self, level=None):
+        """Hold a slot for one call, waiting in priority order"""
+        permit = self.acquire(current_priority() if level is None else level)
+        try:
+            yield
+        finally:
+            self.release(permit)
+
+    @asynccontextmanager
+    async def aslot(self, level=None):
+        """slot() for the async client - waits with asyncio.sleep instead of blocking the loop"""
+        permit = await self.aacquire(current_priority() if level is None else level)
+        try:
+            yield
+        finally:
+            self.release(permit)
+
+    def acquire(self, level):
+        started = time.monotonic()
+        entry = self._enqueue(level)
+        with self._turn:
+            while True:
+                if self._waiting[0] == entry:
+                    permit = self._try_take(level)
+                    if permit is not None:
+                        self._granted(entry, started)
+                        return permit
+                remaining = started + self.queue_timeout - time.monotonic()
+                if remaining <= 0:
+                    self._expire(entry, level)
+                self._turn.wait(min(POLL_INTERVAL, remaining))
+
+    async def aacquire(self, level):
+        started = time.monotonic()
+        entry = self._enqueue(level)
+        try:
+            while True:
+                with self._turn:
+                    if self._waiting[0] == entry:
+                        permit = self._try_take(level)
+                        if permit is not None:
+                            self._granted(entry, started)
+                            return permit
+                    if time.monotonic() - started >= self.queue_timeout:
+                        self._expire(entry, level)
+                await asyncio.sleep(POLL_INTERVAL)
+        except asyncio.CancelledError:
+            with self._turn:
+                self._dequeue(entry)
+            raise
+
+    def release(self, permit):
+        with self._turn:
+            self._give_back(permit)
+            self._in_flight -= 1
+            self._publish()
+            self._turn.notify_all()
+
+    def stats(self):
+        with self._lock:
+            waiting = [level for level, _ in self._waiting]
+        return {
+            'in_flight': self._in_flight,
+            'queued': {PRIORITY_NAMES[level]: waiting.count(level) for level in PRIORITY_NAMES},
+            'concurrency': self.concurrency,
+            'rate': self.rate,
+            'shared': bool(self.lock_dir),
+        }
+
+    def _enqueue(self, level):
+        entry = (level, next(self._tickets))
+        with self._turn:
+            heapq.heappush(self._waiting, entry)
+            self._publish()
+        return entry
+
+    def _dequeue(self, entry):
+        self._waiting.remove(entry)
+        heapq.heapify(self._waiting)
+        self._publish()
+        self._turn.notify_all()
+
+    def _granted(self, entry, started):
+        """Called with the lock held once entry got a permit"""
+        self._in_flight += 1
+        self._dequeue(entry)
+        metrics.histogram('outbound_wait_seconds', 'Time Groq/Bria calls queued for a rate limit slot').observe(
+            time.monotonic() - started, limiter=self.name, priority=PRIORITY_NAMES[entry[0]]
+        )
+
+    def _expire(self, entry, level):
+        """Called with the lock held; gives up the entry's place and raises"""
+        self._dequeue(entry)
+        metrics.counter('outbound_queue_timeouts_total', 'Groq/Bria calls that gave up waiting for a slot').inc(
+            limiter=self.name, priority=PRIORITY_NAMES[level]
+        )
+        raise OutboundQueueTimeout(f"{self.name}: no free slot within {self.queue_timeout}s")
+
+    def _try_take(self, level):
+        """A (slot index, lock file) permit if a slot and a token are free for this priority, else None"""
+        reserve = 0 if level == PRIORITY_INTERACTIVE else self.reserved
+        permit = self._take_slot(self.concurrency - reserve)
+        if permit is None:
+            return None
+        if self.rate and not self._take_token(min(reserve, self.burst - 1)):
+            self._give_back(permit)
+            return None
+        return permit
+
+    def _give_back(self, permit):
+        index, handle = permit
+        if handle is not None:
+            fcntl.flock(handle, fcntl.LOCK_UN)
+            handle.close()
+        self._held.discard(index)
+
+    def _take_slot(self, limit):
+        for index in range(limit):
+            if self.lock_dir:
+                handle = open(os.path.join(self.lock_dir, f'{self.name}.{index}.lock'), 'a')
+                try:
+                    fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    handle.close()
+                    continue
+                return index, handle
+            if index not in self._held:
+                self._held.add(index)
+                return index, None
+        return None
+
+    def _take_token(self, reserve):
+        if not self.lock_dir:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._refilled) * self.rate)
+            self._refilled = now
+            if self._tokens < 1 + reserve:
+                return False
+            self._tokens -= 1
+            return True
+
+        # Bucket state lives in a small JSON file so every process draws from the same bucket
+        with open(os.path.join(self.lock_dir, f'{self.name}.bucket'), 'a+') as bucket:
+            fcntl.flock(bucket, fcntl.LOCK_EX)
+            bucket.seek(0)
+            try:
+                state = json.loads(bucket.read())
+            except ValueError:
+                state = {'tokens': self.burst, 'refilled': time.time()}
+            now = time.time()
+            tokens = min(self.burst, state['tokens'] + max(now - state['refilled'], 0) * self.rate)
+            taken = tokens >= 1 + reserve
+            bucket.seek(0)
+            bucket.truncate()
+            bucket.write(json.dumps({'tokens': tokens - 1 if taken else tokens, 'refilled': now}))
+            return taken
+
+    def _publish(self):
+        """Queue depth and in-flight gauges; called with the lock held"""
+        depth = metrics.gauge('outbound_queue_depth', 'Groq/Bria calls waiting for a rate limit slot')
+        for level, name in PRIORITY_NAMES.items():
+            depth.set(sum(1 for waiting, _ in self._waiting if waiting == level), limiter=self.name, priority=name)
+        metrics.gauge('outbound_in_flight', 'Groq/Bria calls holding a rate limit slot in this process').set(
+            self._in_flight, limiter=self.name
+        )
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(endpoint):
+    """The limiter for an endpoint - its own OUTBOUND_LIMITS entry, else its provider's - or None"""
+    limits = getattr(settings, 'OUTBOUND_LIMITS', {})
+    name = endpoint if endpoint in limits else endpoint.split('.', 1)[0]
+    if name not in limits:
+        return None
+    with _limiters_lock:
+        limiter = _limiters.get(name)
+        if limiter is None:
+            options = limits[name]
+            limiter = _limiters[name] = OutboundLimiter(
+                name,
+                concurrency=options.get('CONCURRENCY', 4),
+                rate=options.get('RATE', 0.0),
+                burst=options.get('BURST', 1),
+                reserved=options.get('RESERVED', 0),
+                queue_timeout=options.get('QUEUE_TIMEOUT', getattr(settings, 'OUTBOUND_QUEUE_TIMEOUT', 30)),
+                lock_dir=getattr(settings, 'OUTBOUND_LOCK_DIR', ''),
+            )
+        return limiter
+
+
+def all_limiter_stats():
+    with _limiters_lock:
+        limiters = list(_limiters.values())
+    return {limiter.name: limiter.stats() for limiter in limiters}
+
+
+def reset():
+    """Forget every limiter, e.g. between tests"""
+    with _limiters_lock:
+        _limiters.clear()
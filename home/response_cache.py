@@ -0,0 +1,214 @@
+"""
+Content-addressed response cache for WiseOwl
+Caches deterministic upstream responses (e.g. Bria translate_to_scene) by a hash of the request
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+
+from home import metrics
+from home.models import CachedResponse
+
+
+_requests = metrics.counter('response_cache_requests_total', 'Upstream response cache lookups by result')
+
+
+def make_key(*parts):
+    """Stable sha256 key for any JSON-serialisable request parts"""
+    raw = json.dumps(parts, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+class LRUBackend:
+    """In-process LRU with per-entry expiry"""
+
+    def __init__(self, namespace, max_entries):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class DjangoCacheBackend:
+    """
+    Django cache framework
+    The response cache's MAX_ENTRIES does not apply here: size is bounded by the Django cache's
+    own OPTIONS['MAX_ENTRIES'] (or the server's memory limit for Redis/Memcached), shared with
+    everything else stored in that cache.
+    """
+
+    def __init__(self, namespace, max_entries, alias='default'):
+        self.namespace = namespace
+        self.cache = caches[alias]
+
+    def _key(self, key):
+        return f'response_cache:{self.namespace}:{key}'
+
+    def get(self, key):
+        return self.cache.get(self._key(key))
+
+    def set(self, key, value, ttl):
+        self.cache.set(self._key(key), value, ttl)
+
+    def delete(self, key):
+        self.cache.delete(self._key(key))
+
+    def clear(self):
+        pass  # Entries expire on their own; clearing would wipe unrelated keys
+
+
+class DatabaseBackend:
+    """CachedResponse table, shared by every worker process"""
+
+    def __init__(self, namespace, max_entries):
+        self.namespace = namespace
+        self.max_entries = max_entries
+
+    def get(self, key):
+        entry = CachedResponse.objects.filter(
+            key=key,
+            namespace=self.namespace,
+            expires_at__gt=timezone.now()
+        ).only('value').first()
+        return entry.value if entry else None
+
+    def set(self, key, value, ttl):
+        CachedResponse.objects.update_or_create(
+            key=key,
+            defaults={
+                'namespace': self.namespace,
+                'value': value,
+                'expires_at': timezone.now() + timedelta(seconds=ttl),
+            }
+        )
+        self.prune()
+
+    def delete(self, key):
+        CachedResponse.objects.filter(key=key).delete()
+
+    def clear(self):
+        CachedResponse.objects.filter(namespace=self.namespace).delete()
+
+    def prune(self):
+        """Drop expired entries, then the oldest ones beyond max_entries"""
+        entries = CachedResponse.objects.filter(namespace=self.namespace)
+        entries.filter(expires_at__lte=timezone.now()).delete()
+        overflow = entries.order_by('-created_at').values_list('key', flat=True)[self.max_entries:]
+        stale_keys = list(overflow[:500])
+        if stale_keys:
+            CachedResponse.objects.filter(key__in=stale_keys).delete()
+
+
+BACKENDS = {
+    'lru': LRUBackend,
+    'django': DjangoCacheBackend,
+    'db': DatabaseBackend,
+}
+
+
+class ResponseCache:
+    """Namespaced cache with TTL, size-based eviction and hit/miss counters"""
+
+    def __init__(self, namespace, backend='lru', ttl=86400, max_entries=1000):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.backend = BACKENDS[backend](namespace, max_entries)
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        try:
+            value = self.backend.get(key)
+        except Exception as e:
+            print(f"Response cache {self.namespace} read error: {str(e)}")
+            value = None
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        _requests.inc(namespace=self.namespace, result='miss' if value is None else 'hit')
+        return value
+
+    def set(self, key, value):
+        try:
+            self.backend.set(key, value, self.ttl)
+        except Exception as e:
+            print(f"Response cache {self.namespace} write error: {str(e)}")
+
+    def record_bypass(self):
+        with self._lock:
+            self.bypassed += 1
+        _requests.inc(namespace=self.namespace, result='bypass')
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'bypassed': self.bypassed,
+            'hit_ratio': round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_response_cache(namespace):
+    """Process-wide cache for a namespace, configured by settings.RESPONSE_CACHES"""
+    with _caches_lock:
+        cache = _caches.get(namespace)
+        if cache is None:
+            config = getattr(settings, 'RESPONSE_CACHES', {}).get(namespace, {})
+            cache = ResponseCache(
+                namespace,
+                backend=config.get('BACKEND', 'lru'),
+                ttl=config.get('TTL', 86400),
+                max_entries=config.get('MAX_ENTRIES', 1000),
+            )
+            _caches[namespace] = cache
+        return cache
+
+
+def all_cache_stats():
+    with _caches_lock:
+        return {namespace: cache.stats() for namespace, cache in _caches.items()}
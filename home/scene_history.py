@@ -0,0 +1,115 @@
+"""
+Regeneration history for WiseOwl scenes
+Every regeneration is kept as a SceneVariation, so a learner can page back through earlier
+images and restore one without another Bria call. Each scene keeps its newest
+SCENE_VARIATIONS_KEEP variations, and prune() drops anything older than
+SCENE_VARIATIONS_MAX_AGE days across the table (see the prune_scene_variations command).
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import transaction
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+
+from home.models import SceneVariation
+
+
+# Rows deleted per statement when pruning, to keep locks and the IN list short
+PRUNE_BATCH_SIZE = 1000
+
+
+def snapshot(scene):
+    """What a scene shows now - take it before regenerating over it"""
+    return {'json_scene': scene.json_scene, 'image_url': scene.image_url, 'image_id': scene.image_id}
+
+
+def save_regeneration(scene, original, prompt=''):
+    """Save a regenerated scene and record it as a variation, with the original if this is its first"""
+    with transaction.atomic():
+        scene.save()
+        if (original['image_url'] or original['image_id']) and not scene.variations.exists():
+            # Recorded lazily on first regeneration so the original image can be restored too
+            _create(scene, original, scene.description, created_at=scene.created_at)
+        variation = _create(scene, snapshot(scene), prompt)
+        _trim(scene)
+    return variation
+
+
+def variations_page(scene, page=1, per_page=None):
+    """A Paginator page of the scene's variations, newest first, without the JSON scenes"""
+    per_page = per_page or getattr(settings, 'SCENE_VARIATIONS_PAGE_SIZE', 12)
+    variations = scene.variations.select_related('image').defer('json_scene').order_by('-created_at', '-id')
+    return Paginator(variations, per_page).get_page(page)
+
+
+def restore(scene, variation):
+    """Show an earlier variation again - no API calls, just copies it back onto the scene"""
+    scene.json_scene = variation.json_scene
+    scene.image_url = variation.image_url
+    scene.image_id = variation.image_id
+    scene.save(update_fields=['json_scene', 'image_url', 'image'])
+
+
+def is_current(scene, variation):
+    if scene.image_id or variation.image_id:
+        return scene.image_id == variation.image_id
+    return scene.image_url == variation.image_url
+
+
+def prune(max_age_days=None, keep=None):
+    """
+    Apply the retention policy to every scene
+
+    Returns:
+        int: variations deleted
+    """
+    max_age_days = getattr(settings, 'SCENE_VARIATIONS_MAX_AGE', 90) if max_age_days is None else max_age_days
+    keep = getattr(settings, 'SCENE_VARIATIONS_KEEP', 10) if keep is None else keep
+
+    stale = SceneVariation.objects.filter(created_at__lt=timezone.now() - timedelta(days=max_age_days))
+    deleted = _delete_in_batches(stale.values_list('id', flat=True))
+
+    surplus = (
+        SceneVariation.objects.annotate(newest=Window(
+            RowNumber(), partition_by=[F('scene_id')], order_by=[F('created_at').desc(), F('id').desc()]
+        ))
+        .filter(newest__gt=keep)
+        .values_list('id', flat=True)
+    )
+    return deleted + _delete_in_batches(surplus)
+
+
+def _create(scene, state, prompt, created_at=None):
+    variation = SceneVariation.objects.create(
+        topic_id=scene.topic_id,
+        scene=scene,
+        prompt=prompt or '',
+        json_scene=state['json_scene'] or {},
+        image_url=state['image_url'],
+        image_id=state['image_id'],
+    )
+    if created_at is not None:  # auto_now_add ignores values passed to create()
+        SceneVariation.objects.filter(pk=variation.pk).update(created_at=created_at)
+    return variation
+
+
+def _trim(scene):
+    """Drop the scene's variations beyond the newest SCENE_VARIATIONS_KEEP"""
+    keep = getattr(settings, 'SCENE_VARIATIONS_KEEP', 10)
+    surplus = list(
+        scene.variations.order_by('-created_at', '-id').values_list('id', flat=True)[keep:keep + PRUNE_BATCH_SIZE]
+    )
+    if surplus:
+        SceneVariation.objects.filter(id__in=surplus).delete()
+
+
+def _delete_in_batches(ids):
+    deleted = 0
+    while True:
+        batch = list(ids[:PRUNE_BATCH_SIZE])
+        if not batch:
+            return deleted
+        deleted += SceneVariation.objects.filter(id__in=batch).delete()[0]
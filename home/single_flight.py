@@ -0,0 +1,230 @@
+"""
+Single-flight deduplication of identical Groq and Bria requests
+When two tabs or two learners ask for the same thing at the same moment, only the first call
+(the leader) goes upstream; identical calls made while it is in flight wait for it and share
+its result. Threads in one process wait on the leader directly, other workers find the leader's
+lock in the SINGLE_FLIGHT_CACHE Django cache and poll it for the result - point that alias at a
+cache every worker shares and whose add() is atomic (database, Redis, Memcached; the default
+local memory cache only dedupes within a process). Followers give up waiting after
+SINGLE_FLIGHT_TIMEOUT seconds and make the call themselves.
+"""
+import asyncio
+import copy
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+
+from home import metrics
+from home.response_cache import make_key
+
+
+# Followers in other processes check for the leader's result this often
+POLL_INTERVAL = 0.1
+
+# How long a leader's result stays in the cache for followers that haven't picked it up yet
+RESULT_TTL = 60
+
+_MISSING = object()
+
+_collapsed = metrics.counter('single_flight_collapsed_total', 'Groq/Bria calls that shared an identical in-flight call')
+
+
+class _Flight:
+    """A leader's call in this process, which followers in the same process wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+_flights = {}
+_stats = {}
+_lock = threading.Lock()
+
+
+def do(name, parts, fn):
+    """
+    Return fn(), sharing the result with identical calls already in flight
+
+    Args:
+        name: What is being called, e.g. 'bria.generate' - used in keys and metrics
+        parts: JSON-serialisable parts of the normalized request
+        fn: Makes the upstream call when this caller is the leader
+    """
+    if not _enabled():
+        return fn()
+    key = make_key(name, parts)
+    flight, leader = _join(name, key)
+    if not leader:
+        if flight.done.wait(_timeout()):
+            return _shared(name, flight, 'thread')
+        return fn()  # The leader is stuck; don't wait on it any longer
+
+    try:
+        result = _lead_across_processes(name, key, fn)
+        flight.result = copy.deepcopy(result)  # Untouched by whatever our caller does with it
+        return result
+    except BaseException as e:
+        flight.error = e
+        raise
+    finally:
+        _land(name, key, flight)
+
+
+async def ado(name, parts, fn):
+    """do() for coroutines: fn is an async callable, and waiting never blocks the event loop"""
+    if not _enabled():
+        return await fn()
+    key = make_key(name, parts)
+    flight, leader = _join(name, key)
+    if not leader:
+        deadline = time.monotonic() + _timeout()
+        while not flight.done.is_set():
+            if time.monotonic() >= deadline:
+                return await fn()
+            await asyncio.sleep(POLL_INTERVAL)
+        return _shared(name, flight, 'thread')
+
+    try:
+        result = await _alead_across_processes(name, key, fn)
+        flight.result = copy.deepcopy(result)  # Untouched by whatever our caller does with it
+        return result
+    except BaseException as e:
+        flight.error = e
+        raise
+    finally:
+        _land(name, key, flight)
+
+
+def stats():
+    """Leader calls, collapsed calls and calls in flight per name, for this process"""
+    with _lock:
+        return {name: dict(counts) for name, counts in _stats.items()}
+
+
+def reset():
+    """Forget the counters, e.g. between tests"""
+    with _lock:
+        _stats.clear()
+
+
+def _join(name, key):
+    """(flight, is_leader) - the in-process flight for key, started if there is none"""
+    with _lock:
+        counts = _stats.setdefault(name, {'leaders': 0, 'collapsed': 0, 'in_flight': 0})
+        flight = _flights.get(key)
+        if flight is not None:
+            return flight, False
+        flight = _flights[key] = _Flight()
+        counts['leaders'] += 1
+        counts['in_flight'] += 1
+        return flight, True
+
+
+def _land(name, key, flight):
+    with _lock:
+        _flights.pop(key, None)
+        if name in _stats:
+            _stats[name]['in_flight'] -= 1
+    flight.done.set()
+
+
+def _shared(name, flight, scope):
+    """A follower's copy of the leader's result, or the leader's exception"""
+    if flight.error is not None:
+        raise flight.error
+    _count(name, scope)
+    return copy.deepcopy(flight.result)
+
+
+def _count(name, scope):
+    _collapsed.inc(name=name, scope=scope)
+    with _lock:
+        _stats.setdefault(name, {'leaders': 0, 'collapsed': 0, 'in_flight': 0})['collapsed'] += 1
+
+
+def _lead_across_processes(name, key, fn):
+    """Run fn under the shared cache lock, or pick up the result of the worker holding it"""
+    cache = _cache()
+    lock_key = f'single_flight:{key}'
+    token = uuid.uuid4().hex
+    deadline = time.monotonic() + _timeout()
+    while True:
+        if cache.add(lock_key, token, timeout=_timeout()):
+            try:
+                result = fn()
+                _publish(cache, f'{lock_key}:{token}', result)
+                return result
+            finally:
+                cache.delete(lock_key)
+
+        leader = cache.get(lock_key)
+        while leader is not None and time.monotonic() < deadline:
+            time.sleep(POLL_INTERVAL)
+            holder = cache.get(lock_key)  # Read before the result: leaders publish it before unlocking
+            result = cache.get(f'{lock_key}:{leader}', _MISSING)
+            if result is not _MISSING:
+                _count(name, 'process')
+                return result
+            if holder != leader:
+                break  # The other worker finished without a result (e.g. it raised) or its lock expired
+        if time.monotonic() >= deadline:
+            return fn()
+
+
+async def _alead_across_processes(name, key, fn):
+    cache = _cache()
+    lock_key = f'single_flight:{key}'
+    token = uuid.uuid4().hex
+    deadline = time.monotonic() + _timeout()
+    while True:
+        if await cache.aadd(lock_key, token, timeout=_timeout()):
+            try:
+                result = await fn()
+                await _apublish(cache, f'{lock_key}:{token}', result)
+                return result
+            finally:
+                await cache.adelete(lock_key)
+
+        leader = await cache.aget(lock_key)
+        while leader is not None and time.monotonic() < deadline:
+            await asyncio.sleep(POLL_INTERVAL)
+            holder = await cache.aget(lock_key)
+            result = await cache.aget(f'{lock_key}:{leader}', _MISSING)
+            if result is not _MISSING:
+                _count(name, 'process')
+                return result
+            if holder != leader:
+                break
+        if time.monotonic() >= deadline:
+            return await fn()
+
+
+def _publish(cache, result_key, result):
+    try:
+        cache.set(result_key, result, timeout=RESULT_TTL)
+    except Exception as e:  # Unpicklable results just aren't shared with other workers
+        print(f"Single-flight result not shared: {str(e)}")
+
+
+async def _apublish(cache, result_key, result):
+    try:
+        await cache.aset(result_key, result, timeout=RESULT_TTL)
+    except Exception as e:
+        print(f"Single-flight result not shared: {str(e)}")
+
+
+def _cache():
+    return caches[getattr(settings, 'SINGLE_FLIGHT_CACHE', 'default')]
+
+
+def _enabled():
+    return getattr(settings, 'SINGLE_FLIGHT_ENABLED', True)
+
+
+def _timeout():
+    return getattr(settings, 'SINGLE_FLIGHT_TIMEOUT', 150)
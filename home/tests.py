@@ -1,3 +1,1197 @@
-from django.test import TestCase
+import base64
+import io
+import json
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from unittest import mock, skipIf
 
-# Create your tests here.
+import requests
+from PIL import Image
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connection, connections
+from django.db.utils import OperationalError
+from django.test import AsyncRequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from fibo.db.pool import ConnectionPool
+from fibo.db.sqlite3.base import DatabaseWrapper as PooledSQLiteWrapper
+from fibo.middleware import SessionRefreshMiddleware
+from home import async_views, benchmark, circuit_breaker, image_store, jobs, llm_json, metrics, progress, quiz_analytics, rate_limiter, scene_history, single_flight, throttling, topic_cache, views
+from home.bria_service import BriaFIBOService
+from home.groq_service import GroqAIService
+from home.http_client import PooledHTTPClient
+from home.models import GenerationJob, QuizAttempt, Scene, SceneVariation, StoredImage, Topic, TopicContent, User, UserProgress
+from home.response_cache import ResponseCache, make_key
+
+
+class HomeDashboardTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='learner', password='pw')
+        self.client.force_login(self.user)
+
+    def make_topics(self, count, **kwargs):
+        Topic.objects.bulk_create([
+            Topic(user=self.user, topic=f'Topic {i}', scenes_data={'scenes': []}, **kwargs)
+            for i in range(count)
+        ])
+
+    def test_stats_are_aggregated(self):
+        self.make_topics(2, scenes_unlocked=[1, 2], total_score=30)
+        self.make_topics(1, scenes_unlocked=[1, 2, 3], total_score=60, completed=True)
+        Topic.objects.create(user=User.objects.create_user(username='other'), topic='Other', total_score=99)
+
+        response = self.client.get(reverse('home:home'))
+
+        stats = response.context['stats']
+        self.assertEqual(
+            (stats.total_topics, stats.total_scenes, stats.total_score, stats.completed),
+            (3, 7, 120, 1),
+        )
+
+    def test_server_timing_header(self):
+        response = self.client.get(reverse('home:home'))
+
+        entries = dict(entry.split(';', 1) for entry in response['Server-Timing'].split(', '))
+        self.assertEqual(set(entries), {'db', 'upstream', 'tpl', 'total'})
+        self.assertNotIn('desc="0 queries"', entries['db'])
+        self.assertIn('desc="1 templates"', entries['tpl'])
+
+    def dashboard_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('home:home'))
+        return [query['sql'] for query in queries]
+
+    def test_query_count_does_not_grow_with_history(self):
+        self.make_topics(1)
+        self.dashboard_queries()  # First visit builds the UserProgress row
+        small = self.dashboard_queries()
+
+        self.make_topics(20)
+        large = self.dashboard_queries()
+
+        self.assertEqual(len(small), len(large))
+        topic_queries = [sql for sql in large if 'home_topic' in sql]
+        self.assertEqual(len(topic_queries), 1)  # Recent topics; totals come from UserProgress
+
+    def test_recent_topics_skip_json_columns(self):
+        self.make_topics(1)
+        response = self.client.get(reverse('home:home'))
+        deferred = response.context['recent_topics'][0].get_deferred_fields()
+        self.assertEqual(deferred, {'scenes_data', 'quiz_scores'})
+
+
+class JourneyViewTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='learner', password='pw')
+        self.client.force_login(self.user)
+        self.topic = Topic.objects.create(user=self.user, topic='Rome', scenes_unlocked=[1])
+
+    def scene(self, status, **kwargs):
+        return Scene.objects.create(
+            topic=self.topic, scene_number=1, title='Forum', description='', narration='',
+            generation_status=status, **kwargs
+        )
+
+    def test_background_prefetch_is_not_polled_for_a_ready_scene(self):
+        self.scene(Scene.STATUS_COMPLETED, image_url='https://example.com/1.png', quiz_data={'questions': []})
+        GenerationJob.objects.create(topic=self.topic, kind=GenerationJob.KIND_SCENE, scene_number=2)
+
+        response = self.client.get(reverse('home:journey', args=[self.topic.id]))
+
+        self.assertIsNone(response.context['active_job'])
+        self.assertNotContains(response, 'function pollJob')
+
+    def test_polls_the_job_building_the_scene_on_screen(self):
+        self.scene(Scene.STATUS_GENERATING)
+        GenerationJob.objects.create(topic=self.topic, kind=GenerationJob.KIND_SCENE, scene_number=2)
+        own = GenerationJob.objects.create(topic=self.topic, kind=GenerationJob.KIND_SCENE, scene_number=1)
+
+        response = self.client.get(reverse('home:journey', args=[self.topic.id]))
+
+        self.assertEqual(response.context['active_job'], own)
+
+    def test_quiz_waits_for_the_scene_to_be_ready(self):
+        scene = self.scene(Scene.STATUS_PENDING)
+        quiz = reverse('home:quiz', args=[self.topic.id, 1])
+
+        self.assertNotContains(self.client.get(reverse('home:journey', args=[self.topic.id])), 'Take Quiz')
+        self.assertRedirects(self.client.get(quiz), reverse('home:journey', args=[self.topic.id]))
+
+        Scene.objects.filter(pk=scene.pk).update(
+            generation_status=Scene.STATUS_COMPLETED, quiz_data={'questions': [{'question': 'Q?', 'options': ['A'], 'correct': 'A'}]}
+        )
+        self.assertContains(self.client.get(reverse('home:journey', args=[self.topic.id])), 'Take Quiz')
+        self.assertEqual(self.client.get(quiz).status_code, 200)
+
+    def test_try_again_requeues_a_failed_scene_and_its_quiz(self):
+        self.topic.scenes_data = {'scenes': [{'title': 'Forum', 'description': '', 'narration': ''}]}
+        self.topic.save()
+        self.scene(Scene.STATUS_FAILED)  # build_scene failed before the quiz was made
+        journey = reverse('home:journey', args=[self.topic.id])
+
+        page = self.client.get(journey)
+        self.assertContains(page, 'onclick="retryGeneration()"')
+        self.assertNotContains(page, 'onclick="generateDemoImage()"')
+        self.assertNotContains(page, 'quiz are ready')
+
+        self.client.post(reverse('home:retry_generation', args=[self.topic.id]))
+
+        job = GenerationJob.objects.get(topic=self.topic)
+        self.assertEqual((job.kind, job.scene_number), (GenerationJob.KIND_SCENE, 1))
+        self.assertEqual(self.client.get(journey).context['active_job'], job)
+
+    def test_failed_and_cancelled_journeys_get_their_own_message(self):
+        job = GenerationJob.objects.create(topic=self.topic, status=GenerationJob.STATUS_FAILED)
+        self.assertContains(self.client.get(reverse('home:journey', args=[self.topic.id])), 'Generation failed')
+
+        GenerationJob.objects.filter(pk=job.pk).update(status=GenerationJob.STATUS_CANCELLED)
+        self.assertContains(self.client.get(reverse('home:journey', args=[self.topic.id])), 'was cancelled')
+
+
+class GenerationJobTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='learner', password='pw')
+        self.topic = Topic.objects.create(user=self.user, topic='Rome', scenes_unlocked=[1])
+
+    def test_enqueue_reuses_the_active_job(self):
+        job = jobs.enqueue_journey(self.topic)
+        self.assertEqual(jobs.enqueue_journey(self.topic), job)
+
+        GenerationJob.objects.filter(pk=job.pk).update(status=GenerationJob.STATUS_COMPLETED)
+        self.assertNotEqual(jobs.enqueue_journey(self.topic), job)
+
+    def test_a_job_is_claimed_once_oldest_first(self):
+        first = jobs.enqueue_journey(self.topic)
+        second = jobs.enqueue_scene(self.topic, 2)
+
+        claimed = jobs.claim_next_job()
+        self.assertEqual(claimed, first)
+        self.assertEqual((claimed.status, claimed.attempts), (GenerationJob.STATUS_RUNNING, 1))
+        self.assertIsNone(jobs.claim_job(first.pk))
+        self.assertEqual(jobs.claim_next_job(), second)
+        self.assertIsNone(jobs.claim_next_job())
+
+    @mock.patch('home.topic_cache.scenes_for', side_effect=AssertionError('remote call'))
+    def test_cancelled_job_stops_before_its_next_step(self, scenes_for):
+        job = jobs.claim_job(jobs.enqueue_journey(self.topic).pk)
+        self.assertEqual(jobs.cancel_topic_jobs(self.topic), 1)
+
+        jobs.run_job(job)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, GenerationJob.STATUS_CANCELLED)
+        self.assertEqual(job.error, '')
+        scenes_for.assert_not_called()
+
+    @mock.patch('home.topic_cache.scenes_for', side_effect=RuntimeError('Groq is down'))
+    def test_failed_job_records_the_error_and_can_be_retried(self, scenes_for):
+        job = jobs.run_job(jobs.claim_job(jobs.enqueue_journey(self.topic).pk))
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.error, job.stage), (GenerationJob.STATUS_FAILED, 'Groq is down', 'scenes'))
+        retry = jobs.enqueue_journey(self.topic)
+        self.assertNotEqual(retry, job)
+        self.assertEqual(retry.status, GenerationJob.STATUS_QUEUED)
+
+    def test_stale_running_jobs_are_requeued_and_claimed_again(self):
+        job = jobs.claim_job(jobs.enqueue_journey(self.topic).pk)
+        GenerationJob.objects.filter(pk=job.pk).update(stage='scenes', started_at=timezone.now() - timedelta(hours=1))
+        fresh = jobs.claim_job(jobs.enqueue_scene(self.topic, 2).pk)
+
+        self.assertEqual(jobs.requeue_stale_jobs(600), 1)
+
+        fresh.refresh_from_db()
+        self.assertEqual(fresh.status, GenerationJob.STATUS_RUNNING)
+        retried = jobs.claim_next_job()
+        self.assertEqual((retried, retried.attempts, retried.stage), (job, 2, ''))
+
+
+@mock.patch('home.jobs.build_scene')
+class ScenePrefetchTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='learner', password='pw')
+        scenes = [
+            {'title': f'Scene {number}', 'description': f'View {number}', 'narration': '', 'quiz': {'questions': []}}
+            for number in (1, 2, 3)
+        ]
+        self.topic = Topic.objects.create(user=self.user, topic='Rome', scenes_data={'scenes': scenes}, scenes_unlocked=[1])
+
+    def run_journey(self):
+        jobs.run_job(jobs.claim_job(jobs.enqueue_journey(self.topic).pk))
+
+    def queued_scenes(self):
+        return sorted(self.topic.jobs.filter(kind=GenerationJob.KIND_SCENE).values_list('scene_number', flat=True))
+
+    @override_settings(SCENE_PREFETCH_MODE='eager')
+    @mock.patch('home.jobs.connection')  # The pool threads share the test's connection
+    def test_eager_builds_every_scene_with_the_journey(self, connection, build_scene):
+        journey = jobs.enqueue_journey(self.topic)
+        self.assertIsNone(jobs.ensure_scene(self.topic, 2))  # The journey job builds it
+
+        jobs.run_job(jobs.claim_job(journey.pk))
+
+        self.assertEqual(sorted(call.args[1] for call in build_scene.call_args_list), [1, 2, 3])
+        self.assertEqual(self.queued_scenes(), [])
+        self.assertEqual(self.topic.scenes.count(), 3)
+
+    @override_settings(SCENE_PREFETCH_MODE='speculative')
+    def test_speculative_builds_scene_one_and_queues_the_rest(self, build_scene):
+        self.run_journey()
+
+        self.assertEqual([call.args[1] for call in build_scene.call_args_list], [1])
+        self.assertEqual(self.queued_scenes(), [2, 3])
+        self.assertEqual(self.topic.scenes.count(), 3)
+
+    @override_settings(SCENE_PREFETCH_MODE='lazy')
+    def test_lazy_waits_for_the_quiz_to_unlock_a_scene(self, build_scene):
+        self.run_journey()
+
+        self.assertEqual([call.args[1] for call in build_scene.call_args_list], [1])
+        self.assertEqual(self.queued_scenes(), [])
+        self.assertFalse(self.topic.scenes.filter(scene_number=2).exists())
+
+        job = jobs.ensure_scene(self.topic, 2)
+        self.assertEqual(self.queued_scenes(), [2])
+        self.assertEqual(jobs.ensure_scene(self.topic, 2), job)
+
+    @mock.patch('home.topic_cache.scenes_for')
+    def test_cancelling_while_the_scenes_are_written_queues_nothing(self, scenes_for, build_scene):
+        scenes_data = self.topic.scenes_data
+        Topic.objects.filter(pk=self.topic.pk).update(scenes_data=None)
+        self.topic.refresh_from_db()
+
+        def abandon(*args):
+            jobs.cancel_topic_jobs(self.topic)
+            return scenes_data
+        scenes_for.side_effect = abandon
+        self.run_journey()
+
+        self.assertEqual(list(self.topic.jobs.values_list('kind', 'status')),
+                         [(GenerationJob.KIND_JOURNEY, GenerationJob.STATUS_CANCELLED)])
+        self.assertFalse(self.topic.scenes.exists())
+        build_scene.assert_not_called()
+        self.assertIsNone(jobs.enqueue_scene(self.topic, 2))
+
+    def test_try_again_restarts_a_cancelled_journey(self, build_scene):
+        self.client.force_login(self.user)
+        jobs.enqueue_journey(self.topic)
+        jobs.cancel_topic_jobs(self.topic)
+        Topic.objects.filter(pk=self.topic.pk).update(current_scene=2)
+
+        response = self.client.post(reverse('home:retry_generation', args=[self.topic.id]))
+
+        scene_job = self.topic.jobs.get(kind=GenerationJob.KIND_SCENE)
+        self.assertEqual(response.json()['job_id'], scene_job.pk)
+        self.assertEqual(scene_job.scene_number, 2)
+        self.assertEqual(list(self.topic.jobs.filter(kind=GenerationJob.KIND_JOURNEY).values_list('status', flat=True)),
+                         [GenerationJob.STATUS_CANCELLED, GenerationJob.STATUS_QUEUED])
+
+
+class SessionRefreshTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user(username='learner', password='pw'))
+        self.client.get(reverse('home:home'))  # Stamps the session once
+
+    def session_writes(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('home:home'))
+        writes = [
+            query['sql'] for query in queries.captured_queries
+            if 'django_session' in query['sql'] and query['sql'].startswith(('INSERT', 'UPDATE'))
+        ]
+        return writes, response
+
+    def test_page_views_do_not_write_the_session(self):
+        for _ in range(3):
+            writes, response = self.session_writes()
+            self.assertEqual(writes, [])
+            self.assertNotIn(settings.SESSION_COOKIE_NAME, response.cookies)
+
+    def test_session_is_refreshed_near_expiry(self):
+        session = self.client.session
+        session[SessionRefreshMiddleware.KEY] = int(time.time()) - settings.SESSION_COOKIE_AGE + 60
+        session.save()
+
+        writes, response = self.session_writes()
+
+        self.assertEqual(len(writes), 1)
+        self.assertIn(settings.SESSION_COOKIE_NAME, response.cookies)
+        self.assertEqual(self.session_writes()[0], [])
+
+
+class UserProgressTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='learner', password='pw')
+        self.client.force_login(self.user)
+
+    def totals(self):
+        row = UserProgress.objects.get(pk=self.user.pk)
+        return row.total_topics, row.total_scenes, row.total_score, row.completed
+
+    def test_tracks_topic_create_quiz_and_delete(self):
+        topic = Topic.objects.create(user=self.user, topic='Rome', scenes_unlocked=[1])
+        self.assertEqual(self.totals(), (1, 1, 0, 0))
+
+        Scene.objects.create(
+            topic=topic, scene_number=1, title='Forum', description='', narration='',
+            quiz_data={'questions': [{'correct': 'A'}, {'correct': 'B'}]},
+        )
+        self.client.post(
+            reverse('home:submit_quiz', args=[topic.id, 1]),
+            '{"answers": ["A", "C"]}', content_type='application/json',
+        )
+        self.assertEqual(self.totals(), (1, 2, 10, 0))
+
+        topic.delete()
+        self.assertEqual(self.totals(), (0, 0, 0, 0))
+
+    def test_resubmitting_quiz_keeps_best_score(self):
+        topic = Topic.objects.create(user=self.user, topic='Rome', scenes_unlocked=[1])
+        Scene.objects.create(
+            topic=topic, scene_number=1, title='Forum', description='', narration='',
+            quiz_data={'questions': [{'correct': 'A'}, {'correct': 'B'}]},
+        )
+        url = reverse('home:submit_quiz', args=[topic.id, 1])
+        for answers in ('["A", "B"]', '["A", "B"]', '["A", "C"]'):
+            self.client.post(url, f'{{"answers": {answers}}}', content_type='application/json')
+
+        topic.refresh_from_db()
+        self.assertEqual(topic.total_score, 20)
+        self.assertEqual(topic.quiz_scores, {'scene_1': 2})
+        self.assertEqual(topic.scenes_unlocked, [1, 2])
+        self.assertEqual(self.totals(), (1, 2, 20, 0))
+
+    def test_improving_a_quiz_score_adds_only_the_difference(self):
+        topic = Topic.objects.create(user=self.user, topic='Rome', scenes_unlocked=[1])
+        Scene.objects.create(
+            topic=topic, scene_number=1, title='Forum', description='', narration='',
+            quiz_data={'questions': [{'correct': 'A'}, {'correct': 'B'}]},
+        )
+        url = reverse('home:submit_quiz', args=[topic.id, 1])
+        self.client.post(url, '{"answers": ["A", "C"]}', content_type='application/json')
+        self.client.post(url, '{"answers": ["A", "B"]}', content_type='application/json')
+
+        topic.refresh_from_db()
+        self.assertEqual(topic.total_score, 20)
+        self.assertEqual(topic.quiz_scores, {'scene_1': 2})
+        self.assertEqual(self.totals(), (1, 2, 20, 0))
+
+    def test_quiz_attempts_feed_analytics(self):
+        topic = Topic.objects.create(user=self.user, topic='Rome', scenes_unlocked=[1])
+        Scene.objects.create(
+            topic=topic, scene_number=1, title='Forum', description='', narration='',
+            quiz_data={'questions': [{'correct': 'A'}, {'correct': 'B'}]},
+        )
+        url = reverse('home:submit_quiz', args=[topic.id, 1])
+        for answers in ('["C", "C"]', '["C", "C"]', '["A", "C"]', '["A", "B"]'):
+            self.client.post(url, f'{{"answers": {answers}}}', content_type='application/json')
+
+        self.assertEqual(QuizAttempt.objects.filter(topic=topic).count(), 4)
+        accuracy = list(quiz_analytics.question_accuracy())
+        self.assertEqual([(row['question_index'], row['answered'], row['correct']) for row in accuracy],
+                         [(0, 4, 2), (1, 4, 1)])
+        unlock = list(quiz_analytics.attempts_to_unlock())
+        self.assertEqual([(row['scene_number'], row['unlocked'], row['max_attempts']) for row in unlock], [(1, 1, 3)])
+        missed = quiz_analytics.most_missed_scenes()[0]
+        self.assertEqual((missed['topic_name'], missed['attempts'], missed['failed']), ('Rome', 4, 2))
+        self.assertAlmostEqual(missed['miss_rate'], 5 / 8)
+
+    def test_rebuild_command_repairs_drift(self):
+        Topic.objects.create(user=self.user, topic='Rome', scenes_unlocked=[1, 2], total_score=20)
+        UserProgress.objects.filter(pk=self.user.pk).update(total_score=999)
+        empty = User.objects.create_user(username='newcomer')
+
+        call_command('rebuild_user_progress', stdout=io.StringIO())
+
+        self.assertEqual(self.totals(), (1, 2, 20, 0))
+        self.assertEqual(UserProgress.objects.get(pk=empty.pk).total_topics, 0)
+
+    def test_missing_row_is_built_on_first_read(self):
+        Topic.objects.bulk_create([Topic(user=self.user, topic='Rome', total_score=10)])
+        self.assertEqual(progress.get_progress(self.user).total_score, 10)
+
+
+class ConcurrentQuizTests(TransactionTestCase):
+    def setUp(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest('threads need a file-backed test database to lock each other out')
+        self.user = User.objects.create_user(username='learner', password='pw')
+        self.topic = Topic.objects.create(user=self.user, topic='Rome', scenes_unlocked=[1])
+        self.scene = Scene.objects.create(
+            topic=self.topic, scene_number=1, title='Forum', description='', narration='',
+            quiz_data={'questions': [{'correct': 'A'}, {'correct': 'B'}]},
+        )
+
+    def test_parallel_submissions_credit_the_scene_once(self):
+        start = threading.Barrier(2)
+        errors = []
+
+        def submit():
+            try:
+                start.wait()
+                views._grade_quiz(self.topic.id, self.user, self.scene, ['A', 'B'])
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=submit) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.topic.refresh_from_db()
+        self.assertEqual(self.topic.total_score, 20)
+        self.assertEqual(self.topic.quiz_scores, {'scene_1': 2})
+        self.assertEqual(self.topic.scenes_unlocked, [1, 2])
+        self.assertEqual(QuizAttempt.objects.filter(topic=self.topic).count(), 2)
+        self.assertEqual(UserProgress.objects.get(pk=self.user.pk).total_score, 20)
+
+
+@override_settings(THROTTLE_ENABLED=True, THROTTLE_RATES={'owl_chat': ['2/minute'], 'test': ['2/minute', '3/hour']})
+class ThrottlingTests(TestCase):
+    def setUp(self):
+        caches['default'].clear()
+
+    def test_sliding_window_blends_the_previous_window(self):
+        self.assertIsNone(throttling.check('test', 'learner', now=3600))
+        self.assertIsNone(throttling.check('test', 'learner', now=3600))
+        self.assertEqual(throttling.check('test', 'learner', now=3600), 90)
+
+        self.assertEqual(throttling.check('test', 'learner', now=3660 + 15), 15)  # 2 x 75% of the last minute
+        self.assertIsNone(throttling.check('test', 'learner', now=3660 + 30))
+        self.assertGreater(throttling.check('test', 'learner', now=3660 + 59), 3600)  # The hourly rule now
+        self.assertIsNone(throttling.check('test', 'someone-else', now=3660 + 59))
+
+    @mock.patch('home.http_client.PooledHTTPClient.request', side_effect=OSError('offline'))
+    def test_over_limit_requests_get_429_with_retry_after(self, request):
+        user = User.objects.create_user(username='chatty', password='pw')
+        self.client.force_login(user)
+
+        statuses = [
+            self.client.post(reverse('home:owl_chat'), '{"message": "Hi"}', content_type='application/json')
+            for _ in range(3)
+        ]
+
+        self.assertEqual([response.status_code for response in statuses], [200, 200, 429])
+        self.assertGreater(int(statuses[2]['Retry-After']), 0)
+        self.assertEqual(statuses[2].json()['retry_after'], int(statuses[2]['Retry-After']))
+
+
+@override_settings(THROTTLE_ENABLED=False, SCENE_VARIATIONS_KEEP=2)
+class SceneVariationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='learner', password='pw')
+        self.client.force_login(self.user)
+        self.topic = Topic.objects.create(user=self.user, topic='Rome')
+        self.scene = Scene.objects.create(
+            topic=self.topic, scene_number=1, title='Forum', description='The Forum', narration='',
+            json_scene={'v': 0}, image_url='https://example.com/0.png',
+        )
+
+    @mock.patch('home.image_store.ingest_url', side_effect=AssertionError('downloaded in the request'))
+    @mock.patch('home.views.BriaFIBOService.generate_image')
+    def test_regenerations_are_kept_and_restored_without_api_calls(self, generate_image, ingest_url):
+        regenerate = reverse('home:regenerate_scene', args=[self.topic.id, 1])
+        for version in (1, 2):
+            generate_image.return_value = {'status': 'success', 'image_url': f'https://example.com/{version}.png'}
+            self.client.post(regenerate, f'{{"json_scene": {{"v": {version}}}}}', content_type='application/json')
+
+        page = self.client.get(reverse('home:scene_variations', args=[self.topic.id, 1])).json()
+        self.assertEqual(page['count'], 2)  # The original was trimmed by SCENE_VARIATIONS_KEEP
+        self.assertEqual([v['image_url'] for v in page['variations']],
+                         ['https://example.com/2.png', 'https://example.com/1.png'])
+        self.assertEqual([v['current'] for v in page['variations']], [True, False])
+
+        restored = self.client.post(reverse('home:restore_variation', args=[self.topic.id, 1, page['variations'][1]['id']]))
+
+        self.assertEqual(restored.json()['json_scene'], {'v': 1})
+        self.scene.refresh_from_db()
+        self.assertEqual(self.scene.image_url, 'https://example.com/1.png')
+        self.assertEqual(generate_image.call_count, 2)
+        self.assertEqual(list(self.topic.jobs.values_list('kind', 'scene_number', 'status')),
+                         [(GenerationJob.KIND_IMAGES, 1, GenerationJob.STATUS_QUEUED)])
+
+    def test_images_job_downloads_every_missing_image_of_the_scene(self):
+        for version in (1, 2):
+            original = scene_history.snapshot(self.scene)
+            self.scene.image_url = f'https://example.com/{version}.png'
+            scene_history.save_regeneration(self.scene, original)
+        job = jobs.enqueue_images(self.topic, 1)
+        self.assertEqual(jobs.enqueue_images(self.topic, 1), job)
+        images = {
+            f'https://example.com/{version}.png': StoredImage(digest=str(version) * 64, path=f'{version}.png',
+                                                             content_type='image/png', size=1)
+            for version in (1, 2)  # The original was trimmed by SCENE_VARIATIONS_KEEP
+        }
+        StoredImage.objects.bulk_create(images.values())
+
+        with mock.patch('home.image_store.ingest_url', side_effect=images.get) as ingest_url:
+            jobs.run_job(jobs.claim_job(job.pk))
+
+        self.assertEqual(sorted(call.args[0] for call in ingest_url.call_args_list), sorted(images))
+        self.scene.refresh_from_db()
+        self.assertEqual(self.scene.image_id, '2' * 64)
+        self.assertEqual(sorted(self.scene.variations.values_list('image_url', 'image_id')),
+                         [(url, image.digest) for url, image in sorted(images.items())])
+        job.refresh_from_db()
+        self.assertEqual(job.status, GenerationJob.STATUS_COMPLETED)
+
+    @override_settings(SCENE_VARIATIONS_KEEP=3)
+    def test_prune_applies_age_and_per_scene_limits(self):
+        for version in range(1, 5):
+            original = scene_history.snapshot(self.scene)
+            self.scene.image_url = f'https://example.com/{version}.png'
+            scene_history.save_regeneration(self.scene, original)
+        SceneVariation.objects.filter(image_url='https://example.com/4.png').update(
+            created_at=timezone.now() - timedelta(days=365)
+        )
+
+        self.assertEqual(scene_history.prune(max_age_days=90, keep=1), 2)
+        self.assertEqual(list(SceneVariation.objects.values_list('image_url', flat=True)), ['https://example.com/3.png'])
+
+
+class DemoJourneyTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='learner', password='pw')
+        self.client.force_login(self.user)
+
+    def test_bundled_demos_are_listed(self):
+        response = self.client.get(reverse('home:home'))
+        self.assertContains(response, reverse('home:demo_journey', args=['ancient-rome']))
+
+    @mock.patch('home.http_client.PooledHTTPClient.request', side_effect=AssertionError('remote call'))
+    def test_demo_is_cloned_without_remote_calls(self, request):
+        response = self.client.get(reverse('home:demo_journey', args=['amazon-rainforest']))
+
+        topic = Topic.objects.get(user=self.user)
+        self.assertRedirects(response, reverse('home:journey', args=[topic.id]), fetch_redirect_response=False)
+        self.assertEqual(topic.scenes_unlocked, [1, 2, 3])
+        scenes = list(topic.scenes.order_by('scene_number'))
+        self.assertEqual(len(scenes), 3)
+        self.assertTrue(all(scene.quiz_data['questions'] for scene in scenes))
+        request.assert_not_called()
+
+        # A second visit reuses the existing topic
+        self.client.get(reverse('home:demo_journey', args=['amazon-rainforest']))
+        self.assertEqual(Topic.objects.filter(user=self.user).count(), 1)
+
+
+class LLMJSONTests(SimpleTestCase):
+    def test_extracts_json_after_stray_braces_and_fences(self):
+        content = 'Use {braces} carefully.\n```json\n{"scenes": [{"title": "A",},]}\n```'
+        self.assertEqual(llm_json.extract_json(content), {'scenes': [{'title': 'A'}]})
+
+    def test_closes_truncated_output(self):
+        self.assertEqual(
+            llm_json.extract_json('{"questions": [{"question": "Why?", "options": ["a", "b'),
+            {'questions': [{'question': 'Why?', 'options': ['a', 'b']}]},
+        )
+        self.assertIsNone(llm_json.extract_json('no json here'))
+
+    def test_scanner_finds_objects_across_chunks(self):
+        scanner = llm_json.JSONScanner()
+        self.assertEqual(scanner.feed('data {"a": "}'), [])
+        self.assertEqual(scanner.feed('{"} {"b": 1}'), ['{"a": "}{"}', '{"b": 1}'])
+
+    def test_quiz_normalisation_and_validation(self):
+        quiz = llm_json.normalize_quiz([
+            {'question': 'Q1', 'options': ['A) x', 'B) y'], 'correct': 'B'},
+            {'question': 'Q2', 'options': ['A) x'], 'correct': 3},
+        ])
+        self.assertEqual(llm_json.valid_questions(quiz), [
+            {'question': 'Q1', 'options': ['A) x', 'B) y'], 'correct': 1},
+        ])
+
+    def test_repairs_are_counted(self):
+        repairs = metrics.counter('llm_json_repairs_total')
+        before = repairs.snapshot().get('kind=test,repair=trailing_comma', 0)
+        llm_json.extract_json('{"a": 1,}', 'test')
+        self.assertEqual(repairs.snapshot()['kind=test,repair=trailing_comma'], before + 1)
+
+
+class BenchmarkTests(SimpleTestCase):
+    def test_fake_upstream_serves_a_valid_journey(self):
+        upstream = benchmark.FakeUpstream(groq_latency=0, bria_latency=0, image_width=64).start()
+        self.addCleanup(upstream.stop)
+
+        with override_settings(**upstream.settings_overrides()):
+            scenes_data = GroqAIService().generate_journey('Ancient Rome')
+
+        self.assertEqual([scene['title'] for scene in scenes_data['scenes']],
+                         ['Benchmark Scene 1', 'Benchmark Scene 2', 'Benchmark Scene 3'])
+        self.assertTrue(all(len(scene['quiz']['questions']) == 2 for scene in scenes_data['scenes']))
+        self.assertEqual(upstream.stats()['requests'], {'/groq/chat/completions': 1})
+
+    def test_percentile_is_nearest_rank(self):
+        values = list(range(1, 101))
+        self.assertEqual(
+            [benchmark.percentile(values, p) for p in (50, 95, 99, 100)],
+            [50, 95, 99, 100],
+        )
+        self.assertIsNone(benchmark.percentile([], 50))
+
+
+@override_settings(DB_RELEASE_DURING_UPSTREAM=False)
+@mock.patch('home.http_client.random.uniform', side_effect=lambda low, high: high)  # Jitter at its ceiling
+@mock.patch('home.http_client.time.sleep')
+class HTTPClientTests(SimpleTestCase):
+    url = 'https://upstream.test/v1'
+
+    def setUp(self):
+        self.http = PooledHTTPClient(max_attempts=3, backoff_base=0.5, backoff_max=8, circuit_breaker=False)
+        self.addCleanup(self.http.close)
+
+    def ok(self):
+        response = requests.Response()
+        response.status_code, response._content = 200, b'{}'
+        return response
+
+    def test_connection_errors_are_retried_with_backoff(self, sleep, uniform):
+        with mock.patch('requests.Session.request', side_effect=[
+            requests.exceptions.ConnectionError('reset'), requests.exceptions.ConnectionError('reset'), self.ok()
+        ]) as request:
+            response = self.http.post(self.url, json={})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(request.call_count, 3)
+        self.assertEqual([call.args[0] for call in sleep.call_args_list], [0.5, 1.0])
+        self.assertEqual(self.http.stats()['upstream.test']['retries'], 2)
+
+    def test_gives_up_after_the_last_attempt(self, sleep, uniform):
+        with mock.patch('requests.Session.request', side_effect=requests.exceptions.ConnectionError('down')) as request:
+            with self.assertRaises(requests.exceptions.ConnectionError):
+                self.http.get(self.url)
+
+        self.assertEqual(request.call_count, 3)
+        self.assertEqual(sleep.call_count, 2)
+
+    def test_read_timeouts_are_not_retried(self, sleep, uniform):
+        with mock.patch('requests.Session.request', side_effect=requests.exceptions.ReadTimeout('slow')) as request:
+            with self.assertRaises(requests.exceptions.ReadTimeout):
+                self.http.post(self.url, json={})
+
+        self.assertEqual(request.call_count, 1)
+        sleep.assert_not_called()
+
+    def test_backoff_doubles_up_to_the_cap(self, sleep, uniform):
+        self.assertEqual([self.http.backoff_delay(attempt) for attempt in range(6)], [0.5, 1, 2, 4, 8, 8])
+
+    def test_one_pooled_session_per_host(self, sleep, uniform):
+        session = self.http.session_for(self.url)
+        self.assertIs(self.http.session_for('https://upstream.test/v2'), session)
+        self.assertIsNot(self.http.session_for('https://other.test/v1'), session)
+        self.assertEqual(session.get_adapter(self.url)._pool_maxsize, self.http.pool_maxsize)
+
+
+class ResponseCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.bria = BriaFIBOService()
+        self.bria.translate_cache = ResponseCache('test.translate')
+
+    def translated(self, scene):
+        response = mock.Mock(status_code=200)
+        response.json.return_value = {'result': {'structured_prompt': json.dumps(scene)}}
+        return mock.patch.object(self.bria.http, 'post', return_value=response)
+
+    def test_bypassing_the_cache_leaves_the_shared_scene_alone(self):
+        with self.translated({'v': 1}):
+            self.bria.translate_to_scene('The Forum')
+        with self.translated({'v': 2}) as post:
+            fresh = self.bria.translate_to_scene('The Forum', use_cache=False)
+            shared = self.bria.translate_to_scene('The Forum')
+
+        self.assertEqual(fresh['scene'], {'v': 2})
+        self.assertEqual(shared, {'status': 'success', 'scene': {'v': 1}, 'cached': True})
+        self.assertEqual(post.call_count, 1)
+        self.assertEqual(self.bria.translate_cache.stats(),
+                         {'hits': 1, 'misses': 1, 'bypassed': 1, 'hit_ratio': 0.5})
+
+    def test_repeated_translations_are_served_from_the_cache(self):
+        with self.translated({'v': 1}) as post:
+            first = self.bria.translate_to_scene('The Forum')
+            again = self.bria.translate_to_scene('The Forum')
+            other = self.bria.translate_to_scene('The Colosseum')
+
+        self.assertEqual((first['scene'], again['scene'], other['scene']), ({'v': 1}, {'v': 1}, {'v': 1}))
+        self.assertTrue(again['cached'])
+        self.assertEqual(post.call_count, 2)
+
+    def test_lru_evicts_the_least_recently_used_entry(self):
+        cache = ResponseCache('test.lru', max_entries=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+
+        self.assertEqual([cache.get(key) for key in 'abc'], [1, None, 3])
+        self.assertEqual(len(cache.backend), 2)
+
+    @mock.patch('home.response_cache.time.monotonic', return_value=1000.0)
+    def test_entries_expire_after_their_ttl(self, monotonic):
+        cache = ResponseCache('test.ttl', ttl=60)
+        cache.set('a', 1)
+
+        monotonic.return_value = 1059.0
+        self.assertEqual(cache.get('a'), 1)
+        monotonic.return_value = 1061.0
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(len(cache.backend), 0)
+
+    def test_keys_ignore_dict_order(self):
+        self.assertEqual(make_key({'a': 1, 'b': 2}, 'single'), make_key({'b': 2, 'a': 1}, 'single'))
+        self.assertNotEqual(make_key({'a': 1}, 'single'), make_key({'a': 1}, 'panorama'))
+
+
+class TopicCacheTests(TestCase):
+    def setUp(self):
+        circuit_breaker.reset()
+        self.addCleanup(circuit_breaker.reset)
+
+    def upstream(self, **kwargs):
+        upstream = benchmark.FakeUpstream(groq_latency=0, bria_latency=0, **kwargs).start()
+        self.addCleanup(upstream.stop)
+        return upstream
+
+    def test_scenes_are_shared_across_spellings_and_synonyms(self):
+        upstream = self.upstream()
+        with override_settings(**upstream.settings_overrides()):
+            first = topic_cache.scenes_for('Ancient Rome', 'history')
+            again = topic_cache.scenes_for('  roman   EMPIRE! ', 'history')
+            science = topic_cache.scenes_for('Ancient Rome', 'science')
+
+        self.assertEqual(again, first)
+        self.assertNotEqual(science, first)
+        self.assertEqual(upstream.stats()['requests'], {'/groq/chat/completions': 2})
+        entry = TopicContent.objects.get(normalized_topic='ancient rome', subject_type='history')
+        self.assertEqual((entry.hits, sorted(entry.quizzes)), (1, ['1', '2', '3']))
+
+    def test_fallback_scenes_are_not_shared(self):
+        upstream = self.upstream(error_rate=1.0)
+        with override_settings(**upstream.settings_overrides()):
+            scenes_data = topic_cache.scenes_for('Volcanoes', 'science')
+
+        self.assertEqual(scenes_data, GroqAIService()._fallback_scenes('Volcanoes'))
+        self.assertFalse(TopicContent.objects.exists())
+        self.assertIsNone(topic_cache.cached_scenes('Volcanoes', 'science'))
+
+    @override_settings(TOPIC_CACHE_MAX_AGE=60)
+    def test_stale_entries_are_ignored(self):
+        topic_cache.store_scenes('Volcanoes', 'science', {'scenes': [{'description': 'Lava'}]})
+        self.assertIsNotNone(topic_cache.cached_scenes('Volcanoes', 'science'))
+
+        TopicContent.objects.update(updated_at=timezone.now() - timedelta(minutes=2))
+        self.assertIsNone(topic_cache.cached_scenes('Volcanoes', 'science'))
+
+    @mock.patch('home.topic_cache.GroqAIService.generate_quiz')
+    def test_quizzes_are_shared_only_for_the_same_scene_text(self, generate_quiz):
+        topic_cache.store_scenes('Volcanoes', 'science', {'scenes': [{'description': 'Lava'}]})
+        quiz = {'questions': [{'question': 'Hot?', 'options': ['A) Yes', 'B) No'], 'correct': 0}]}
+        generate_quiz.return_value = quiz
+
+        self.assertEqual(topic_cache.quiz_for('Volcanoes', 'science', 1, 'Lava'), quiz)
+        self.assertEqual(topic_cache.quiz_for('volcanoes', 'science', 1, 'Lava'), quiz)
+        topic_cache.quiz_for('Volcanoes', 'science', 1, 'Ash clouds')
+
+        self.assertEqual(generate_quiz.call_count, 2)
+        self.assertEqual(TopicContent.objects.get().quizzes, {'1': quiz})
+
+    @mock.patch('home.topic_cache.GroqAIService.generate_quiz')
+    def test_fallback_quizzes_are_not_shared(self, generate_quiz):
+        topic_cache.store_scenes('Volcanoes', 'science', {'scenes': [{'description': 'Lava'}]})
+        generate_quiz.return_value = GroqAIService()._fallback_quiz('Volcanoes', 1)
+
+        topic_cache.quiz_for('Volcanoes', 'science', 1, 'Lava')
+
+        self.assertEqual(TopicContent.objects.get().quizzes, {})
+
+
+class StoredImageTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        storage = override_settings(MEDIA_ROOT=media.name, DB_RELEASE_DURING_UPSTREAM=False)
+        storage.enable()
+        self.addCleanup(storage.disable)
+
+    def jpeg(self, width=640, height=320):
+        buffer = io.BytesIO()
+        Image.new('RGB', (width, height), 'teal').save(buffer, 'JPEG')
+        return buffer.getvalue()
+
+    def test_identical_bytes_are_stored_once(self):
+        raw = self.jpeg()
+        stored = image_store.store_bytes(raw)
+
+        self.assertEqual(image_store.store_bytes(raw), stored)
+        self.assertEqual(image_store.ingest_data('data:image/jpeg;base64,' + base64.b64encode(raw).decode()), stored)
+        self.assertEqual(StoredImage.objects.count(), 1)
+        self.assertEqual((stored.content_type, stored.width, stored.height, stored.size),
+                         ('image/jpeg', 640, 320, len(raw)))
+        self.assertTrue(stored.path.startswith(f'images/{stored.digest[:2]}/{stored.digest[2:4]}/'))
+
+    def test_derivatives_are_webp_and_never_upscaled(self):
+        stored = image_store.store_bytes(self.jpeg())
+        storage = image_store.get_storage()
+
+        self.assertEqual(sorted(stored.derivatives), ['thumb', 'viewer'])
+        for variant, width in (('thumb', 480), ('viewer', 640)):
+            path, content_type = image_store.variant_path(stored, variant)
+            self.assertEqual(content_type, 'image/webp')
+            with Image.open(storage.open(path)) as img:
+                self.assertEqual((img.format, img.size), ('WEBP', (width, width // 2)))
+        self.assertEqual(image_store.variant_path(stored, 'original'), (stored.path, 'image/jpeg'))
+
+    def test_served_with_immutable_cache_headers(self):
+        stored = image_store.store_bytes(self.jpeg())
+        response = self.client.get(stored.url('thumb'))
+
+        self.assertEqual(response['Content-Type'], 'image/webp')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(self.client.get(stored.url('thumb'), HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+    def test_urls_are_downloaded_once(self):
+        upstream = benchmark.FakeUpstream(image_width=64).start()
+        self.addCleanup(upstream.stop)
+        first, second = (f'{upstream.base_url}/bria/images/{n}.jpg' for n in (1, 2))
+
+        stored = image_store.ingest_url(first)
+        self.assertEqual(image_store.ingest_url(first), stored)
+        self.assertNotEqual(image_store.ingest_url(second), stored)  # Each download differs by a comment
+        self.assertEqual(upstream.stats()['requests'], {'/bria/images/<n>.jpg': 2})
+        self.assertIsNone(image_store.ingest_url(f'{upstream.base_url}/missing.jpg'))
+
+
+class OwlChatStreamTests(TestCase):
+    def setUp(self):
+        circuit_breaker.reset()
+        self.addCleanup(circuit_breaker.reset)
+        self.client.force_login(User.objects.create_user(username='learner', password='pw'))
+
+    def stream(self, error_rate=0.0):
+        upstream = benchmark.FakeUpstream(groq_latency=0, error_rate=error_rate).start()
+        self.addCleanup(upstream.stop)
+        with override_settings(**upstream.settings_overrides()):
+            response = self.client.post(reverse('home:owl_chat_stream'), '{"message": "Why owls?"}',
+                                        content_type='application/json')
+            body = b''.join(response.streaming_content).decode()
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+        self.assertTrue(body.endswith('\n\n'))
+        events = []
+        for block in body[:-2].split('\n\n'):
+            event, data = block.split('\n')
+            events.append((event.removeprefix('event: '), json.loads(data.removeprefix('data: '))))
+        return events
+
+    def test_answer_is_streamed_as_token_events_then_done(self):
+        events = self.stream()
+
+        self.assertEqual(events[-1], ('done', {}))
+        self.assertGreater(len(events), 3)
+        self.assertEqual({event for event, _ in events[:-1]}, {'token'})
+        answer = ''.join(data['text'] for _, data in events[:-1])
+        self.assertEqual(answer.split(), ('Great question! ' + 'Owls have been watching over learners for centuries. ' * 3).split())
+
+    def test_upstream_errors_stream_the_fallback(self):
+        events = self.stream(error_rate=1.0)
+
+        self.assertEqual(events, [('token', {'text': GroqAIService.OWL_FALLBACK_API_ERROR}), ('done', {})])
+
+
+class AsyncViewTests(TestCase):
+    def setUp(self):
+        circuit_breaker.reset()
+        self.addCleanup(circuit_breaker.reset)
+        upstream = benchmark.FakeUpstream(groq_latency=0, bria_latency=0, image_width=64).start()
+        self.addCleanup(upstream.stop)
+        self.upstream = upstream
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        overrides = override_settings(**upstream.settings_overrides(), GROQ_API_KEY='test', MEDIA_ROOT=media.name)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+        self.user = User.objects.create_user(username='learner', password='pw')
+        scenes = [
+            {'title': f'Scene {number}', 'description': f'View {number}', 'narration': '',
+             'quiz': {'questions': [{'question': 'Q?', 'options': ['A) x', 'B) y'], 'correct': 'A'}]}}
+            for number in (1, 2, 3)
+        ]
+        self.topic = Topic.objects.create(user=self.user, topic='Rome', scenes_data={'scenes': scenes}, scenes_unlocked=[1])
+        Scene.objects.create(topic=self.topic, scene_number=1, title='Scene 1', description='View 1', narration='',
+                             quiz_data=scenes[0]['quiz'], generation_status=Scene.STATUS_COMPLETED)
+
+    def post(self, path, data):
+        request = AsyncRequestFactory().post(path, json.dumps(data), content_type='application/json')
+        request.user = self.user
+
+        async def auser():
+            return self.user
+        request.auser = auser
+        return request
+
+    async def test_owl_chat_answers_without_a_thread(self):
+        response = await async_views.owl_chat(self.post('/owl-chat/', {'message': 'Why owls?'}))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(json.loads(response.content)['response'].startswith('Great question!'))
+        self.assertEqual(self.upstream.stats()['requests'], {'/groq/chat/completions': 1})
+
+    @override_settings(SCENE_PREFETCH_MODE='speculative')
+    async def test_submit_quiz_grades_and_queues_the_next_scene(self):
+        response = await async_views.submit_quiz(self.post('/quiz/', {'answers': ['A']}), self.topic.id, 1)
+
+        result = json.loads(response.content)
+        self.assertEqual((result['correct'], result['score'], result['unlocked']), (1, 10, [1, 2]))
+        job = await GenerationJob.objects.aget(topic=self.topic)
+        self.assertEqual((job.kind, job.scene_number), (GenerationJob.KIND_SCENE, 2))
+
+    @override_settings(SCENE_PREFETCH_MODE='lazy', DB_RELEASE_DURING_UPSTREAM=False)
+    async def test_lazy_mode_builds_the_unlocked_scene_in_the_request(self):
+        await async_views.submit_quiz(self.post('/quiz/', {'answers': ['A']}), self.topic.id, 1)
+
+        scene = await Scene.objects.select_related('image').aget(topic=self.topic, scene_number=2)
+        self.assertEqual(scene.generation_status, Scene.STATUS_COMPLETED)
+        self.assertEqual(scene.quiz_data, self.topic.scenes_data['scenes'][1]['quiz'])
+        self.assertEqual((scene.image.width, scene.image.content_type), (64, 'image/jpeg'))
+        self.assertFalse(await GenerationJob.objects.filter(topic=self.topic).aexists())
+        self.assertEqual(self.upstream.stats()['requests'], {
+            '/bria/structured_prompt/generate': 1, '/bria/image/generate': 1, '/bria/images/<n>.jpg': 1,
+        })
+
+    async def test_regenerate_leaves_the_download_to_the_worker(self):
+        request = self.post('/regenerate/', {'json_scene': {'v': 1}})
+        response = await async_views.regenerate_scene(request, self.topic.id, 1)
+
+        self.assertEqual(json.loads(response.content)['status'], 'success')
+        scene = await Scene.objects.aget(topic=self.topic, scene_number=1)
+        self.assertEqual(scene.json_scene, {'v': 1})
+        self.assertIsNone(scene.image_id)
+        self.assertEqual(json.loads(response.content)['image_url'], scene.image_url)
+        job = await GenerationJob.objects.aget(topic=self.topic)
+        self.assertEqual((job.kind, job.scene_number), (GenerationJob.KIND_IMAGES, 1))
+        self.assertEqual(self.upstream.stats()['requests'], {'/bria/image/generate': 1})
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    def setUp(self):
+        circuit_breaker.reset()
+        self.addCleanup(circuit_breaker.reset)
+
+    def test_open_breaker_serves_fallback_without_calling_upstream(self):
+        upstream = benchmark.FakeUpstream(groq_latency=0, bria_latency=0, error_rate=1.0).start()
+        self.addCleanup(upstream.stop)
+
+        with override_settings(**upstream.settings_overrides(), CIRCUIT_BREAKER={'CONSECUTIVE_FAILURES': 2}):
+            service = GroqAIService()
+            answers = [service.owl_chat('Why did Rome fall?') for _ in range(4)]
+
+        self.assertEqual(answers, [GroqAIService.OWL_FALLBACK_API_ERROR] * 4)
+        self.assertEqual(upstream.stats()['requests'], {'/groq/chat/completions': 2})
+        self.assertEqual(circuit_breaker.get_breaker('groq.chat').state, circuit_breaker.OPEN)
+
+    def test_half_open_probe_closes_on_success(self):
+        breaker = circuit_breaker.CircuitBreaker('test', consecutive_failures=1, open_seconds=0)
+        breaker.record(False)
+        self.assertEqual(breaker.state, circuit_breaker.OPEN)
+
+        breaker.before_call()  # The probe
+        self.assertEqual(breaker.state, circuit_breaker.HALF_OPEN)
+        with self.assertRaises(circuit_breaker.CircuitOpenError):
+            breaker.before_call()  # Only one probe at a time
+
+        breaker.record(True, 0.1)
+        self.assertEqual(breaker.state, circuit_breaker.CLOSED)
+        breaker.before_call()
+
+    def test_timeout_follows_p95_latency_within_bounds(self):
+        breaker = circuit_breaker.CircuitBreaker('test', timeout_min=5, timeout_min_samples=20)
+        for _ in range(19):
+            breaker.record(True, 4.0)
+        self.assertEqual(breaker.timeout(90), 90)  # Too few samples yet
+
+        breaker.record(True, 4.0)
+        self.assertEqual(breaker.timeout(90), 12.0)
+        self.assertEqual(breaker.timeout(10), 10)
+        for _ in range(200):  # The slow calls age out of the sample
+            breaker.record(True, 0.1)
+        self.assertEqual(breaker.timeout(90), 5)
+
+
+class RateLimiterTests(SimpleTestCase):
+    def test_interactive_calls_jump_the_queue(self):
+        limiter = rate_limiter.OutboundLimiter('test', concurrency=1)
+        held = limiter.acquire(rate_limiter.PRIORITY_DEFAULT)
+        order = []
+
+        def call(level):
+            with limiter.slot(level):
+                order.append(level)
+
+        threads = []
+        for level in (rate_limiter.PRIORITY_BACKGROUND, rate_limiter.PRIORITY_INTERACTIVE):
+            threads.append(threading.Thread(target=call, args=(level,)))
+            threads[-1].start()
+            while sum(limiter.stats()['queued'].values()) < len(threads):
+                time.sleep(0.01)
+        limiter.release(held)
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(order, [rate_limiter.PRIORITY_INTERACTIVE, rate_limiter.PRIORITY_BACKGROUND])
+
+    @mock.patch('home.jobs.connection')
+    def test_parallel_scene_builds_keep_the_job_priority(self, connection):
+        seen = []
+        with mock.patch('home.jobs.build_scene', side_effect=lambda *args, **kwargs: seen.append(rate_limiter.current_priority())):
+            with rate_limiter.priority(rate_limiter.PRIORITY_BACKGROUND):
+                jobs._build_scenes_parallel(None, [1, 2, 3], None)
+
+        self.assertEqual(seen, [rate_limiter.PRIORITY_BACKGROUND] * 3)
+
+    def test_reserved_slots_and_tokens_are_kept_for_interactive_calls(self):
+        limiter = rate_limiter.OutboundLimiter('test', concurrency=3, rate=0.01, burst=3, reserved=1, queue_timeout=0.1)
+        limiter.acquire(rate_limiter.PRIORITY_BACKGROUND)
+        limiter.acquire(rate_limiter.PRIORITY_BACKGROUND)
+        with self.assertRaises(rate_limiter.OutboundQueueTimeout):
+            limiter.acquire(rate_limiter.PRIORITY_BACKGROUND)
+        limiter.acquire(rate_limiter.PRIORITY_INTERACTIVE)
+        with self.assertRaises(rate_limiter.OutboundQueueTimeout):
+            limiter.acquire(rate_limiter.PRIORITY_INTERACTIVE)  # Out of tokens as well as slots now
+        self.assertEqual(limiter.stats()['queued'], {'interactive': 0, 'default': 0, 'background': 0})
+
+    @skipIf(rate_limiter.fcntl is None, 'lock files need fcntl')
+    def test_limits_are_shared_through_lock_files(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        first, second = (  # As if in two worker processes
+            rate_limiter.OutboundLimiter('test', concurrency=1, queue_timeout=0.1, lock_dir=directory.name)
+            for _ in range(2)
+        )
+
+        permit = first.acquire(rate_limiter.PRIORITY_INTERACTIVE)
+        with self.assertRaises(rate_limiter.OutboundQueueTimeout):
+            second.acquire(rate_limiter.PRIORITY_INTERACTIVE)
+        first.release(permit)
+        second.release(second.acquire(rate_limiter.PRIORITY_INTERACTIVE))
+
+
+class SingleFlightTests(SimpleTestCase):
+    def setUp(self):
+        single_flight.reset()
+        caches['default'].clear()
+
+    def test_concurrent_identical_calls_share_one_upstream_call(self):
+        release = threading.Event()
+        calls, results = [], []
+
+        def upstream():
+            calls.append(1)
+            release.wait(5)
+            return {'image_url': 'https://example.com/owl.png'}
+
+        def request():
+            results.append(single_flight.do('test.generate', {'prompt': 'owl'}, upstream))
+
+        threads = [threading.Thread(target=request) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.2)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [{'image_url': 'https://example.com/owl.png'}] * 4)
+        self.assertEqual(single_flight.stats()['test.generate'], {'leaders': 1, 'collapsed': 3, 'in_flight': 0})
+
+    def test_waits_for_the_result_of_a_call_in_another_worker(self):
+        lock_key = f"single_flight:{make_key('test.generate', {'prompt': 'owl'})}"
+        cache = caches['default']
+        cache.add(lock_key, 'other-worker')
+
+        def other_worker_finishes():
+            time.sleep(0.2)
+            cache.set(f'{lock_key}:other-worker', {'image_url': 'https://example.com/shared.png'})
+            cache.delete(lock_key)
+        threading.Thread(target=other_worker_finishes).start()
+
+        result = single_flight.do('test.generate', {'prompt': 'owl'}, lambda: self.fail('called upstream'))
+
+        self.assertEqual(result, {'image_url': 'https://example.com/shared.png'})
+        self.assertEqual(single_flight.stats()['test.generate']['collapsed'], 1)
+
+
+class FakeDBConnection:
+    def __init__(self, healthy=True):
+        self.healthy = healthy
+        self.closed = False
+
+    def rollback(self):
+        if not self.healthy:
+            raise OSError('gone away')
+
+    def cursor(self):
+        if not self.healthy:
+            raise OSError('gone away')
+        return mock.Mock()
+
+    def close(self):
+        self.closed = True
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    def test_reuses_released_connections(self):
+        pool = ConnectionPool('test', max_size=2)
+        first = pool.acquire(FakeDBConnection)
+        pool.release(first)
+        self.assertIs(pool.acquire(FakeDBConnection), first)
+
+    def test_is_bounded(self):
+        pool = ConnectionPool('test', max_size=1, timeout=0.01)
+        held = pool.acquire(FakeDBConnection)
+        with self.assertRaises(OperationalError):
+            pool.acquire(FakeDBConnection)
+        pool.release(held)
+        self.assertIs(pool.acquire(FakeDBConnection), held)
+
+    def test_replaces_broken_and_stale_connections(self):
+        pool = ConnectionPool('test', max_size=1, health_check_after=0)
+        broken = pool.acquire(FakeDBConnection)
+        broken.healthy = False
+        pool.release(broken)  # Rollback fails, so it is closed rather than pooled
+        self.assertTrue(broken.closed)
+
+        stale = pool.acquire(FakeDBConnection)
+        pool.release(stale)
+        stale.healthy = False  # Dropped by the server while idle
+        fresh = pool.acquire(FakeDBConnection)
+        self.assertIsNot(fresh, stale)
+        self.assertTrue(stale.closed)
+
+    def test_sqlite_backend_checks_connections_out_of_the_pool(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_dict = connections.configure_settings({
+            'default': {'ENGINE': 'fibo.db.sqlite3', 'NAME': f'{directory.name}/pool.sqlite3', 'POOL': {'MAX_SIZE': 1}},
+        })['default']
+        first, second = PooledSQLiteWrapper(settings_dict, 'pooled'), PooledSQLiteWrapper(settings_dict, 'pooled')
+
+        first.ensure_connection()
+        raw = first.connection
+        first.close()
+        second.ensure_connection()
+
+        self.assertIs(second.connection, raw)
+        second.close()
+        raw.close()
@@ -0,0 +1,132 @@
+"""
+Per-user throttling for the endpoints that start paid Groq/Bria work
+Sliding-window counters per user and scope live in the THROTTLE_CACHE Django cache - point it
+at a cache every worker shares (the default local memory cache counts per process). POSTs over
+any of the scope's THROTTLE_RATES get a 429 with a Retry-After header:
+
+    THROTTLE_RATES = {
+        'regenerate': ['5/minute', '30/hour'],
+    }
+"""
+import functools
+import math
+import time
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse, JsonResponse
+
+from home import metrics
+
+
+PERIODS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+
+
+def parse_rate(rate):
+    """'5/minute' -> (5, 60)"""
+    count, period = rate.split('/')
+    return int(count), PERIODS[period.strip().rstrip('s')]
+
+
+def rules_for(scope):
+    return [parse_rate(rate) for rate in getattr(settings, 'THROTTLE_RATES', {}).get(scope, [])]
+
+
+def check(scope, ident, now=None):
+    """
+    Count a request by ident against the scope's rates
+
+    Returns:
+        None if allowed (and counted), else the seconds until a request would be allowed
+    """
+    rules = rules_for(scope)
+    if not rules:
+        return None
+    cache = caches[getattr(settings, 'THROTTLE_CACHE', 'default')]
+    now = time.time() if now is None else now
+
+    windows = []
+    for limit, period in rules:
+        window = int(now // period)
+        windows.append((limit, period, window, f'throttle:{scope}:{ident}:{period}:{window}'))
+    counts = cache.get_many([
+        key for limit, period, window, current in windows
+        for key in (current, f'throttle:{scope}:{ident}:{period}:{window - 1}')
+    ])
+
+    wait = 0
+    for limit, period, window, current in windows:
+        previous = counts.get(f'throttle:{scope}:{ident}:{period}:{window - 1}', 0)
+        wait = max(wait, _retry_after(limit, period, now - window * period, previous, counts.get(current, 0)))
+    if wait:
+        metrics.counter('throttled_requests_total', 'Requests refused by per-user throttling').inc(scope=scope)
+        return math.ceil(wait)
+
+    for limit, period, window, current in windows:
+        # Check-then-count isn't atomic, so parallel requests can overshoot a limit by a request or two
+        cache.add(current, 0, timeout=2 * period)
+        try:
+            cache.incr(current)
+        except ValueError:  # Evicted in between
+            cache.set(current, 1, timeout=2 * period)
+    return None
+
+
+def _retry_after(limit, period, elapsed, previous, current):
+    """
+    Seconds until the sliding-window estimate leaves room for one more request, 0 if it already does
+
+    The previous window's count is weighted by how much of it still overlaps the sliding window.
+    """
+    room = limit - 1
+    if previous * (period - elapsed) / period + current <= room:
+        return 0
+    if current <= room:
+        return max((period - elapsed) - (room - current) * period / previous, 1)
+    # Only once this window is the previous one does enough of it slide out
+    return (period - elapsed) + max(period * (1 - room / current), 1)
+
+
+def throttled_response(request, retry_after):
+    message = f'Too many requests - please wait {retry_after} seconds and try again.'
+    if request.content_type == 'application/json':
+        response = JsonResponse({'status': 'error', 'message': message, 'retry_after': retry_after}, status=429)
+    else:
+        response = HttpResponse(message, status=429, content_type='text/plain; charset=utf-8')
+    response['Retry-After'] = str(retry_after)
+    return response
+
+
+def throttle(scope):
+    """View decorator limiting each user's POSTs to the scope's THROTTLE_RATES; sync and async views"""
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @functools.wraps(view)
+            async def wrapper(request, *args, **kwargs):
+                if _enabled(request):
+                    user = await request.auser()
+                    retry_after = await sync_to_async(check)(scope, _ident(user, request))
+                    if retry_after:
+                        return throttled_response(request, retry_after)
+                return await view(request, *args, **kwargs)
+        else:
+            @functools.wraps(view)
+            def wrapper(request, *args, **kwargs):
+                if _enabled(request):
+                    retry_after = check(scope, _ident(request.user, request))
+                    if retry_after:
+                        return throttled_response(request, retry_after)
+                return view(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _enabled(request):
+    return request.method == 'POST' and getattr(settings, 'THROTTLE_ENABLED', True)
+
+
+def _ident(user, request):
+    if user.is_authenticated:
+        return f'user:{user.pk}'
+    return f"ip:{request.META.get('REMOTE_ADDR', '')}"
@@ -0,0 +1,156 @@
+"""
+Topic-level memoization for WiseOwl
+Reuses Groq scenes and quizzes across users who ask for the same topic
+"""
+import random
+import re
+import unicodedata
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from home import single_flight
+from home.groq_service import GroqAIService, AsyncGroqAIService
+from home.models import TopicContent
+
+
+def normalize_topic(text):
+    """Case-fold, drop punctuation, collapse whitespace and apply TOPIC_SYNONYMS"""
+    text = unicodedata.normalize('NFKC', text).casefold()
+    text = ''.join(' ' if unicodedata.category(ch).startswith('P') else ch for ch in text)
+    text = re.sub(r'\s+', ' ', text).strip()
+
+    synonyms = getattr(settings, 'TOPIC_SYNONYMS', {})
+    return synonyms.get(text, text)
+
+
+def cached_scenes(topic_text, subject_type):
+    """Fresh shared scenes_data for a topic, or None if it has to be generated"""
+    entry = _lookup(topic_text, subject_type)
+    if entry is None:
+        return None
+
+    if entry.variety and random.random() < entry.variety:
+        return None  # Roll for variety: this learner gets freshly generated scenes
+
+    TopicContent.objects.filter(pk=entry.pk).update(hits=F('hits') + 1)
+    return entry.scenes_data
+
+
+def scenes_for(topic_text, subject_type, groq=None):
+    """Shared scenes_data if available, otherwise generate and remember them"""
+    scenes_data = cached_scenes(topic_text, subject_type)
+    if scenes_data is not None:
+        return scenes_data
+
+    groq = groq or GroqAIService()
+    batched = getattr(settings, 'GROQ_BATCHED_GENERATION', True)
+
+    def generate():
+        if batched:
+            scenes_data = groq.generate_journey(topic_text, subject_type)  # Quizzes ride along in each scene
+        else:
+            scenes_data = groq.generate_scenes(topic_text, subject_type)
+        if not groq._uses_fallback(topic_text, scenes_data):
+            store_scenes(topic_text, subject_type, scenes_data)
+        return scenes_data
+
+    # Learners starting the same new topic at the same moment share one Groq call
+    return single_flight.do('groq.scenes', (normalize_topic(topic_text), subject_type, batched), generate)
+
+
+def quiz_for(topic_text, subject_type, scene_number, scene_description, groq=None):
+    """Shared quiz for a scene if the scene text matches the cached one, otherwise generate it"""
+    entry, quiz_data = cached_quiz(topic_text, subject_type, scene_number, scene_description)
+    if quiz_data:
+        return quiz_data
+
+    groq = groq or GroqAIService()
+    quiz_data = groq.generate_quiz(topic_text, scene_description, scene_number=scene_number)
+    remember_quiz(entry, topic_text, scene_number, scene_description, quiz_data, groq)
+    return quiz_data
+
+
+async def aquiz_for(topic_text, subject_type, scene_number, scene_description, groq=None):
+    """quiz_for for the async views, generating with AsyncGroqAIService"""
+    entry, quiz_data = await sync_to_async(cached_quiz)(topic_text, subject_type, scene_number, scene_description)
+    if quiz_data:
+        return quiz_data
+
+    groq = groq or AsyncGroqAIService()
+    quiz_data = await groq.generate_quiz(topic_text, scene_description, scene_number=scene_number)
+    await sync_to_async(remember_quiz)(entry, topic_text, scene_number, scene_description, quiz_data, groq)
+    return quiz_data
+
+
+def cached_quiz(topic_text, subject_type, scene_number, scene_description):
+    """(entry, quiz) - quiz is None unless the entry's scene text matches"""
+    entry = _lookup(topic_text, subject_type)
+    if entry is not None and _scene_description(entry, scene_number) == scene_description:
+        return entry, entry.quizzes.get(str(scene_number))
+    return entry, None
+
+
+def remember_quiz(entry, topic_text, scene_number, scene_description, quiz_data, groq):
+    """Store a freshly generated quiz on the entry, unless it is a fallback"""
+    is_fallback = quiz_data in (
+        groq._fallback_quiz(topic_text, scene_number),
+        groq._fallback_quiz(topic_text),
+    )
+    if entry is not None and not is_fallback and _scene_description(entry, scene_number) == scene_description:
+        _store_quiz(entry.pk, scene_number, quiz_data)
+
+
+def _lookup(topic_text, subject_type):
+    if not getattr(settings, 'TOPIC_CACHE_ENABLED', True):
+        return None
+
+    max_age = getattr(settings, 'TOPIC_CACHE_MAX_AGE', 30 * 86400)
+    return TopicContent.objects.filter(
+        normalized_topic=normalize_topic(topic_text)[:255],
+        subject_type=subject_type,
+        updated_at__gte=timezone.now() - timedelta(seconds=max_age),
+    ).first()
+
+
+def _scene_description(entry, scene_number):
+    scenes = entry.scenes_data.get('scenes', [])
+    if 0 < scene_number <= len(scenes):
+        return scenes[scene_number - 1].get('description')
+    return None
+
+
+def store_scenes(topic_text, subject_type, scenes_data):
+    """Save new scenes, replacing quizzes that belonged to the previous scenes"""
+    if not getattr(settings, 'TOPIC_CACHE_ENABLED', True):
+        return None
+
+    quizzes = {  # Quizzes generated together with the scenes
+        str(number): scene['quiz']
+        for number, scene in enumerate(scenes_data.get('scenes', []), 1)
+        if scene.get('quiz')
+    }
+    defaults = {'scenes_data': scenes_data, 'quizzes': quizzes}
+    try:
+        entry, created = TopicContent.objects.update_or_create(
+            normalized_topic=normalize_topic(topic_text)[:255],
+            subject_type=subject_type,
+            defaults=defaults,
+            create_defaults=dict(defaults, variety=getattr(settings, 'TOPIC_CACHE_DEFAULT_VARIETY', 0.0)),
+        )
+    except IntegrityError:
+        return None  # Another worker stored the same topic at the same moment
+    return entry
+
+
+def _store_quiz(entry_id, scene_number, quiz_data):
+    with transaction.atomic():
+        entry = TopicContent.objects.select_for_update().filter(pk=entry_id).first()
+        if entry is None:
+            return
+        entry.quizzes[str(scene_number)] = quiz_data
+        entry.save(update_fields=['quizzes'])  # Quizzes don't extend the scenes' freshness
@@ -1,22 +1,38 @@
+from django.conf import settings
 from django.urls import path
-from home import views, auth_views
+from home import views, async_views, auth_views
 
 app_name = 'home'
 
+# Views that wait on Groq/Bria have async versions for ASGI deployments
+generation_views = async_views if settings.ASYNC_VIEWS else views
+
 urlpatterns = [
     # Main pages
     path('', views.landing, name='landing'),
     path('home/', views.home, name='home'),
-    path('generate/', views.generate_journey, name='generate_journey'),
+    path('generate/', generation_views.generate_journey, name='generate_journey'),
     path('demo/<slug:demo_slug>/', views.demo_journey, name='demo_journey'),
     path('journey/<int:topic_id>/', views.journey_view, name='journey'),
     path('quiz/<int:topic_id>/<int:scene_number>/', views.quiz_view, name='quiz'),
     path('certificate/<int:topic_id>/', views.certificate, name='certificate'),
+    path('images/<slug:digest>/<slug:variant>/', views.stored_image, name='stored_image'),
     
     # API endpoints
-    path('submit-quiz/<int:topic_id>/<int:scene_number>/', views.submit_quiz, name='submit_quiz'),
-    path('regenerate/<int:topic_id>/<int:scene_number>/', views.regenerate_scene, name='regenerate_scene'),
-    path('owl-chat/', views.owl_chat, name='owl_chat'),
+    path('submit-quiz/<int:topic_id>/<int:scene_number>/', generation_views.submit_quiz, name='submit_quiz'),
+    path('regenerate/<int:topic_id>/<int:scene_number>/', generation_views.regenerate_scene, name='regenerate_scene'),
+    path('variations/<int:topic_id>/<int:scene_number>/', views.scene_variations, name='scene_variations'),
+    path('variations/<int:topic_id>/<int:scene_number>/<int:variation_id>/restore/', views.restore_variation, name='restore_variation'),
+    path('owl-chat/', generation_views.owl_chat, name='owl_chat'),
+    path('owl-chat/stream/', views.owl_chat_stream, name='owl_chat_stream'),
+    path('jobs/<int:job_id>/', views.job_status, name='job_status'),
+    path('cancel-generation/<int:topic_id>/', views.cancel_generation, name='cancel_generation'),
+    path('retry-generation/<int:topic_id>/', views.retry_generation, name='retry_generation'),
+    
+    # Internal
+    path('internal/http-stats/', views.http_stats, name='http_stats'),
+    path('internal/cache-stats/', views.cache_stats, name='cache_stats'),
+    path('internal/metrics/', views.prometheus_metrics, name='prometheus_metrics'),
     
     # Authentication
     path('auth/login/', auth_views.simple_login, name='simple_login'),
@@ -1,13 +1,22 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth import logout
 from django.contrib import messages
-from django.http import JsonResponse
-from django.views.decorators.http import require_POST
-from home.models import Topic, Scene
+from django.db import transaction
+from django.http import HttpResponse, JsonResponse
+from django.views.decorators.http import require_POST, etag
+from django.views.decorators.cache import cache_control
+from django.http import FileResponse, StreamingHttpResponse
+from home.models import Topic, Scene, SceneVariation, GenerationJob, StoredImage, DemoJourney
 from home.bria_service import BriaFIBOService
 from home.groq_service import GroqAIService
+from home import jobs, topic_cache, image_store, metrics, progress, demo_catalog, quiz_analytics, rate_limiter, scene_history, single_flight, throttling
+from home.circuit_breaker import all_breaker_stats
+from home.http_client import get_http_client
+from home.response_cache import all_cache_stats
 import json
+import time
 
 
 def landing(request):
@@ -20,29 +29,20 @@ def landing(request):
 @login_required
 def home(request):
     """WiseOwl home page with owl guide"""
-    recent_topics = request.user.topics.all()[:5]
-    
-    # Calculate stats
-    all_topics = request.user.topics.all()
-    total_scenes = sum(len(topic.scenes_unlocked) for topic in all_topics)
-    total_score = sum(topic.total_score for topic in all_topics)
-    completed = all_topics.filter(completed=True).count()
-    
-    stats = {
-        'total_topics': all_topics.count(),
-        'total_scenes': total_scenes,
-        'total_score': total_score,
-        'completed': completed
-    }
+    recent_topics = request.user.topics.for_listing()[:5]
+    stats = progress.get_progress(request.user)
+    demos = DemoJourney.objects.filter(published=True).only('slug', 'title', 'tagline', 'icon')
     
     return render(request, 'home/home.html', {
         'user': request.user,
         'recent_topics': recent_topics,
-        'stats': stats
+        'stats': stats,
+        'demos': demos
     })
 
 
 @login_required
+@throttling.throttle('generate')
 def generate_journey(request):
     """Generate 3-scene educational journey"""
     if request.method == 'POST':
@@ -54,49 +54,18 @@ def generate_journey(request):
             return redirect('home:home')
         
         try:
-            # Initialize services
-            groq = GroqAIService()
-            bria = BriaFIBOService()
-            
-            # Generate 3 scenes with Groq
-            print(f"Generating scenes for: {topic_text}")
-            scenes_data = groq.generate_scenes(topic_text, subject_type)
-            
-            # Create topic
+            # Create topic now; scenes are generated by the worker unless another learner already asked
             topic = Topic.objects.create(
                 user=request.user,
                 topic=topic_text,
                 subject_type=subject_type,
-                scenes_data=scenes_data,
+                scenes_data=topic_cache.cached_scenes(topic_text, subject_type),
                 scenes_unlocked=[1],  # Scene 1 always unlocked
                 current_scene=1
             )
+            jobs.enqueue_journey(topic)
             
-            # Generate Scene 1 image immediately
-            scene_info = scenes_data['scenes'][0]
-            scene_result = bria.translate_to_scene(scene_info['description'], 'single')
-            json_scene = scene_result.get('scene', {})
-            
-            image_result = bria.generate_image(json_scene, scene_info['description'])
-            image_url = image_result.get('image_url') if image_result.get('status') == 'success' else None
-            
-            # Generate quiz for Scene 1
-            quiz_data = groq.generate_quiz(topic_text, scene_info['description'], scene_number=1)
-            
-            # Create Scene 1
-            Scene.objects.create(
-                topic=topic,
-                scene_number=1,
-                title=scene_info['title'],
-                description=scene_info['description'],
-                narration=scene_info['narration'],
-                json_scene=json_scene,
-                image_url=image_url,
-                quiz_data=quiz_data,
-                generation_status='completed' if image_url else 'pending'
-            )
-            
-            messages.success(request, f'Journey created! Scene 1 is ready.')
+            messages.success(request, 'Journey started! Scene 1 is being generated.')
             return redirect('home:journey', topic_id=topic.id)
             
         except Exception as e:
@@ -113,11 +82,21 @@ def journey_view(request, topic_id):
     topic = get_object_or_404(Topic, id=topic_id, user=request.user)
     scenes = topic.scenes.all()
     current_scene = scenes.filter(scene_number=topic.current_scene).first()
+
+    # Only the job building the scene on screen matters; background prefetch must not reload the page
+    active_job = stopped_job = None
+    building = (Scene.STATUS_PENDING, Scene.STATUS_GENERATING, Scene.STATUS_FAILED)  # Failed scenes may be retrying
+    if current_scene is None or current_scene.generation_status in building:
+        active_job = jobs.job_for_scene(topic, topic.current_scene)
+        if active_job is None:
+            stopped_job = topic.jobs.exclude(kind=GenerationJob.KIND_IMAGES).order_by('-created_at').first()
     
     return render(request, 'home/journey.html', {
         'topic': topic,
         'scenes': scenes,
         'current_scene': current_scene,
+        'active_job': active_job,
+        'stopped_job': stopped_job,
         'json_scene': json.dumps(current_scene.json_scene, indent=2) if current_scene and current_scene.json_scene else '{}'
     })
 
@@ -127,6 +106,9 @@ def quiz_view(request, topic_id, scene_number):
     """Quiz for a specific scene"""
     topic = get_object_or_404(Topic, id=topic_id, user=request.user)
     scene = get_object_or_404(Scene, topic=topic, scene_number=scene_number)
+    if not scene.quiz_ready:
+        messages.info(request, 'That quiz will be ready once the scene has been generated.')
+        return redirect('home:journey', topic_id=topic.id)
     
     return render(request, 'home/quiz.html', {
         'topic': topic,
@@ -139,96 +121,140 @@ def quiz_view(request, topic_id, scene_number):
 @require_POST
 def submit_quiz(request, topic_id, scene_number):
     """Submit quiz answers and unlock next scene"""
-    topic = get_object_or_404(Topic, id=topic_id, user=request.user)
-    scene = get_object_or_404(Scene, topic=topic, scene_number=scene_number)
+    scene = get_object_or_404(Scene, topic_id=topic_id, topic__user=request.user, scene_number=scene_number)
     
     try:
         data = json.loads(request.body)
-        answers = data.get('answers', [])
+        topic, correct, total, next_scene_num = _grade_quiz(topic_id, request.user, scene, data.get('answers', []))
         
-        # Calculate score
-        correct = 0
-        quiz_questions = scene.quiz_data.get('questions', [])
-        for i, answer in enumerate(answers):
-            if i < len(quiz_questions) and answer == quiz_questions[i]['correct']:
-                correct += 1
+        # Generate next scene if not exists - after the row lock is released
+        if next_scene_num:
+            if jobs.prefetch_mode() != jobs.PREFETCH_LAZY:
+                jobs.ensure_scene(topic, next_scene_num)  # Usually already prefetched
+            elif not topic.scenes.filter(scene_number=next_scene_num).exists():
+                generate_next_scene(topic, next_scene_num)
         
-        # Update topic score
-        topic.quiz_scores[f'scene_{scene_number}'] = correct
-        topic.total_score += correct * 10
-        
-        # Unlock next scene if score is good enough
-        if correct >= 1 and scene_number < 3:
-            next_scene_num = scene_number + 1
-            if next_scene_num not in topic.scenes_unlocked:
-                topic.scenes_unlocked.append(next_scene_num)
-                topic.current_scene = next_scene_num
-                
-                # Generate next scene if not exists
-                if not topic.scenes.filter(scene_number=next_scene_num).exists():
-                    generate_next_scene(topic, next_scene_num)
-        
-        # Mark as completed if all scenes done
-        if scene_number == 3 and correct >= 1:
-            topic.completed = True
-        
-        topic.save()
-        
-        # Check if journey is complete
-        journey_complete = topic.completed and len(topic.scenes_unlocked) == 3
-        
-        return JsonResponse({
-            'status': 'success',
-            'correct': correct,
-            'total': len(quiz_questions),
-            'score': topic.total_score,
-            'unlocked': topic.scenes_unlocked,
-            'next_scene': topic.current_scene,
-            'journey_complete': journey_complete
-        })
+        return JsonResponse(_quiz_result(topic, correct, total))
         
     except Exception as e:
         return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
 
 
+# Correct answers needed to unlock the next scene
+PASS_MARK = 1
+
+# Topic fields a quiz submission writes
+QUIZ_FIELDS = ['quiz_scores', 'total_score', 'scenes_unlocked', 'current_scene', 'completed', 'updated_at']
+
+
+def _grade_quiz(topic_id, user, scene, answers):
+    """
+    Grade answers onto the topic row under a lock, so double clicks and parallel tabs queue up
+    instead of overwriting each other
+
+    Returns:
+        tuple: (topic, correct, total, newly unlocked scene number or None)
+    """
+    with transaction.atomic():
+        topic = Topic.objects.select_for_update().get(id=topic_id, user=user)
+        before = progress.snapshot(topic)
+        correct, total, next_scene_num = _apply_quiz_answers(topic, scene, answers)
+        topic.save(update_fields=QUIZ_FIELDS)
+        quiz_analytics.record_attempt(topic, scene, answers, passed=correct >= PASS_MARK)
+        progress.record_change(topic, before)
+    return topic, correct, total, next_scene_num
+
+
+def _apply_quiz_answers(topic, scene, answers):
+    """Score answers onto the topic; returns (correct, total, newly unlocked scene number or None)"""
+    scene_number = scene.scene_number
+    next_scene_num = None
+    
+    # Calculate score
+    correct = 0
+    quiz_questions = scene.quiz_data.get('questions', [])
+    for i, answer in enumerate(answers):
+        if i < len(quiz_questions) and answer == quiz_questions[i]['correct']:
+            correct += 1
+    
+    # Keep the best score per scene, so resubmitting never counts the same points twice
+    previous = topic.quiz_scores.get(f'scene_{scene_number}', 0)
+    best = max(previous, correct)
+    topic.quiz_scores[f'scene_{scene_number}'] = best
+    topic.total_score += (best - previous) * 10
+    
+    # Unlock next scene if score is good enough
+    if correct >= PASS_MARK and scene_number < 3:
+        if scene_number + 1 not in topic.scenes_unlocked:
+            next_scene_num = scene_number + 1
+            topic.scenes_unlocked.append(next_scene_num)
+            topic.current_scene = next_scene_num
+    
+    # Mark as completed if all scenes done
+    if scene_number == 3 and correct >= PASS_MARK:
+        topic.completed = True
+    
+    return correct, len(quiz_questions), next_scene_num
+
+
+def _quiz_result(topic, correct, total):
+    # Check if journey is complete
+    journey_complete = topic.completed and len(topic.scenes_unlocked) == 3
+    
+    return {
+        'status': 'success',
+        'correct': correct,
+        'total': total,
+        'score': topic.total_score,
+        'unlocked': topic.scenes_unlocked,
+        'next_scene': topic.current_scene,
+        'journey_complete': journey_complete
+    }
+
+
 def generate_next_scene(topic, scene_number):
     """Generate the next scene in background"""
     try:
-        scene_info = topic.scenes_data['scenes'][scene_number - 1]
-        bria = BriaFIBOService()
-        groq = GroqAIService()
-        
-        # Generate image
-        scene_result = bria.translate_to_scene(scene_info['description'], 'single')
-        json_scene = scene_result.get('scene', {})
-        image_result = bria.generate_image(json_scene, scene_info['description'])
-        image_url = image_result.get('image_url') if image_result.get('status') == 'success' else None
-        
-        # Generate quiz
-        quiz_data = groq.generate_quiz(topic.topic, scene_info['description'], scene_number=scene_number)
-        
-        # Create scene
-        Scene.objects.create(
-            topic=topic,
-            scene_number=scene_number,
-            title=scene_info['title'],
-            description=scene_info['description'],
-            narration=scene_info['narration'],
-            json_scene=json_scene,
-            image_url=image_url,
-            quiz_data=quiz_data,
-            generation_status='completed' if image_url else 'pending'
-        )
+        jobs.build_scene(topic, scene_number)
     except Exception as e:
         print(f"Error generating scene {scene_number}: {str(e)}")
 
 
+@login_required
+def job_status(request, job_id):
+    """Poll endpoint for a queued generation job"""
+    job = get_object_or_404(GenerationJob, id=job_id, topic__user=request.user)
+    return JsonResponse(jobs.job_status(job))
+
+
+@login_required
+@require_POST
+def cancel_generation(request, topic_id):
+    """Stop background generation for an abandoned topic"""
+    topic = get_object_or_404(Topic, id=topic_id, user=request.user)
+    cancelled = jobs.cancel_topic_jobs(topic)
+    return JsonResponse({'status': 'success', 'cancelled': cancelled})
+
+
 @login_required
 @require_POST
+@throttling.throttle('regenerate')
+def retry_generation(request, topic_id):
+    """Queue the scene on screen again after its generation was stopped or failed"""
+    topic = get_object_or_404(Topic, id=topic_id, user=request.user)
+    job = jobs.retry_scene(topic, topic.current_scene)
+    return JsonResponse({'status': 'success', 'job_id': job.pk if job else None})
+
+
+@login_required
+@require_POST
+@throttling.throttle('regenerate')
+@rate_limiter.prioritized(rate_limiter.PRIORITY_INTERACTIVE)  # The learner is watching the spinner
 def regenerate_scene(request, topic_id, scene_number):
     """Regenerate scene with edited JSON or simple customization"""
     topic = get_object_or_404(Topic, id=topic_id, user=request.user)
     scene = get_object_or_404(Scene, topic=topic, scene_number=scene_number)
+    json_scene = None
     
     try:
         data = json.loads(request.body)
@@ -240,8 +266,8 @@ def regenerate_scene(request, topic_id, scene_number):
             enhanced_prompt = data.get('enhanced_prompt')
             is_demo = data.get('generate_demo', False)
             
-            # Generate new scene with enhanced prompt
-            scene_result = bria.translate_to_scene(enhanced_prompt, 'single')
+            # Generate new scene with enhanced prompt - students regenerating want variety
+            scene_result = bria.translate_to_scene(enhanced_prompt, 'single', use_cache=is_demo)
             json_scene = scene_result.get('scene', scene.json_scene)
             result = bria.generate_image(json_scene, enhanced_prompt)
             
@@ -254,13 +280,16 @@ def regenerate_scene(request, topic_id, scene_number):
             result = bria.generate_image(json_scene, scene.description)
         
         if result.get('status') == 'success':
-            scene.json_scene = json_scene if 'json_scene' in locals() else scene.json_scene
+            original = scene_history.snapshot(scene)
+            scene.json_scene = json_scene if json_scene is not None else scene.json_scene
             scene.image_url = result.get('image_url')
-            scene.save()
+            scene.image = None  # Downloaded into the image store by the worker
+            scene_history.save_regeneration(scene, original, data.get('enhanced_prompt', ''))
+            jobs.enqueue_images(topic, scene.scene_number)
             
             return JsonResponse({
                 'status': 'success',
-                'image_url': result.get('image_url')
+                'image_url': scene.display_image_url
             })
         else:
             return JsonResponse({
@@ -273,8 +302,49 @@ def regenerate_scene(request, topic_id, scene_number):
         return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
 
 
+@login_required
+def scene_variations(request, topic_id, scene_number):
+    """Page through a scene's earlier regenerations, newest first (?page=N)"""
+    scene = get_object_or_404(Scene, topic_id=topic_id, topic__user=request.user, scene_number=scene_number)
+    page = scene_history.variations_page(scene, request.GET.get('page', 1))
+
+    return JsonResponse({
+        'variations': [
+            {
+                'id': variation.id,
+                'prompt': variation.prompt,
+                'image_url': variation.display_image_url,
+                'thumbnail_url': variation.thumbnail_url,
+                'created_at': variation.created_at.isoformat(),
+                'current': scene_history.is_current(scene, variation),
+            }
+            for variation in page
+        ],
+        'page': page.number,
+        'pages': page.paginator.num_pages,
+        'count': page.paginator.count,
+        'has_next': page.has_next(),
+    })
+
+
+@login_required
+@require_POST
+def restore_variation(request, topic_id, scene_number, variation_id):
+    """Show an earlier regeneration again, without calling Bria"""
+    scene = get_object_or_404(Scene, topic_id=topic_id, topic__user=request.user, scene_number=scene_number)
+    variation = get_object_or_404(SceneVariation, id=variation_id, scene=scene)
+    scene_history.restore(scene, variation)
+
+    return JsonResponse({
+        'status': 'success',
+        'image_url': scene.display_image_url,
+        'json_scene': scene.json_scene,
+    })
+
+
 @login_required
 @require_POST
+@throttling.throttle('owl_chat')
 def owl_chat(request):
     """Owl responds to user questions"""
     try:
@@ -298,6 +368,71 @@ def owl_chat(request):
         return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
 
 
+@login_required
+@require_POST
+@throttling.throttle('owl_chat')
+def owl_chat_stream(request):
+    """Owl answers streamed token by token as Server-Sent Events"""
+    started = time.monotonic()
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'Invalid JSON'}, status=400)
+    
+    message = data.get('message', '')
+    context = data.get('context', '')
+    groq = GroqAIService()
+    
+    def event_stream():
+        first = True
+        for chunk in groq.owl_chat_stream(message, context):
+            if first:
+                metrics.histogram(
+                    'owl_chat_ttft_seconds',
+                    'Time from owl chat request to first streamed token'
+                ).observe(time.monotonic() - started)
+                first = False
+            yield f"event: token\ndata: {json.dumps({'text': chunk})}\n\n"
+        yield "event: done\ndata: {}\n\n"
+    
+    response = StreamingHttpResponse(event_stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Stop nginx buffering the stream
+    return response
+
+
+@cache_control(public=True, max_age=31536000, immutable=True)
+@etag(lambda request, digest, variant: f'{digest}-{variant}')
+def stored_image(request, digest, variant):
+    """Serve a locally stored scene image; content-addressed, so it never changes"""
+    stored = get_object_or_404(StoredImage, digest=digest)
+    path, content_type = image_store.variant_path(stored, variant)
+    return FileResponse(image_store.get_storage().open(path, 'rb'), content_type=content_type)
+
+
+@staff_member_required
+def http_stats(request):
+    """Connection reuse counters, circuit breaker states, rate limit queues and collapsed calls for Groq/Bria"""
+    return JsonResponse({
+        'hosts': get_http_client().stats(),
+        'breakers': all_breaker_stats(),
+        'limiters': rate_limiter.all_limiter_stats(),
+        'single_flight': single_flight.stats(),
+    })
+
+
+@staff_member_required
+def cache_stats(request):
+    """Hit/miss counters for the upstream response caches"""
+    return JsonResponse({'caches': all_cache_stats()})
+
+
+@staff_member_required
+def prometheus_metrics(request):
+    """Every in-process metric in Prometheus text format, for scraping"""
+    return HttpResponse(metrics.render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
 @login_required
 def certificate(request, topic_id):
     """Generate completion certificate"""
@@ -312,103 +447,22 @@ def certificate(request, topic_id):
 @login_required
 def demo_journey(request, demo_slug):
     """Load pre-generated demo journey"""
-    # Demo data (pre-generated for instant access)
-    demos = {
-        'ancient-rome': {
-            'topic': 'Ancient Rome - The Roman Forum',
-            'subject_type': 'history',
-            'scenes_data': {
-                'scenes': [
-                    {
-                        'number': 1,
-                        'title': 'The Heart of Rome',
-                        'description': 'A wide panoramic view of the Roman Forum at its peak, showing the Temple of Saturn, Arch of Septimius Severus, and bustling marketplace with citizens in togas',
-                        'narration': 'Welcome to the Roman Forum, the beating heart of Ancient Rome! This was the center of political, commercial, and judicial life. Around you stand magnificent temples dedicated to the gods, government buildings where senators debated, and the Rostra where great orators like Cicero addressed the crowds. The Forum was more than just a marketplace - it was where democracy was born, where laws were made, and where the fate of an empire was decided. Notice the grand columns, the marble pavements worn smooth by countless footsteps, and imagine the voices of thousands of Romans echoing through these spaces.'
-                    },
-                    {
-                        'number': 2,
-                        'title': 'Daily Life in the Forum',
-                        'description': 'Ground-level view showing Roman citizens trading goods, senators in discussion, and children playing near the fountains, with the Colosseum visible in the background',
-                        'narration': 'Now let\'s experience the Forum at ground level, as a Roman citizen would have seen it. The Forum was alive with activity from dawn to dusk. Merchants sold everything from exotic spices to fine pottery. Lawyers argued cases in the basilicas. Politicians campaigned for votes. Notice how the rich wore purple-trimmed togas while common citizens wore simple white. The Forum had public fountains providing fresh water from the aqueducts, and public latrines showing Roman engineering prowess. This wasn\'t just a place of power - it was where ordinary Romans lived their daily lives, gossiped, made deals, and felt connected to their great civilization.'
-                    },
-                    {
-                        'number': 3,
-                        'title': 'Legacy of the Forum',
-                        'description': 'Sunset view of the Forum ruins as they appear today, with modern Rome visible in the background, showing the passage of time',
-                        'narration': 'As the sun sets over the Forum, we see how this ancient center of power has endured through the ages. Though now in ruins, these stones tell the story of one of history\'s greatest civilizations. The Roman Forum influenced architecture, law, and government systems that we still use today. The concept of a republic, the idea of citizenship, the structure of our legal systems - all have roots here. When you visit modern government buildings with their columns and domes, you\'re seeing Roman influence. The Forum reminds us that great civilizations leave lasting legacies, and that the past continues to shape our present.'
-                    }
-                ]
-            }
-        },
-        'amazon-rainforest': {
-            'topic': 'Amazon Rainforest - The Lungs of Earth',
-            'subject_type': 'geography',
-            'scenes_data': {
-                'scenes': [
-                    {
-                        'number': 1,
-                        'title': 'The Canopy Layer',
-                        'description': 'Aerial bird\'s eye view of the dense Amazon rainforest canopy, showing the vast green expanse with emergent trees, colorful macaws flying, and morning mist',
-                        'narration': 'Welcome to the Amazon Rainforest, often called the "Lungs of Earth"! From this aerial view, you can see why - the canopy stretches endlessly in every direction, a sea of green that produces 20% of the world\'s oxygen. The Amazon covers 5.5 million square kilometers across nine countries. What you\'re seeing is the canopy layer, about 30-45 meters high, where most of the rainforest\'s life exists. Notice the emergent trees that tower even higher, reaching for sunlight. The Amazon is home to 10% of all species on Earth - that\'s over 40,000 plant species, 1,300 bird species, and 2.5 million insect species! This incredible biodiversity makes it one of the most important ecosystems on our planet.'
-                    },
-                    {
-                        'number': 2,
-                        'title': 'The Forest Floor',
-                        'description': 'Ground-level view showing massive tree trunks, hanging vines, colorful poison dart frogs, leafcutter ants, and filtered sunlight creating a mystical atmosphere',
-                        'narration': 'Now let\'s descend to the forest floor, a completely different world. Only about 2% of sunlight reaches here, creating a dim, humid environment. Despite the darkness, life thrives everywhere you look. See those leafcutter ants? They\'re farming! They cut leaves and use them to grow fungus for food. The colorful poison dart frogs warn predators with their bright colors. Notice the massive tree trunks - some are over 1,000 years old. The forest floor is covered in decomposing leaves that quickly break down in the heat and humidity, recycling nutrients back into the soil. Indigenous peoples have lived in harmony with this forest for over 11,000 years, developing deep knowledge of medicinal plants and sustainable living practices.'
-                    },
-                    {
-                        'number': 3,
-                        'title': 'The Amazon River',
-                        'description': 'Wide view of the mighty Amazon River winding through the rainforest, with pink river dolphins, local communities in boats, and the meeting of waters where different colored rivers merge',
-                        'narration': 'The Amazon River is the lifeblood of the rainforest, the largest river by volume in the world. It discharges more water than the next seven largest rivers combined! The river and its 1,100 tributaries create a vast network that supports countless communities and species. See those pink river dolphins? They\'re unique to the Amazon. The river floods seasonally, rising up to 15 meters, which spreads nutrients across the forest floor. However, the Amazon faces serious threats - deforestation, climate change, and human activity are endangering this vital ecosystem. Scientists estimate we\'re losing an area the size of a football field every single minute. Protecting the Amazon isn\'t just about saving trees - it\'s about preserving Earth\'s climate, biodiversity, and the future of our planet.'
-                    }
-                ]
-            }
-        }
-    }
-    
-    if demo_slug not in demos:
+    demo = DemoJourney.objects.filter(slug=demo_slug, published=True).first()
+    if demo is None:
         messages.error(request, 'Demo not found')
         return redirect('home:home')
     
-    demo_data = demos[demo_slug]
-    
     # Check if user already has this demo
     existing = Topic.objects.filter(
         user=request.user,
-        topic=demo_data['topic']
+        topic=demo.topic
     ).first()
     
     if existing:
         return redirect('home:journey', topic_id=existing.id)
     
-    # Create demo topic (no images, just text for instant access)
-    topic = Topic.objects.create(
-        user=request.user,
-        topic=demo_data['topic'],
-        subject_type=demo_data['subject_type'],
-        scenes_data=demo_data['scenes_data'],
-        scenes_unlocked=[1, 2, 3],  # All unlocked for demo
-        current_scene=1
-    )
-    
-    # Create all 3 scenes (without images for speed)
-    groq = GroqAIService()
-    for i, scene_info in enumerate(demo_data['scenes_data']['scenes'], 1):
-        quiz_data = groq.generate_quiz(demo_data['topic'], scene_info['description'], scene_number=i)
-        
-        Scene.objects.create(
-            topic=topic,
-            scene_number=i,
-            title=scene_info['title'],
-            description=scene_info['description'],
-            narration=scene_info['narration'],
-            json_scene={},  # Empty for demo
-            image_url=None,  # Will show placeholder
-            quiz_data=quiz_data,
-            generation_status='demo'
-        )
+    # Copy the pre-built scenes, quizzes and images - no API calls
+    topic = demo_catalog.clone_for_user(demo, request.user)
     
     messages.success(request, f'🎉 Demo loaded! All scenes unlocked for exploration.')
     return redirect('home:journey', topic_id=topic.id)